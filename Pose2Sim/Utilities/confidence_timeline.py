@@ -10,6 +10,9 @@
     Plot per-frame keypoint confidence scores as a timeline scatter plot.
     Outputs CSV data and PNG plot for visual inspection of confidence patterns.
 
+    The input can also be a binary pose file (<video>_pose.bin), if pose 
+    estimation was run with output_format = 'binary'.
+
     Usage:
         confidence_timeline -j /path/to/json_dir
         confidence_timeline -j /path/to/json_dir -k Nose,Neck,RShoulder,LShoulder
@@ -28,9 +31,10 @@ import numpy as np
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from glob import glob
 from tqdm import tqdm
 
+from Pose2Sim.common import pose_frames_list, load_pose_frame, pose_file_suffix
+
 
 ## CONSTANTS
 
@@ -58,7 +62,7 @@ def process(json_dir, keypoint_names, output_dir, thresholds):
     Parameters
     ----------
     json_dir : str
-        Path to directory containing per-frame JSON files.
+        Path to directory containing per-frame JSON files, or to a binary pose file.
     keypoint_names : list[str]
         List of keypoint names to analyze.
     output_dir : str
@@ -67,7 +71,7 @@ def process(json_dir, keypoint_names, output_dir, thresholds):
         Threshold values for horizontal reference lines. None for no lines.
     '''
     # List JSON files
-    files = sorted(glob(os.path.join(json_dir, '*.json')))
+    files = pose_frames_list(json_dir)
     if not files:
         raise FileNotFoundError(f'No JSON files found in {json_dir}')
 
@@ -92,8 +96,7 @@ def process(json_dir, keypoint_names, output_dir, thresholds):
 
     for frame_idx, f in enumerate(tqdm(files, desc='Reading')):
         try:
-            with open(f) as fp:
-                data = json.load(fp)
+            data = load_pose_frame(f)
         except json.JSONDecodeError:
             print(f'Warning: JSON parse error, skipping: {f}', file=sys.stderr)
             continue
@@ -166,7 +169,7 @@ def main():
     parser = argparse.ArgumentParser(
         description='Plot keypoint confidence timeline from JSON files.')
     parser.add_argument('-j', '--json_dir', required=True,
-                        help='Input JSON directory')
+                        help='Input JSON directory, or binary pose file')
     parser.add_argument('-k', '--keypoints', default='Nose,Neck,RShoulder,LShoulder',
                         help='Keypoint names, comma-separated (default: Nose,Neck,RShoulder,LShoulder)')
     parser.add_argument('-o', '--output', default=None,
@@ -176,14 +179,14 @@ def main():
     args = parser.parse_args()
 
     json_dir = args.json_dir
-    if not os.path.isdir(json_dir):
+    if not os.path.isdir(json_dir) and not (json_dir.endswith(pose_file_suffix) and os.path.isfile(json_dir)):
         print(f'Error: Input directory not found: {json_dir}', file=sys.stderr)
         sys.exit(1)
 
     keypoint_names = [k.strip() for k in args.keypoints.split(',')]
 
     if args.output is None:
-        output_dir = json_dir.rstrip('/') + '_conf_timeline'
+        output_dir = json_dir.rstrip('/').replace(pose_file_suffix, '') + '_conf_timeline'
     else:
         output_dir = args.output
 
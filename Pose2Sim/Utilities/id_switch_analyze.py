@@ -11,6 +11,9 @@
     Quantifies detection count changes and frame-to-frame person matching
     using keypoint distance-based Hungarian matching.
 
+    Reads cam*_json folders, or cam*_pose.bin files if pose estimation 
+    was run with output_format = 'binary'.
+
     Usage:
         id_switch_analyze -p /path/to/pose_dir
         id_switch_analyze -p /path/to/pose_dir -o /path/to/output --fps 30
@@ -27,6 +30,8 @@ from pathlib import Path
 from scipy.optimize import linear_sum_assignment
 from tqdm import tqdm
 
+from Pose2Sim.common import pose_frames_list, load_pose_frame, pose_file_suffix
+
 
 ## CONSTANTS
 
@@ -151,7 +156,7 @@ def analyze_camera(cam_dir, fps=30):
     Parameters
     ----------
     cam_dir : Path
-        Directory containing per-frame JSON files.
+        Directory containing per-frame JSON files, or binary pose file.
     fps : int
         Frame rate for gap duration calculation.
 
@@ -161,7 +166,7 @@ def analyze_camera(cam_dir, fps=30):
         Analysis results with keys: 'events', 'match_distances',
         'detection_counts', 'person_id_values', 'n_frames', 'n_errors'.
     '''
-    json_files = sorted(cam_dir.glob('*.json'))
+    json_files = pose_frames_list(cam_dir)
     if not json_files:
         raise FileNotFoundError(f'No JSON files found in {cam_dir}')
 
@@ -175,13 +180,12 @@ def analyze_camera(cam_dir, fps=30):
     prev_frame_idx = None
     zero_count = 0
 
-    cam_name = cam_dir.name.replace('_json', '')
+    cam_name = cam_dir.name.replace('_json', '').replace(pose_file_suffix, '')
 
     for frame_idx, jf in enumerate(tqdm(json_files, desc=f'  {cam_name}', leave=False)):
         # Parse JSON
         try:
-            with open(jf) as f:
-                data = json.load(f)
+            data = load_pose_frame(jf)
         except (json.JSONDecodeError, IOError) as e:
             print(f'WARNING: {cam_name} frame {frame_idx}: JSON parse error: {e}')
             n_errors += 1
@@ -556,7 +560,7 @@ def analyze_id_switches(pose_dir, output_dir=None, fps=30):
     Parameters
     ----------
     pose_dir : str or Path
-        Pose directory containing cam*_json subdirectories.
+        Pose directory containing cam*_json subdirectories, or cam*_pose.bin files.
     output_dir : str or Path or None
         Output directory. Default: docs/011_id_switch_analysis/test_results/
     fps : int
@@ -576,7 +580,9 @@ def analyze_id_switches(pose_dir, output_dir=None, fps=30):
 
     cam_dirs = sorted(pose_dir.glob('cam*_json'))
     if not cam_dirs:
-        raise FileNotFoundError(f'No cam*_json directories found in {pose_dir}')
+        cam_dirs = sorted(pose_dir.glob('cam*' + pose_file_suffix))
+    if not cam_dirs:
+        raise FileNotFoundError(f'No cam*_json directories nor cam*{pose_file_suffix} files found in {pose_dir}')
 
     print(f'Analyzing ID switches in {pose_dir}')
     print(f'Found {len(cam_dirs)} cameras: {[d.name for d in cam_dirs]}')
@@ -585,7 +591,7 @@ def analyze_id_switches(pose_dir, output_dir=None, fps=30):
 
     cam_results = {}
     for cam_dir in cam_dirs:
-        cam_name = cam_dir.name.replace('_json', '')
+        cam_name = cam_dir.name.replace('_json', '').replace(pose_file_suffix, '')
         print(f'Processing {cam_name}...')
 
         result = analyze_camera(cam_dir, fps=fps)
@@ -634,7 +640,7 @@ def main():
         description='Analyze tracking ID switches in 2D pose estimation outputs. '
                     'Quantifies detection count changes and frame-to-frame person matching.')
     parser.add_argument('-p', '--pose-dir', required=True,
-                        help='Pose directory path containing cam*_json subdirectories.')
+                        help='Pose directory path containing cam*_json subdirectories, or cam*_pose.bin files.')
     parser.add_argument('-o', '--output-dir', default=None,
                         help='Output directory path. Default: docs/011_id_switch_analysis/test_results/')
     parser.add_argument('--fps', type=int, default=30,
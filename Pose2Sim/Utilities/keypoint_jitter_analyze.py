@@ -11,6 +11,9 @@
     Detects jitter events where displacement exceeds median * multiplier, classifies causes
     (out-of-frame, small BB, low confidence, other), and generates reports.
 
+    Reads *_json folders, or *_pose.bin files if pose estimation 
+    was run with output_format = 'binary'.
+
     Usage:
         keypoint_jitter_analyze -p /path/to/pose_dir
         keypoint_jitter_analyze -p /path/to/pose_dir --multiplier 5.0 -o /path/to/output
@@ -20,14 +23,14 @@
 
 ## INIT
 import os
-import json
 import argparse
 import csv
 import numpy as np
 from pathlib import Path
-from glob import glob
 from tqdm import tqdm
 
+from Pose2Sim.common import pose_frames_list, load_pose_frame, pose_file_suffix
+
 
 ## CONSTANTS
 
@@ -113,14 +116,14 @@ def load_keypoints_series(cam_json_dir):
     Parameters
     ----------
     cam_json_dir : str or Path
-        Directory containing per-frame JSON files.
+        Directory containing per-frame JSON files, or binary pose file.
 
     Returns
     -------
     np.ndarray
         Shape (N_frames, 26, 3) with [x, y, confidence] per keypoint.
     '''
-    files = sorted(glob(os.path.join(str(cam_json_dir), '*.json')))
+    files = pose_frames_list(cam_json_dir)
     if not files:
         raise FileNotFoundError(f'No JSON files found in {cam_json_dir}')
 
@@ -128,8 +131,7 @@ def load_keypoints_series(cam_json_dir):
     prev_kp = None
 
     for i, f in enumerate(tqdm(files, desc=os.path.basename(str(cam_json_dir)))):
-        with open(f) as fp:
-            data = json.load(fp)
+        data = load_pose_frame(f)
         people = data.get('people', [])
         if people:
             kp = _select_person(people, prev_kp)
@@ -647,6 +649,9 @@ def analyze_jitter(pose_dir, output=None, multiplier=DEFAULT_MULTIPLIER,
     if not cam_dirs:
         # Try *_json pattern for non-standard directory names
         cam_dirs = sorted(pose_dir.glob('*_json'))
+    if not cam_dirs:
+        # Binary pose files
+        cam_dirs = sorted(pose_dir.glob('*' + pose_file_suffix))
     if not cam_dirs:
         # Check if pose_dir itself contains JSON files
         if list(pose_dir.glob('*.json')):
@@ -658,7 +663,7 @@ def analyze_jitter(pose_dir, output=None, multiplier=DEFAULT_MULTIPLIER,
     cam_results = {}
     all_events = []
     for cam_dir in cam_dirs:
-        cam_name = cam_dir.name.replace('_json', '') if cam_dir.name.endswith('_json') else cam_dir.name
+        cam_name = cam_dir.name.replace('_json', '') if cam_dir.name.endswith('_json') else cam_dir.name.replace(pose_file_suffix, '')
         print(f'\nAnalyzing {cam_name} ...')
         result = analyze_camera(cam_dir, multiplier, image_size)
         cam_results[cam_name] = result
@@ -682,7 +687,7 @@ def main():
         description='Analyze 2D keypoint jitter (frame-to-frame displacement anomalies). '
                     'Detects and classifies jitter events by cause pattern.')
     parser.add_argument('-p', '--pose-dir', required=True,
-                        help='Pose directory containing *_json subdirectories, or a directory with JSON files directly.')
+                        help='Pose directory containing *_json subdirectories or *_pose.bin files, or a directory with JSON files directly.')
     parser.add_argument('-o', '--output', default=None,
                         help='Output directory. Default: docs/012_2d_keypoint_jitter/test_results/')
     parser.add_argument('--multiplier', type=float, default=DEFAULT_MULTIPLIER,
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ###########################################################
+    ## Convert binary pose files to OpenPose json files      ##
+    ###########################################################
+
+    Exports a binary pose file written by Pose2Sim.poseEstimation() with
+    output_format = 'binary' (pose/<video>_pose.bin) to one OpenPose json
+    file per frame, named as with output_format = 'openpose'.
+    Useful to inspect the results with json_display_with_img, or to use tools
+    that only read json files.
+
+    Usage:
+    pose_binary_to_OpenPose -i input_pose_bin_file -o output_json_folder
+    OR pose_binary_to_OpenPose -i input_pose_bin_file
+    OR pose_binary_to_OpenPose -i input_pose_bin_file -r 0 100
+    OR from Pose2Sim.Utilities import pose_binary_to_OpenPose; pose_binary_to_OpenPose.pose_binary_to_OpenPose_func(r'input_pose_bin_file', r'output_json_folder')
+'''
+
+
+## INIT
+import os
+import argparse
+
+from Pose2Sim.common import pose_file_to_openpose
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Pose2Sim"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+from importlib.metadata import version
+__version__ = version('pose2sim')
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## FUNCTIONS
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required = True, help='input binary pose file (<video>_pose.bin)')
+    parser.add_argument('-o', '--output', required = False, help='output folder for OpenPose json files. Default: <video>_json next to the input file')
+    parser.add_argument('-r', '--frame_range', required = False, nargs = 2, type = int, help='only export frames in [start, end)')
+    args = vars(parser.parse_args())
+
+    pose_binary_to_OpenPose_func(args)
+
+
+def pose_binary_to_OpenPose_func(*args):
+    '''
+    Exports a binary pose file to one OpenPose json file per frame.
+
+    Usage:
+    pose_binary_to_OpenPose -i input_pose_bin_file -o output_json_folder
+    OR pose_binary_to_OpenPose -i input_pose_bin_file
+    OR pose_binary_to_OpenPose -i input_pose_bin_file -r 0 100
+    OR import pose_binary_to_OpenPose; pose_binary_to_OpenPose.pose_binary_to_OpenPose_func(r'input_pose_bin_file', r'output_json_folder')
+    '''
+
+    try:
+        pose_file_path = os.path.realpath(args[0]['input']) # invoked with argparse
+        json_folder_path = os.path.realpath(args[0]['output']) if args[0]['output'] != None else None
+        frame_range = args[0]['frame_range']
+    except:
+        pose_file_path = os.path.realpath(args[0]) # invoked as a function
+        json_folder_path = os.path.realpath(args[1]) if len(args) > 1 and args[1] != None else None
+        frame_range = args[2] if len(args) > 2 else None
+
+    json_folder_path = pose_file_to_openpose(pose_file_path, json_dir=json_folder_path, frame_range=frame_range)
+
+    print(f"Binary pose file converted to OpenPose json files in {json_folder_path}")
+
+
+if __name__ == '__main__':
+    main()
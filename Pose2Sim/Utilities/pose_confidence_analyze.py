@@ -13,6 +13,9 @@
     Analysis 1: Per-camera, per-keypoint confidence statistics (mean, median, percentiles, etc.)
     Analysis 2: Confidence band distribution and threshold simulation.
 
+    Reads cam*_json folders, or cam*_pose.bin files if pose estimation 
+    was run with output_format = 'binary'.
+
     Usage:
         pose_confidence_analyze -p /path/to/pose_dir
         pose_confidence_analyze -p /path/to/pose_dir -t 0.5 -o /path/to/output
@@ -22,12 +25,13 @@
 
 ## INIT
 import os
-import json
 import argparse
 import csv
 import numpy as np
 from pathlib import Path
 
+from Pose2Sim.common import pose_frames_list, load_pose_frame, pose_file_suffix
+
 
 ## CONSTANTS
 
@@ -64,21 +68,20 @@ def load_camera_data(cam_dir):
     Parameters
     ----------
     cam_dir : Path
-        Directory containing per-frame JSON files.
+        Directory containing per-frame JSON files, or binary pose file.
 
     Returns
     -------
     np.ndarray
         Shape (n_frames, 26) confidence matrix.
     '''
-    json_files = sorted(cam_dir.glob('*.json'))
+    json_files = pose_frames_list(cam_dir)
     if not json_files:
         raise FileNotFoundError(f'No JSON files found in {cam_dir}')
 
     confidence_list = []
     for jf in json_files:
-        with open(jf) as f:
-            data = json.load(f)
+        data = load_pose_frame(jf)
         if not data.get('people'):
             confidence_list.append(np.full(26, np.nan))
             continue
@@ -95,7 +98,7 @@ def load_pose_data(pose_dir):
     Parameters
     ----------
     pose_dir : Path
-        Directory containing cam*_json subdirectories.
+        Directory containing cam*_json subdirectories, or cam*_pose.bin files.
 
     Returns
     -------
@@ -105,11 +108,13 @@ def load_pose_data(pose_dir):
     pose_dir = Path(pose_dir)
     cam_dirs = sorted(pose_dir.glob('cam*_json'))
     if not cam_dirs:
-        raise FileNotFoundError(f'No cam*_json directories found in {pose_dir}')
+        cam_dirs = sorted(pose_dir.glob('cam*' + pose_file_suffix))
+    if not cam_dirs:
+        raise FileNotFoundError(f'No cam*_json directories nor cam*{pose_file_suffix} files found in {pose_dir}')
 
     confidence_data = {}
     for cam_dir in cam_dirs:
-        cam_name = cam_dir.name.replace('_json', '')
+        cam_name = cam_dir.name.replace('_json', '').replace(pose_file_suffix, '')
         confidence_data[cam_name] = load_camera_data(cam_dir)
 
     return confidence_data
@@ -500,7 +505,7 @@ def main():
         description='Analyze 2D pose estimation confidence scores across cameras and keypoints. '
                     'Identifies low-confidence patterns that may degrade 3D triangulation quality.')
     parser.add_argument('-p', '--pose-dir', required=True,
-                        help='Pose directory path containing cam*_json subdirectories.')
+                        help='Pose directory path containing cam*_json subdirectories, or cam*_pose.bin files.')
     parser.add_argument('-t', '--threshold', type=float, default=0.4,
                         help='Current confidence threshold (default: 0.4).')
     parser.add_argument('-o', '--output', default=None,
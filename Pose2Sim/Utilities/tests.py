@@ -28,6 +28,7 @@
     Testing det_frequency 1 and 10.
     Testing synchronization with all markers or only ['RWrist'].
     Testing with and without marker augmentation.
+    Testing binary pose files through synchronization, person association and triangulation, and their export to OpenPose json files.
     
     N.B.: Calibration from scene dimensions is not tested, as it requires the 
     user to click points on the image. 
@@ -45,11 +46,16 @@
 ## INIT
 import os
 import sys
+import shutil
+import tempfile
+import numpy as np
 import toml
 from unittest.mock import patch
 import unittest
 
 from Pose2Sim import Pose2Sim
+from Pose2Sim.common import read_pose_file, read_json_dir, pose_files_names
+from Pose2Sim.Utilities import pose_binary_to_OpenPose
 
 
 ## AUTHORSHIP INFORMATION
@@ -90,6 +96,7 @@ class TestWorkflow(unittest.TestCase):
             Testing det_frequency 1 and 10.
             Testing synchronization with all markers or only ['RWrist'].
             Testing with and without marker augmentation.
+            Testing binary pose files through synchronization, person association and triangulation, and their export to OpenPose json files.
             
             N.B.: Calibration from scene dimensions is not tested, as it requires the 
             user to click points on the image. 
@@ -147,6 +154,31 @@ class TestWorkflow(unittest.TestCase):
         config_dict.get('synchronization').update({'keypoints_to_consider':['RWrist']})
         config_dict.get('kinematics').update({'use_simple_model':True})
         Pose2Sim.runAll(config_dict)
+
+        # Binary pose files instead of json files
+        for pose_folder in ['pose', 'pose-sync', 'pose-associated']:
+            shutil.rmtree(pose_folder, ignore_errors=True) # json folders would take precedence
+        config_dict.get("pose").update({"output_format":['binary']})
+        Pose2Sim.poseEstimation(config_dict)
+        Pose2Sim.synchronization(config_dict)
+        Pose2Sim.personAssociation(config_dict)
+        Pose2Sim.triangulation(config_dict)
+
+        # Export binary pose files to OpenPose json files, and check that they hold the same data
+        pose_files = pose_files_names('pose')
+        self.assertTrue(len(pose_files) > 0)
+        for pose_file in pose_files:
+            pose_file_path = os.path.join('pose', pose_file)
+            frames, nb_persons, _, keypoints, scores = read_pose_file(pose_file_path)
+            offsets = np.r_[0, np.cumsum(nb_persons)]
+            with tempfile.TemporaryDirectory() as json_dir:
+                pose_binary_to_OpenPose.pose_binary_to_OpenPose_func(pose_file_path, json_dir)
+                frames_people = read_json_dir(json_dir)
+            self.assertEqual(sorted(frames_people), frames.tolist())
+            for i, f in enumerate(frames):
+                pose_binary_f = np.concatenate([keypoints[offsets[i]:offsets[i+1]], scores[offsets[i]:offsets[i+1], :, np.newaxis]], axis=2).reshape(nb_persons[i], keypoints.shape[1]*3)
+                pose_json_f = np.array(frames_people[f], dtype=np.float32).reshape(nb_persons[i], keypoints.shape[1]*3)
+                np.testing.assert_array_equal(pose_json_f, pose_binary_f)
         
 
         ####################
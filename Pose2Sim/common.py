@@ -11,19 +11,23 @@ Functions shared between modules, and other utilities
 '''
 
 ## INIT
+import os
 import toml
 import json
+import tempfile
 import numpy as np
 np.set_printoptions(legacy='1.21') # otherwise prints np.float64(3.0) rather than 3.0
 import pandas as pd
 from scipy import interpolate
 from scipy.optimize import linear_sum_assignment
 import re
+import fnmatch
 import cv2
 import c3d
 import sys
 import itertools as it
 import logging
+from functools import lru_cache
 from anytree import PreOrderIter
 
 import tkinter as tk
@@ -90,6 +94,9 @@ colors = [(255, 0, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255),
             (255, 0, 125), (255, 125, 0), (0, 125, 255), (0, 255, 125), (125, 0, 255), (125, 255, 0), (0, 255, 0)]
 thickness = 2
 
+pose_file_suffix = '_pose.bin' # binary pose files written by pose estimation with output_format = 'binary'
+pose_file_chunk_size = 300 # number of frames appended at once to binary pose files
+
 
 ## CLASSES
 class plotWindow():
@@ -218,7 +225,7 @@ def bounding_boxes(js_file, margin_percent=0.1, around='extremities'):
     or around the center of the person (with a margin).
 
     INPUTS:
-    - js_file: json file
+    - js_file: json file, or (binary pose file, frame index) tuple
     - margin_percent: margin around the person
     - around: 'extremities' or 'center'
 
@@ -227,26 +234,25 @@ def bounding_boxes(js_file, margin_percent=0.1, around='extremities'):
     '''
 
     bounding_boxes = []
-    with open(js_file, 'r') as json_f:
-        js = json.load(json_f)
-        for people in range(len(js['people'])):
-            if len(js['people'][people]['pose_keypoints_2d']) < 3: continue
-            else:
-                x = js['people'][people]['pose_keypoints_2d'][0::3]
-                y = js['people'][people]['pose_keypoints_2d'][1::3]
-                x_min, x_max = min(x), max(x)
-                y_min, y_max = min(y), max(y)
-
-                if around == 'extremities':
-                    dx = (x_max - x_min) * margin_percent
-                    dy = (y_max - y_min) * margin_percent
-                    bounding_boxes.append([x_min-dx, y_min-dy, x_max+dx, y_max+dy])
-                
-                elif around == 'center':
-                    x_mean, y_mean = np.mean(x), np.mean(y)
-                    x_size = (x_max - x_min) * (1 + margin_percent)
-                    y_size = (y_max - y_min) * (1 + margin_percent)
-                    bounding_boxes.append([x_mean - x_size/2, y_mean - y_size/2, x_mean + x_size/2, y_mean + y_size/2])
+    js = load_pose_frame(js_file) or {'people': []}
+    for people in range(len(js['people'])):
+        if len(js['people'][people]['pose_keypoints_2d']) < 3: continue
+        else:
+            x = js['people'][people]['pose_keypoints_2d'][0::3]
+            y = js['people'][people]['pose_keypoints_2d'][1::3]
+            x_min, x_max = min(x), max(x)
+            y_min, y_max = min(y), max(y)
+
+            if around == 'extremities':
+                dx = (x_max - x_min) * margin_percent
+                dy = (y_max - y_min) * margin_percent
+                bounding_boxes.append([x_min-dx, y_min-dy, x_max+dx, y_max+dy])
+            
+            elif around == 'center':
+                x_mean, y_mean = np.mean(x), np.mean(y)
+                x_size = (x_max - x_min) * (1 + margin_percent)
+                y_size = (y_max - y_min) * (1 + margin_percent)
+                bounding_boxes.append([x_mean - x_size/2, y_mean - y_size/2, x_mean + x_size/2, y_mean + y_size/2])
 
     return bounding_boxes   
 
@@ -266,6 +272,7 @@ def retrieve_calib_params(calib_file):
     - optim_K: intrinsic matrices for undistorting points as list of 3x3 arrays
     - R: rotation rodrigue vectors as list of 3x1 arrays
     - T: translation vectors as list of 3x1 arrays
+    - cam_center: camera centers in world coordinates as list of 3x1 arrays
     '''
     
     calib = toml.load(calib_file)
@@ -273,7 +280,7 @@ def retrieve_calib_params(calib_file):
     cal_keys = [c for c in calib.keys() 
                 if c not in ['metadata', 'capture_volume', 'charuco', 'checkerboard'] 
                 and isinstance(calib[c],dict)]
-    S, K, dist, optim_K, inv_K, R, R_mat, T = [], [], [], [], [], [], [], []
+    S, K, dist, optim_K, inv_K, R, R_mat, T, cam_center = [], [], [], [], [], [], [], [], []
     for c, cam in enumerate(cal_keys):
         S.append(np.array(calib[cam]['size']))
         K.append(np.array(calib[cam]['matrix']))
@@ -283,7 +290,8 @@ def retrieve_calib_params(calib_file):
         R.append(np.array(calib[cam]['rotation']))
         R_mat.append(cv2.Rodrigues(R[c])[0])
         T.append(np.array(calib[cam]['translation']))
-    calib_params = {'S': S, 'K': K, 'dist': dist, 'inv_K': inv_K, 'optim_K': optim_K, 'R': R, 'R_mat': R_mat, 'T': T}
+        cam_center.append(-R_mat[c].T @ T[c])
+    calib_params = {'S': S, 'K': K, 'dist': dist, 'inv_K': inv_K, 'optim_K': optim_K, 'R': R, 'R_mat': R_mat, 'T': T, 'cam_center': cam_center}
             
     return calib_params
 
@@ -324,6 +332,31 @@ def computeP(calib_file, undistort=False):
     return P
 
 
+def fundamental_matrices(P_all):
+    '''
+    Compute fundamental matrices between all pairs of cameras from their projection matrices.
+    F[i,j] maps a point in camera i to its epipolar line in camera j: l_j = F[i,j] @ [x_i, y_i, 1].
+    Points must be expressed in the same image coordinates as the projection matrices
+    (undistorted ones if computeP was called with undistort=True).
+
+    INPUT:
+    - P_all: list of arrays. Projection matrix for all cameras
+
+    OUTPUT:
+    - F: (n_cams, n_cams, 3, 3) array of fundamental matrices. F[i,i] is zero
+    '''
+
+    n_cams = len(P_all)
+    F = np.zeros((n_cams, n_cams, 3, 3))
+    centers = [np.linalg.svd(P)[2][-1] for P in P_all] # homogeneous camera centers: null space of P
+    for i, j in it.permutations(range(n_cams), 2):
+        e_j = P_all[j] @ centers[i] # epipole in camera j
+        e_j_cross = np.array([[0, -e_j[2], e_j[1]], [e_j[2], 0, -e_j[0]], [-e_j[1], e_j[0], 0]])
+        F[i,j] = e_j_cross @ P_all[j] @ np.linalg.pinv(P_all[i])
+
+    return F
+
+
 def weighted_triangulation(P_all,x_all,y_all,likelihood_all):
     '''
     Triangulation with direct linear transform,
@@ -354,6 +387,52 @@ def weighted_triangulation(P_all,x_all,y_all,likelihood_all):
     return Q
 
 
+def weighted_triangulation_batch(P_all, x_all, y_all, likelihood_all):
+    '''
+    Batched triangulation with direct linear transform,
+    weighted with likelihood of joint pose estimation.
+    All systems are solved at once with a single stacked SVD.
+
+    Same results as weighted_triangulation, but for any number of points
+    (frames, keypoints, camera subsets, etc). Cameras are excluded from a
+    system by setting their likelihood (or coordinates) to nan or 0.
+
+    INPUTS:
+    - P_all: list of arrays or (n_cams, 3, 4) array. Projection matrices of all cameras
+    - x_all, y_all: (..., n_cams) arrays. x, y 2D coordinates to triangulate
+    - likelihood_all: (..., n_cams) array. Likelihood of joint pose estimation
+
+    OUTPUT:
+    - Q: (..., 4) array of triangulated points (x,y,z,1.).
+         nan if fewer than 2 cameras are available
+    '''
+
+    P_all = np.asarray(P_all, dtype=float)
+    x_all, y_all, likelihood_all = np.broadcast_arrays(np.asarray(x_all, dtype=float),
+                                                       np.asarray(y_all, dtype=float),
+                                                       np.asarray(likelihood_all, dtype=float))
+
+    # Excluded cameras do not contribute to the system
+    valid = ~(np.isnan(x_all) | np.isnan(y_all) | np.isnan(likelihood_all)) & (likelihood_all != 0)
+    weights = np.where(valid, likelihood_all, 0.)[..., None]
+    x_all = np.where(valid, x_all, 0.)[..., None]
+    y_all = np.where(valid, y_all, 0.)[..., None]
+
+    # Stack the two equations of each camera: (..., 2*n_cams, 4)
+    A = np.concatenate(((P_all[:,0] - x_all*P_all[:,2]) * weights,
+                        (P_all[:,1] - y_all*P_all[:,2]) * weights), axis=-2)
+
+    # Solution is the right singular vector with the smallest singular value
+    _, _, Vt = np.linalg.svd(A, full_matrices=False)
+    V_last = Vt[..., -1, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Q = V_last / V_last[..., 3:4]
+    Q[np.count_nonzero(valid, axis=-1) < 2] = np.nan
+    Q[..., 3] = 1
+
+    return Q
+
+
 def reprojection(P_all, Q):
     '''
     Reprojects 3D point on all cameras.
@@ -375,6 +454,85 @@ def reprojection(P_all, Q):
     return x_calc, y_calc
 
 
+def reprojection_batch(P_all, Q):
+    '''
+    Reprojects any number of 3D points on all cameras at once.
+
+    INPUTS:
+    - P_all: list of arrays or (n_cams, 3, 4) array. Projection matrices of all cameras
+    - Q: (..., 4) array of triangulated points (x,y,z,1.)
+
+    OUTPUTS:
+    - x_calc, y_calc: (..., n_cams) arrays of coordinates of points reprojected on all cameras
+    '''
+
+    P_all = np.asarray(P_all, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+
+    q_calc = np.einsum('cij,...j->...ci', P_all, Q)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_calc = q_calc[..., 0] / q_calc[..., 2]
+        y_calc = q_calc[..., 1] / q_calc[..., 2]
+
+    return x_calc, y_calc
+
+
+def project_points_batch(calib_params, Q):
+    '''
+    Reprojects any number of 3D points on all cameras, taking lens distortions into account.
+    Uses one cv2.projectPoints call per camera.
+
+    INPUTS:
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
+    - Q: (..., 4) or (..., 3) array of 3D points
+
+    OUTPUTS:
+    - x_calc, y_calc: (..., n_cams) arrays of coordinates of points reprojected on all cameras
+    '''
+
+    n_cams = len(calib_params['K'])
+    points_shape = np.shape(Q)[:-1]
+    Q_flat = np.ascontiguousarray(np.reshape(Q, (-1, np.shape(Q)[-1]))[:,:3], dtype=float)
+
+    x_calc = np.full(points_shape + (n_cams,), np.nan)
+    y_calc = np.full(points_shape + (n_cams,), np.nan)
+    if len(Q_flat) == 0:
+        return x_calc, y_calc
+    for c in range(n_cams):
+        coords_2D_calc = cv2.projectPoints(Q_flat, calib_params['R'][c], calib_params['T'][c], calib_params['K'][c], calib_params['dist'][c])[0]
+        x_calc[...,c] = coords_2D_calc[:,0,0].reshape(points_shape)
+        y_calc[...,c] = coords_2D_calc[:,0,1].reshape(points_shape)
+
+    return x_calc, y_calc
+
+
+def undistort_points_batch(calib_params, x_all, y_all):
+    '''
+    Undistorts any number of 2D points on all cameras.
+    Uses one cv2.undistortPoints call per camera, on a contiguous (N,1,2) buffer.
+    This is good for slight distortion. For fisheye camera, the model does not work anymore. 
+    See there for an example https://github.com/lambdaloop/aniposelib/blob/d03b485c4e178d7cff076e9fe1ac36837db49158/aniposelib/cameras.py#L301
+
+    INPUTS:
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
+    - x_all, y_all: (n_cams, ...) arrays of 2D coordinates. float32 or float64, data type is kept
+
+    OUTPUTS:
+    - x_undist, y_undist: (n_cams, ...) arrays of undistorted 2D coordinates
+    '''
+
+    x_undist, y_undist = np.array(x_all, copy=True), np.array(y_all, copy=True)
+    for c in range(len(x_undist)):
+        points = np.ascontiguousarray(np.stack([x_undist[c], y_undist[c]], axis=-1).reshape(-1,1,2))
+        if len(points) == 0:
+            continue
+        undistorted_points = cv2.undistortPoints(points, calib_params['K'][c], calib_params['dist'][c], None, calib_params['optim_K'][c])
+        x_undist[c] = undistorted_points[:,0,0].reshape(np.shape(x_undist[c]))
+        y_undist[c] = undistorted_points[:,0,1].reshape(np.shape(y_undist[c]))
+
+    return x_undist, y_undist
+
+
 def euclidean_distance(q1, q2):
     '''
     Euclidean distance between 2 points (N-dim).
@@ -593,6 +751,548 @@ def natural_sort_key(s):
     return [int(c) if c.isdigit() else c.lower() for c in re.split(r'(\d+)', s)]
 
 
+def read_json_dir(json_dir, json_fnames=None):
+    '''
+    Read all OpenPose json files of a camera folder.
+
+    INPUTS:
+    - json_dir: str. Folder containing one json file per frame
+    - json_fnames: list of str. Only read these files. Default: all json files of the folder
+
+    OUTPUT:
+    - frames_people: dict. {frame number: list of (n_keypoints*3,) float32 arrays, one per person}
+                     The frame number is the last number in the file name.
+    '''
+
+    if json_fnames is None:
+        json_fnames = fnmatch.filter(os.listdir(json_dir), '*.json')
+
+    frames_people = {}
+    for json_fname in json_fnames:
+        numbers = re.findall(r'\d+', json_fname)
+        if not numbers:
+            continue
+        try:
+            with open(os.path.join(json_dir, json_fname), 'r') as json_f:
+                people = json.load(json_f).get('people', [])
+        except:
+            people = []
+        frames_people[int(numbers[-1])] = [np.array(p.get('pose_keypoints_2d', []), dtype=np.float32) for p in people]
+
+    return frames_people
+
+
+def openpose_people(keypoints, scores, person_ids=None):
+    '''
+    Build the "people" list of an OpenPose json file from keypoints and scores arrays.
+
+    INPUTS:
+    - keypoints: array of detected keypoints (nb persons * nb keypoints * 2)
+    - scores: array of confidence scores (nb persons * nb keypoints)
+    - person_ids: array of person IDs (nb persons). Default: -1 for all persons
+
+    OUTPUT:
+    - people: list of dict, one per person, with x, y, likelihood in "pose_keypoints_2d"
+    '''
+
+    nb_persons = len(keypoints)
+    if nb_persons == 0:
+        return []
+    keypoints = np.asarray(keypoints).reshape(nb_persons, -1, 2)
+    scores = np.asarray(scores).reshape(nb_persons, -1, 1)
+    keypoints_with_confidence = np.concatenate([keypoints, scores], axis=2).reshape(nb_persons, -1).tolist()
+    person_ids = [-1]*nb_persons if person_ids is None else np.asarray(person_ids).tolist()
+
+    people = [{
+                "person_id": [person_id],
+                "pose_keypoints_2d": keypoints_with_confidence_i,
+                "face_keypoints_2d": [],
+                "hand_left_keypoints_2d": [],
+                "hand_right_keypoints_2d": [],
+                "pose_keypoints_3d": [],
+                "face_keypoints_3d": [],
+                "hand_left_keypoints_3d": [],
+                "hand_right_keypoints_3d": []
+            } for person_id, keypoints_with_confidence_i in zip(person_ids, keypoints_with_confidence)]
+
+    return people
+
+
+def append_pose_file(pose_file_path, frames, keypoints, scores, person_ids=None):
+    '''
+    Append a chunk of frames to a binary pose file, created if it does not exist.
+
+    A binary pose file holds the 2D poses of one video. It is a sequence of chunks,
+    each made of 5 consecutive .npy arrays: frame indices (n_frames,), number of persons
+    per frame (n_frames,), person IDs (n_persons,), keypoints (n_persons, n_keypoints, 2),
+    and scores (n_persons, n_keypoints), where n_persons is the total over all frames 
+    of the chunk. Chunks can be appended at any time, and an interrupted write 
+    only loses the last chunk.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file (name ending with pose_file_suffix)
+    - frames: list of int. Frame indices
+    - keypoints: list of arrays (nb persons * nb keypoints * 2), one per frame
+    - scores: list of arrays (nb persons * nb keypoints), one per frame
+    - person_ids: list of arrays (nb persons), one per frame. Default: -1 for all persons
+
+    OUTPUT:
+    - None. The chunk is appended to pose_file_path
+    '''
+
+    if len(frames) == 0:
+        return
+    nb_persons = np.array([len(k) for k in keypoints], dtype=np.int32)
+    nb_keypoints = max([np.shape(s)[-1] for s in scores if len(s) > 0], default=0)
+    if person_ids is None:
+        person_ids = np.full(nb_persons.sum(), -1, dtype=np.int32)
+    else:
+        person_ids = np.concatenate([np.zeros(0, dtype=np.int32)] + [np.asarray(p, dtype=np.int32).reshape(-1) for p in person_ids])
+    keypoints = np.concatenate([np.zeros((0, nb_keypoints, 2), dtype=np.float32)] + [np.asarray(k, dtype=np.float32).reshape(-1, nb_keypoints, 2) for k in keypoints if len(k) > 0])
+    scores = np.concatenate([np.zeros((0, nb_keypoints), dtype=np.float32)] + [np.asarray(s, dtype=np.float32).reshape(-1, nb_keypoints) for s in scores if len(s) > 0])
+
+    pose_file_dir = os.path.dirname(os.path.abspath(pose_file_path))
+    if not os.path.isdir(pose_file_dir): os.makedirs(pose_file_dir)
+    with open(pose_file_path, 'ab') as pose_f:
+        for array in [np.asarray(frames, dtype=np.int64), nb_persons, person_ids, keypoints, scores]:
+            np.lib.format.write_array(pose_f, array, allow_pickle=False)
+        pose_f.flush()
+        os.fsync(pose_f.fileno())
+
+
+def iter_pose_file_chunks(pose_file_path):
+    '''
+    Iterate over the complete chunks of a binary pose file, in file order.
+    Only one chunk is loaded at a time.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file
+
+    OUTPUTS:
+    - generator of (chunk, chunk_end): chunk is a [frames, nb_persons, person_ids, keypoints, scores] list of arrays, 
+      chunk_end is the position in bytes of the end of the chunk in the file
+    '''
+
+    file_size = os.path.getsize(pose_file_path)
+    with open(pose_file_path, 'rb') as pose_f:
+        while pose_f.tell() < file_size:
+            try:
+                chunk = [np.lib.format.read_array(pose_f, allow_pickle=False) for _ in range(5)]
+            except (ValueError, EOFError, OSError):
+                break
+            yield chunk, pose_f.tell()
+
+
+def read_pose_file_chunks(pose_file_path):
+    '''
+    Read the complete chunks of a binary pose file, in file order.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file
+
+    OUTPUTS:
+    - chunks: list of [frames, nb_persons, person_ids, keypoints, scores] arrays, one per chunk
+    - valid_size: int. Size in bytes of the complete chunks. Smaller than the file size
+      if the last chunk was interrupted while being written
+    '''
+
+    chunks = []
+    valid_size = 0
+    for chunk, valid_size in iter_pose_file_chunks(pose_file_path):
+        chunks.append(chunk)
+
+    return chunks, valid_size
+
+
+def truncate_pose_file(pose_file_path):
+    '''
+    Cut off the incomplete last chunk of a binary pose file, left by an interrupted run,
+    so that new chunks can be appended after the complete ones.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file
+
+    OUTPUT:
+    - None. The file is truncated in place if needed
+    '''
+
+    _, valid_size = read_pose_file_chunks(pose_file_path)
+    if valid_size < os.path.getsize(pose_file_path):
+        logging.warning(f'{pose_file_path} ends with an incomplete chunk, which is removed.')
+        with open(pose_file_path, 'r+b') as pose_f:
+            pose_f.truncate(valid_size)
+
+
+def read_pose_file(pose_file_path):
+    '''
+    Read a binary pose file written by append_pose_file.
+    A frame written several times keeps its last version. A truncated last chunk is ignored.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file
+
+    OUTPUTS:
+    - frames: (n_frames,) int array. Sorted frame indices
+    - nb_persons: (n_frames,) int array. Number of persons in each frame
+    - person_ids: (n_persons,) int array
+    - keypoints: (n_persons, n_keypoints, 2) float32 array of x, y
+    - scores: (n_persons, n_keypoints) float32 array of likelihoods
+      Persons of frames[i] are the rows offsets[i]:offsets[i+1], with offsets = np.r_[0, np.cumsum(nb_persons)]
+    '''
+
+    chunks, valid_size = read_pose_file_chunks(pose_file_path)
+    if valid_size < os.path.getsize(pose_file_path):
+        logging.warning(f'{pose_file_path} ends with an incomplete chunk, which is ignored.')
+
+    nb_keypoints = max([chunk[4].shape[1] for chunk in chunks if chunk[4].size > 0], default=0)
+    chunks = [chunk for chunk in chunks if len(chunk[0]) > 0]
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), \
+               np.zeros((0, nb_keypoints, 2), dtype=np.float32), np.zeros((0, nb_keypoints), dtype=np.float32)
+    frames = np.concatenate([chunk[0] for chunk in chunks])
+    nb_persons = np.concatenate([chunk[1] for chunk in chunks])
+    person_ids = np.concatenate([chunk[2] for chunk in chunks])
+    keypoints = np.concatenate([np.zeros((0, nb_keypoints, 2), dtype=np.float32)] + [chunk[3] for chunk in chunks if len(chunk[3]) > 0])
+    scores = np.concatenate([np.zeros((0, nb_keypoints), dtype=np.float32)] + [chunk[4] for chunk in chunks if len(chunk[4]) > 0])
+
+    # Keep the last version of each frame, in frame order
+    _, last_idx = np.unique(frames[::-1], return_index=True)
+    keep = len(frames) - 1 - last_idx
+    if len(keep) < len(frames) or np.any(np.diff(frames) < 0):
+        offsets = np.r_[0, np.cumsum(nb_persons)]
+        rows = np.concatenate([np.arange(offsets[i], offsets[i+1]) for i in keep]).astype(int)
+        frames, nb_persons = frames[keep], nb_persons[keep]
+        person_ids, keypoints, scores = person_ids[rows], keypoints[rows], scores[rows]
+
+    return frames, nb_persons, person_ids, keypoints, scores
+
+
+def read_pose_file_people(pose_file_path):
+    '''
+    Read a binary pose file in the same form as read_json_dir.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file
+
+    OUTPUT:
+    - frames_people: dict. {frame number: list of (n_keypoints*3,) float32 arrays, one per person}
+    '''
+
+    frames, nb_persons, _, keypoints, scores = read_pose_file(pose_file_path)
+    people = np.concatenate([keypoints, scores[..., np.newaxis]], axis=2).reshape(len(keypoints), -1)
+    offsets = np.r_[0, np.cumsum(nb_persons)]
+
+    return {int(f): list(people[offsets[i]:offsets[i+1]]) for i, f in enumerate(frames)}
+
+
+def pose_file_to_openpose(pose_file_path, json_dir=None, frame_range=None):
+    '''
+    Export a binary pose file to one OpenPose json file per frame.
+    Files are named as by pose estimation with output_format = 'openpose'.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file, e.g. pose/cam01_pose.bin
+    - json_dir: str. Output folder. Default: pose/cam01_json next to the binary pose file
+    - frame_range: list of two int. Only export these frames. Default: all frames
+
+    OUTPUT:
+    - json_dir: str. Folder of the exported json files
+    '''
+
+    video_name = os.path.basename(pose_file_path)[:-len(pose_file_suffix)] if pose_file_path.endswith(pose_file_suffix) else os.path.splitext(os.path.basename(pose_file_path))[0]
+    if json_dir is None:
+        json_dir = os.path.join(os.path.dirname(os.path.abspath(pose_file_path)), f'{video_name}_json')
+    if not os.path.isdir(json_dir): os.makedirs(json_dir)
+
+    frames, nb_persons, person_ids, keypoints, scores = read_pose_file(pose_file_path)
+    offsets = np.r_[0, np.cumsum(nb_persons)]
+    for i, f in enumerate(frames):
+        if frame_range not in (None, 'all', 'auto', []) and f not in range(*frame_range):
+            continue
+        persons = slice(offsets[i], offsets[i+1])
+        json_output = {"version": 1.3, "people": openpose_people(keypoints[persons], scores[persons], person_ids[persons])}
+        with open(os.path.join(json_dir, f'{video_name}_{f:06d}.json'), 'w') as json_file:
+            json.dump(json_output, json_file)
+
+    return json_dir
+
+
+def pose_files_names(pose_dir):
+    '''
+    Names of the binary pose files of a folder, one per camera, 
+    in the same order as json folders.
+
+    INPUTS:
+    - pose_dir: str. Folder containing the binary pose files (pose, or pose-sync)
+
+    OUTPUT:
+    - pose_files_names: list of str
+    '''
+
+    if not os.path.isdir(pose_dir):
+        return []
+    return sort_stringlist_by_last_number(fnmatch.filter(os.listdir(pose_dir), '*'+pose_file_suffix))
+
+
+@lru_cache(maxsize=32)
+def read_pose_file_cached(pose_file_path, mtime_ns):
+    '''
+    read_pose_file, kept in memory as long as the modification time of the file does not change.
+    '''
+
+    frames, nb_persons, person_ids, keypoints, scores = read_pose_file(pose_file_path)
+    return frames, np.r_[0, np.cumsum(nb_persons)], person_ids, keypoints, scores
+
+
+def read_pose_file_frame(pose_file_path, frame):
+    '''
+    Read one frame of a binary pose file, as if it were an OpenPose json file.
+    The whole file is read once and kept in memory for the next frames.
+
+    INPUTS:
+    - pose_file_path: str. Path of the binary pose file
+    - frame: int. Frame index
+
+    OUTPUT:
+    - json_content: dict with "version" and "people" keys, as in OpenPose json files, 
+      or None if the frame is not in the file
+    '''
+
+    frames, offsets, person_ids, keypoints, scores = read_pose_file_cached(pose_file_path, os.stat(pose_file_path).st_mtime_ns)
+    i = np.searchsorted(frames, frame)
+    if i >= len(frames) or frames[i] != frame:
+        return None
+    persons = slice(offsets[i], offsets[i+1])
+
+    return {"version": 1.3, "people": openpose_people(keypoints[persons], scores[persons], person_ids[persons])}
+
+
+def pose_frames_list(pose_source):
+    '''
+    Frames of one camera, in frame order: json file paths of a json folder,
+    or (binary pose file path, frame index) tuples of a binary pose file.
+
+    INPUTS:
+    - pose_source: str. Path of a json folder or of a binary pose file
+
+    OUTPUT:
+    - pose_frames: list of str or tuple, each one readable with load_pose_frame
+    '''
+
+    pose_source = str(pose_source)
+    if pose_source.endswith(pose_file_suffix):
+        return [(pose_source, f) for f in read_pose_file_cached(pose_source, os.stat(pose_source).st_mtime_ns)[0].tolist()]
+
+    return [os.path.join(pose_source, f) for f in sort_stringlist_by_last_number(fnmatch.filter(os.listdir(pose_source), '*.json'))]
+
+
+def load_pose_frame(pose_frame):
+    '''
+    Read one frame returned by pose_frames_list, as OpenPose json content.
+
+    INPUTS:
+    - pose_frame: str (json file path) or tuple (binary pose file path, frame index)
+
+    OUTPUT:
+    - json_content: dict with "version" and "people" keys.
+      None if the frame is not in the binary pose file
+    '''
+
+    if isinstance(pose_frame, tuple):
+        return read_pose_file_frame(*pose_frame)
+    with open(pose_frame, 'r') as json_f:
+        return json.load(json_f)
+
+
+def pose_sources_names(pose_dir):
+    '''
+    Names of the 2D pose data of a folder, one per camera, in camera order: 
+    json folders if there are any, binary pose files otherwise.
+
+    INPUTS:
+    - pose_dir: str. Folder containing the pose data (pose, pose-sync, or pose-associated)
+
+    OUTPUT:
+    - sources_names: list of str. Empty if the folder does not exist
+    '''
+
+    if not os.path.isdir(pose_dir):
+        return []
+    json_dirs_names = [k for k in sort_stringlist_by_last_number(next(os.walk(pose_dir))[1]) if 'json' in k]
+
+    return json_dirs_names if len(json_dirs_names) > 0 else pose_files_names(pose_dir)
+
+
+def pose_source_frames(pose_dir, source_name):
+    '''
+    Frame numbers available in a json folder (last number of each json file name)
+    or in a binary pose file.
+
+    INPUTS:
+    - pose_dir: str. Folder containing the pose data
+    - source_name: str. Name of the json folder or binary pose file
+
+    OUTPUT:
+    - frames: sorted list of int
+    '''
+
+    source_path = os.path.join(pose_dir, source_name)
+    if source_name.endswith(pose_file_suffix):
+        return read_pose_file_cached(source_path, os.stat(source_path).st_mtime_ns)[0].tolist()
+    numbers = [re.findall(r'\d+', f) for f in fnmatch.filter(os.listdir(source_path), '*.json')]
+
+    return sorted([int(n[-1]) for n in numbers if n])
+
+
+def json_dirs_cache_key(pose_dir, json_dirs_names):
+    '''
+    Signature of the json folders, used to invalidate the pose tensor cache.
+    For each folder: name, folder modification time, number of json files, 
+    and latest json file modification time (files rewritten in place do not
+    change the folder modification time).
+    For each binary pose file: name, modification time, and size.
+
+    INPUTS:
+    - pose_dir: str. Directory containing the json folders
+    - json_dirs_names: list of str. Names of the json folders, in camera order
+
+    OUTPUT:
+    - cache_key: str
+    '''
+
+    key = []
+    for js_dir in json_dirs_names:
+        json_dir = os.path.join(pose_dir, js_dir)
+        if js_dir.endswith(pose_file_suffix):
+            key.append([js_dir, os.stat(json_dir).st_mtime_ns, os.stat(json_dir).st_size])
+            continue
+        with os.scandir(json_dir) as entries:
+            json_mtimes = [e.stat().st_mtime_ns for e in entries if e.name.endswith('.json')]
+        key.append([js_dir, os.stat(json_dir).st_mtime_ns, len(json_mtimes), max(json_mtimes, default=0)])
+
+    return json.dumps(key)
+
+
+def load_pose_tensor(pose_dir, json_dirs_names, cache=True, mmap_mode=None, block_size=1000):
+    '''
+    Read the json files of all cameras at once into a dense array.
+    The array is cached in pose_dir/pose_tensor_cache.npy (signature of the json
+    folders in pose_tensor_cache.json), and reloaded directly as long as the 
+    json folders have not changed.
+
+    Json files are read by blocks of block_size frames, and binary pose files chunk 
+    by chunk. With mmap_mode, blocks are spilled to disk and the cache file is memory-mapped, so that memory usage 
+    does not depend on the length of the recording.
+
+    INPUTS:
+    - pose_dir: str. Directory containing one json folder or binary pose file per camera (pose, pose-sync, or pose-associated)
+    - json_dirs_names: list of str. Names of the json folders or binary pose files, in camera order
+    - cache: bool. Whether to read and write the cache file
+    - mmap_mode: None, 'r', 'r+', or 'c'. If set, memory-map the cache file instead of loading it (requires cache=True)
+    - block_size: int. Number of json files read at once in each folder
+
+    OUTPUT:
+    - pose_tensor: (n_cams, n_frames, n_persons, n_keypoints, 3) float32 array of x, y, likelihood.
+                   Frame f is the json file whose name ends with number f, or frame index f of a binary pose file. nan if no data.
+    '''
+
+    cache_path = os.path.join(pose_dir, 'pose_tensor_cache.npy')
+    key_path = os.path.join(pose_dir, 'pose_tensor_cache.json')
+    cache_key = json_dirs_cache_key(pose_dir, json_dirs_names)
+    if cache and os.path.isfile(cache_path) and os.path.isfile(key_path):
+        try:
+            with open(key_path, 'r') as key_f:
+                if key_f.read() == cache_key:
+                    return np.load(cache_path, mmap_mode=mmap_mode)
+        except Exception:
+            logging.warning(f'Could not read {cache_path}. Reading json files again.')
+
+    # Read json files by blocks of frames
+    spill = cache and mmap_mode is not None
+    spill_dir = tempfile.TemporaryDirectory(dir=pose_dir) if spill else None
+    try:
+        blocks = [] # (camera, frame numbers, block array or spilled block file)
+        n_frames, n_persons, n_keypoints = 0, 0, 0
+        for c, js_dir in enumerate(json_dirs_names):
+            json_dir = os.path.join(pose_dir, js_dir)
+            if js_dir.endswith(pose_file_suffix):
+                # Binary pose file: chunk by chunk. Later chunks overwrite the frames written again
+                chunk_end = 0
+                for b, ((frames, nb_persons, _, keypoints, scores), chunk_end) in enumerate(iter_pose_file_chunks(json_dir)):
+                    if len(frames) == 0:
+                        continue
+                    block = np.full((len(frames), nb_persons.max(), keypoints.shape[1], 3), np.nan, dtype=np.float32)
+                    frame_rows = np.repeat(np.arange(len(frames)), nb_persons)
+                    person_rows = np.arange(len(keypoints)) - np.repeat(np.r_[0, np.cumsum(nb_persons)[:-1]], nb_persons)
+                    block[frame_rows, person_rows] = np.concatenate([keypoints, scores[..., np.newaxis]], axis=2)
+                    # last version of the frames written several times in the chunk
+                    frames, last_idx = np.unique(frames[::-1], return_index=True)
+                    block = block[len(block) - 1 - last_idx]
+                    n_frames, n_persons, n_keypoints = max(n_frames, frames.max()+1), max(n_persons, block.shape[1]), max(n_keypoints, block.shape[2])
+                    if spill:
+                        block_path = os.path.join(spill_dir.name, f'{c}_{b}.npy')
+                        np.save(block_path, block)
+                        block = block_path
+                    blocks.append((c, frames, block))
+                if chunk_end < os.path.getsize(json_dir):
+                    logging.warning(f'{json_dir} ends with an incomplete chunk, which is ignored.')
+                continue
+            json_fnames = fnmatch.filter(os.listdir(json_dir), '*.json')
+            for b in range(0, len(json_fnames), block_size):
+                frames_people = read_json_dir(json_dir, json_fnames[b:b+block_size])
+                if not frames_people:
+                    continue
+                frames = np.array(list(frames_people.keys()))
+                n_persons_b = max([len(people) for people in frames_people.values()])
+                n_keypoints_b = max([len(p)//3 for people in frames_people.values() for p in people], default=0)
+                block = np.full((len(frames), n_persons_b, n_keypoints_b, 3), np.nan, dtype=np.float32)
+                for i, people in enumerate(frames_people.values()):
+                    for n, p in enumerate(people):
+                        n_kpts_p = len(p)//3
+                        block[i, n, :n_kpts_p] = p[:n_kpts_p*3].reshape(-1,3)
+                n_frames, n_persons, n_keypoints = max(n_frames, frames.max()+1), max(n_persons, n_persons_b), max(n_keypoints, n_keypoints_b)
+                if spill:
+                    block_path = os.path.join(spill_dir.name, f'{c}_{b}.npy')
+                    np.save(block_path, block)
+                    block = block_path
+                blocks.append((c, frames, block))
+
+        # Gather blocks, directly in the cache file if possible
+        shape = (len(json_dirs_names), n_frames, n_persons, n_keypoints, 3)
+        pose_tensor = None
+        if cache:
+            try:
+                if os.path.isfile(key_path):
+                    os.remove(key_path)
+                pose_tensor = np.lib.format.open_memmap(cache_path, mode='w+', dtype=np.float32, shape=shape)
+                for c in range(shape[0]):
+                    for f in range(0, n_frames, block_size):
+                        pose_tensor[c, f:f+block_size] = np.nan
+            except (OSError, ValueError):
+                logging.warning(f'Could not write {cache_path}.')
+                pose_tensor, cache = None, False
+        if pose_tensor is None:
+            pose_tensor = np.full(shape, np.nan, dtype=np.float32)
+        for c, frames, block in blocks:
+            if isinstance(block, str):
+                block = np.load(block)
+            pose_tensor[c, frames, :block.shape[1], :block.shape[2]] = block
+            if block.shape[1] < n_persons:
+                pose_tensor[c, frames, block.shape[1]:] = np.nan # persons of an older version of the frame
+    finally:
+        if spill_dir is not None:
+            spill_dir.cleanup()
+
+    if cache:
+        pose_tensor.flush()
+        del pose_tensor
+        with open(key_path, 'w') as key_f:
+            key_f.write(cache_key)
+        pose_tensor = np.load(cache_path, mmap_mode=mmap_mode)
+
+    return pose_tensor
+
+
 def zup2yup(Q):
     '''
     Turns Z-up system coordinates into Y-up coordinates
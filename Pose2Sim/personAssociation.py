@@ -38,16 +38,19 @@ import re
 import numpy as np
 np.set_printoptions(legacy='1.21') # otherwise prints np.float64(3.0) rather than 3.0
 import json
+import time
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import itertools as it
 import toml
 from tqdm import tqdm
-import cv2
 from anytree import RenderTree, PreOrderIter
 from anytree.importer import DictImporter
 import logging
 
-from Pose2Sim.common import retrieve_calib_params, computeP, weighted_triangulation, \
-    reprojection, euclidean_distance, sort_stringlist_by_last_number
+from Pose2Sim.common import retrieve_calib_params, computeP, fundamental_matrices, weighted_triangulation_batch, \
+    reprojection_batch, project_points_batch, undistort_points_batch, euclidean_distance, sort_stringlist_by_last_number, \
+    pose_files_names, pose_source_frames, load_pose_frame, pose_file_suffix
 from Pose2Sim.skeletons import *
 
 
@@ -64,31 +67,105 @@ __status__ = "Development"
 
 
 ## FUNCTIONS
-def persons_combinations(json_files_framef):
+def epipolar_compatibility(detections_f, F_all, tracked_keypoint_id, calib_params, config_dict):
+    '''
+    Check which pairs of detections from two different cameras are consistent 
+    with the epipolar geometry. A pair is incompatible if the tracked keypoint 
+    of one detection is farther than "epipolar_gating_px" from the epipolar line 
+    of the other one (in either direction).
+    Detections whose tracked keypoint is missing or below the likelihood threshold
+    cannot be checked, and are compatible with all others.
+
+    INPUTS:
+    - detections_f: dict of parsed json files from read_frame_detections
+    - F_all: (n_cams, n_cams, 3, 3) array of fundamental matrices (from fundamental_matrices)
+    - tracked_keypoint_id: int
+    - calib_params: dict: calibration parameters
+    - config_dict: dictionary from Config.toml file
+
+    OUTPUT:
+    - compatibility: dict of boolean arrays. compatibility[(i,j)][p_i,p_j] for each pair of cameras i<j
+    '''
+
+    epipolar_gating_px = config_dict.get('personAssociation').get('single_person').get('epipolar_gating_px')
+    undistort_points = config_dict.get('triangulation').get('undistort_points')
+    likelihood_threshold = config_dict.get('personAssociation').get('likelihood_threshold_association')
+
+    n_cams = len(detections_f['keypoints'])
+
+    # Homogeneous coordinates of the tracked keypoint for all persons: (n_cams, max_persons, 3)
+    json_data = detections_f['keypoints']
+    max_persons = max([len(js) for js in json_data] + [1])
+    coords = np.full((n_cams, max_persons, 3), np.nan)
+    for c, js in enumerate(json_data):
+        for n, person in enumerate(js):
+            coords[c, n] = person[tracked_keypoint_id*3:tracked_keypoint_id*3+3]
+    if undistort_points:
+        coords[...,0], coords[...,1] = undistort_points_batch(calib_params, coords[...,0], coords[...,1])
+    with np.errstate(invalid='ignore'):
+        coords[~(coords[...,2] >= likelihood_threshold)] = np.nan
+    coords[...,2] = np.where(np.isnan(coords[...,0]), np.nan, 1.)
+
+    compatibility = {}
+    for i, j in it.combinations(range(n_cams), 2):
+        lines_j = coords[i] @ F_all[i,j].T # epipolar lines in camera j of persons of camera i
+        lines_i = coords[j] @ F_all[i,j] # epipolar lines in camera i of persons of camera j
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dist_j = np.abs(lines_j @ coords[j].T) / np.linalg.norm(lines_j[:,:2], axis=1)[:,None]
+            dist_i = np.abs(coords[i] @ lines_i.T) / np.linalg.norm(lines_i[:,:2], axis=1)[None,:]
+            compatibility[(i,j)] = ~(np.fmax(dist_i, dist_j) > epipolar_gating_px) # nan (unchecked) is compatible
+
+    return compatibility
+
+
+def persons_combinations(detections_f, compatibility=None):
     '''
     Find all possible combinations of detected persons' ids. 
     Person's id when no person detected is set to -1.
+
+    If compatibility is given, combinations are built camera by camera, and a person 
+    is only added if it is compatible with all the persons already chosen. 
+    A camera may also be left out (nan), but only maximal combinations are kept,
+    i.e. those to which no left-out camera could be added back. They are sorted 
+    by decreasing number of cameras.
+    With all pairs compatible, this gives the same combinations as without gating.
     
     INPUT:
-    - json_files_framef: list of strings
+    - detections_f: dict of parsed json files from read_frame_detections
+    - compatibility: dict of boolean arrays from epipolar_compatibility, or None
 
     OUTPUT:
     - personsIDs_comb: array, list of lists of int
     '''
     
-    n_cams = len(json_files_framef)
+    n_cams = len(detections_f['nb_persons'])
     
     # amount of persons detected for each cam
-    nb_persons_per_cam = []
-    for c in range(n_cams):
-        try:
-            with open(json_files_framef[c], 'r') as js:
-                people = json.load(js)['people']
-                people = [p for p in people if not all(np.isnan(p["pose_keypoints_2d"][::3]))]
-                nb_persons_per_cam += [len(people)]
-        except:
-            nb_persons_per_cam += [0]
+    nb_persons_per_cam = list(detections_f['nb_persons'])
     
+    # epipolar-consistent persons combinations
+    if compatibility is not None:
+        def is_compatible(comb, c, p):
+            return all(compatibility[(c_prev, c)][comb[c_prev], p] for c_prev in range(c) if comb[c_prev] is not None) \
+               and all(compatibility[(c, c_next)][p, comb[c_next]] for c_next in range(c+1, n_cams) if comb[c_next] is not None)
+
+        personsIDs_comb = []
+        def build_combinations(comb, c):
+            if c == n_cams:
+                # only keep maximal combinations
+                if not any(comb[c_off] is None and any(is_compatible(comb, c_off, p) for p in range(nb_persons_per_cam[c_off])) for c_off in range(n_cams)):
+                    personsIDs_comb.append([np.nan if p is None else p for p in comb])
+                return
+            for p in range(nb_persons_per_cam[c]):
+                if is_compatible(comb, c, p):
+                    build_combinations(comb[:c] + [p] + comb[c+1:], c+1)
+            build_combinations(comb, c+1) # camera left out
+
+        build_combinations([None]*n_cams, 0)
+        personsIDs_comb = np.array(personsIDs_comb, float).reshape(-1, n_cams)
+        # combinations with more cameras are tried first
+        return personsIDs_comb[np.argsort(np.isnan(personsIDs_comb).sum(axis=1), kind='stable')]
+
     # persons combinations
     id_no_detect = [i for i, x in enumerate(nb_persons_per_cam) if x == 0]  # ids of cameras that have not detected any person
     nb_persons_per_cam = [x if x != 0 else 1 for x in nb_persons_per_cam] # temporarily replace persons count by 1 when no detection
@@ -102,56 +179,52 @@ def persons_combinations(json_files_framef):
 def triangulate_comb(comb, coords, P_all, calib_params, config_dict):
     '''
     Triangulate 2D points and compute reprojection error for a combination of cameras.
+    Several combinations can be passed at once, in which case they are all solved 
+    with a single batched triangulation.
+
     INPUTS:
-    - comb: list of ints: combination of persons' ids for each camera
+    - comb: list of ints: combination of persons' ids for each camera (nan if camera excluded)
+            or 2D array: n_combinations * n_cams
     - coords: array: x, y, likelihood for each camera
     - P_all: list of arrays: projection matrices for each camera
     - calib_params: dict: calibration parameters
     - config_dict: dictionary from Config.toml file
+
     OUTPUTS:
-    - error_comb: float: reprojection error
+    - error_comb: float: reprojection error (array of floats if several combinations)
     - comb: list of ints: combination of persons' ids for each camera
-    - Q_comb: array: 3D coordinates of the triangulated point
+    - Q_comb: array: 3D coordinates of the triangulated point (n_combinations * 4 if several combinations)
     ''' 
 
     undistort_points = config_dict.get('triangulation').get('undistort_points')
     
-    # Filter coords and projection_matrices containing nans
-    coords_filt = [coords[i] for i in range(len(comb)) if not np.isnan(comb[i])]
-    projection_matrices_filt = [P_all[i] for i in range(len(comb)) if not np.isnan(comb[i])]
-    if undistort_points:
-        calib_params_R_filt = [calib_params['R'][i] for i in range(len(comb)) if not np.isnan(comb[i])]
-        calib_params_T_filt = [calib_params['T'][i] for i in range(len(comb)) if not np.isnan(comb[i])]
-        calib_params_K_filt = [calib_params['K'][i] for i in range(len(comb)) if not np.isnan(comb[i])]
-        calib_params_dist_filt = [calib_params['dist'][i] for i in range(len(comb)) if not np.isnan(comb[i])]
+    combs = np.atleast_2d(np.array(comb, dtype=float))
+    coords = np.array(coords, dtype=float)
+    x_files, y_files, likelihood_files = coords.T
+    cams_on = ~np.isnan(combs)
 
-    # Triangulate 2D points
-    try:
-        x_files_filt, y_files_filt, likelihood_files_filt = np.array(coords_filt).T
-        Q_comb = weighted_triangulation(projection_matrices_filt, x_files_filt, y_files_filt, likelihood_files_filt)
-    except:
-        Q_comb = [np.nan, np.nan, np.nan, 1.]
+    # Triangulate 2D points (cameras are taken off by setting their likelihood to nan)
+    Q_comb = weighted_triangulation_batch(P_all, x_files, y_files, np.where(cams_on, likelihood_files, np.nan))
+    Q_comb[np.any(cams_on & np.isnan(coords).any(axis=1), axis=1)] = np.nan # invalid if an active camera has no coordinates
 
     # Reprojection
     if undistort_points:
-        coords_2D_kpt_calc_filt = [cv2.projectPoints(np.array(Q_comb[:-1]), calib_params_R_filt[i], calib_params_T_filt[i], calib_params_K_filt[i], calib_params_dist_filt[i])[0] for i in range(len(Q_comb))]
-        x_calc = [coords_2D_kpt_calc_filt[i][0,0,0] for i in range(len(Q_comb))]
-        y_calc = [coords_2D_kpt_calc_filt[i][0,0,1] for i in range(len(Q_comb))]
+        x_calc, y_calc = project_points_batch(calib_params, Q_comb)
     else:
-        x_calc, y_calc = reprojection(projection_matrices_filt, Q_comb)
+        x_calc, y_calc = reprojection_batch(P_all, Q_comb)
 
     # Reprojection error
-    error_comb_per_cam = []
-    for cam in range(len(x_calc)):
-        q_file = (x_files_filt[cam], y_files_filt[cam])
-        q_calc = (x_calc[cam], y_calc[cam])
-        error_comb_per_cam.append( euclidean_distance(q_file, q_calc) )
-    error_comb = np.mean(error_comb_per_cam)
+    error_comb_per_cam = np.where(cams_on, np.sqrt((x_files-x_calc)**2 + (y_files-y_calc)**2), 0)
+    with np.errstate(invalid='ignore'):
+        error_comb = error_comb_per_cam.sum(axis=1) / cams_on.sum(axis=1)
+    error_comb[np.isnan(Q_comb[:,0]) & cams_on.any(axis=1)] = np.inf
 
+    if np.ndim(comb) == 1:
+        return error_comb[0], comb, Q_comb[0]
     return error_comb, comb, Q_comb
 
 
-def best_persons_and_cameras_combination(config_dict, json_files_framef, personsIDs_combinations, projection_matrices, tracked_keypoint_id, calib_params):
+def best_persons_and_cameras_combination(config_dict, detections_f, personsIDs_combinations, projection_matrices, tracked_keypoint_id, calib_params):
     '''
     Chooses the right person among the multiple ones found by
     OpenPose & excludes cameras with wrong 2d-pose estimation.
@@ -164,7 +237,7 @@ def best_persons_and_cameras_combination(config_dict, json_files_framef, persons
     
     INPUTS:
     - a Config.toml file
-    - json_files_framef: list of strings
+    - detections_f: dict of parsed json files from read_frame_detections
     - personsIDs_combinations: array, list of lists of int
     - projection_matrices: list of arrays
     - tracked_keypoint_id: int
@@ -179,7 +252,7 @@ def best_persons_and_cameras_combination(config_dict, json_files_framef, persons
     undistort_points = config_dict.get('triangulation').get('undistort_points')
     likelihood_threshold = config_dict.get('personAssociation').get('likelihood_threshold_association')
 
-    n_cams = len(json_files_framef)
+    n_cams = len(detections_f['keypoints'])
     error_min = np.inf
 
     # Cameras that are NaN for ALL combinations
@@ -198,7 +271,7 @@ def best_persons_and_cameras_combination(config_dict, json_files_framef, persons
             coords = []
             for index_cam, person_nb in enumerate(combination):
                 try:
-                    js = read_json(json_files_framef[index_cam])
+                    js = detections_f['keypoints'][index_cam]
                     coords.append(js[int(person_nb)][tracked_keypoint_id*3:tracked_keypoint_id*3+3])
                 except:
                     coords.append([np.nan, np.nan, np.nan])
@@ -206,10 +279,7 @@ def best_persons_and_cameras_combination(config_dict, json_files_framef, persons
             
             # undistort points
             if undistort_points:
-                points = np.array(coords)[:,None,:2]
-                undistorted_points = [cv2.undistortPoints(points[i], calib_params['K'][i], calib_params['dist'][i], None, calib_params['optim_K'][i]) for i in range(n_cams)]
-                coords[:,0] = np.array([[u[i][0][0] for i in range(len(u))] for u in undistorted_points]).squeeze()
-                coords[:,1] = np.array([[u[i][0][1] for i in range(len(u))] for u in undistorted_points]).squeeze()
+                coords[:,0], coords[:,1] = undistort_points_batch(calib_params, coords[:,0], coords[:,1])
             
             # Take off cams where confidence is below threshold
             coords[:,2][coords[:,2] < likelihood_threshold] = 0.
@@ -224,13 +294,8 @@ def best_persons_and_cameras_combination(config_dict, json_files_framef, persons
             for i, cams_to_off in enumerate(id_cams_off):
                 combinations_with_cams_off[i, cams_to_off] = np.nan
 
-            # Try all subsets
-            error_comb_all, comb_all, Q_comb_all = [], [], []
-            for comb in combinations_with_cams_off:
-                error_comb, comb, Q_comb = triangulate_comb(comb, coords, projection_matrices, calib_params, config_dict)
-                error_comb_all.append(error_comb)
-                comb_all.append(comb)
-                Q_comb_all.append(Q_comb)
+            # Try all subsets at once
+            error_comb_all, comb_all, Q_comb_all = triangulate_comb(combinations_with_cams_off, coords, projection_matrices, calib_params, config_dict)
             
             if np.all(np.isnan(error_comb_all)):
                 continue
@@ -257,6 +322,166 @@ def best_persons_and_cameras_combination(config_dict, json_files_framef, persons
     return best_error, best_comb, best_Q
     
 
+def detection_pairs_hypotheses(detection_cams, nb_hypotheses):
+    '''
+    Pairs of detections in two different cameras to triangulate consensus hypotheses from.
+    All pairs if there are fewer than nb_hypotheses of them, otherwise a deterministic 
+    random sample, drawn without listing all the pairs first.
+
+    INPUTS:
+    - detection_cams: (n_detections,) array of int. Camera of each detection
+    - nb_hypotheses: int. Maximum number of pairs
+
+    OUTPUT:
+    - pairs: (n_pairs, 2) array of int. Indices of the two detections of each pair, sorted
+    '''
+
+    n_detections = len(detection_cams)
+    cams, nb_detections_per_cam = np.unique(detection_cams, return_counts=True)
+    nb_pairs = n_detections*(n_detections-1)//2 - np.sum(nb_detections_per_cam*(nb_detections_per_cam-1)//2)
+
+    if nb_pairs <= nb_hypotheses:
+        # All pairs, camera pair by camera pair
+        detections_per_cam = [np.flatnonzero(detection_cams == c) for c in cams]
+        pairs = [np.stack(np.meshgrid(det_a, det_b, indexing='ij'), axis=-1).reshape(-1,2) 
+                 for a, det_a in enumerate(detections_per_cam) for det_b in detections_per_cam[a+1:]]
+        pairs = np.concatenate(pairs, axis=0) if pairs else np.zeros((0,2), dtype=int)
+        pairs = np.sort(pairs, axis=1)
+    else:
+        # Uniform draws of two detections, rejected if they are in the same camera or already drawn
+        rng = np.random.default_rng(0)
+        pairs = np.zeros((0,2), dtype=int)
+        while len(pairs) < nb_hypotheses:
+            draws = np.sort(rng.integers(0, n_detections, size=(2*nb_hypotheses, 2)), axis=1)
+            draws = draws[detection_cams[draws[:,0]] != detection_cams[draws[:,1]]]
+            pairs = np.concatenate([pairs, draws], axis=0)
+            _, first_draws = np.unique(pairs, axis=0, return_index=True)
+            pairs = pairs[np.sort(first_draws)]
+        pairs = pairs[:nb_hypotheses]
+
+    return pairs[np.lexsort((pairs[:,1], pairs[:,0]))]
+
+
+def best_persons_and_cameras_consensus(config_dict, detections_f, projection_matrices, tracked_keypoint_id, calib_params):
+    '''
+    Chooses the right person among the multiple ones found by
+    OpenPose & excludes cameras with wrong 2d-pose estimation, 
+    from a consensus set of detections (RANSAC-style) instead of 
+    trying all combinations of persons and cameras.
+
+    1. triangulate the tracked keypoint from pairs of detections in two different cameras
+       (all of them, or a fixed number of sampled ones),
+    2. in each camera, the person closest to the reprojection is an inlier if its error is below "max_err_px",
+    3. refit each of the distinct consensus sets of the pairs with the most inlier cameras,
+    4. as with the exhaustive search, keep the one with the lowest persons indices among those 
+       whose refit error is below "max_err_px", so that the same person is tracked while 
+       detection order is stable. If none is, keep the one with the smallest refit error.
+    Cost is bounded by the number of hypotheses, regardless of the number of cameras and persons.
+
+    INPUTS:
+    - a Config.toml file
+    - detections_f: dict of parsed json files from read_frame_detections
+    - projection_matrices: list of arrays
+    - tracked_keypoint_id: int
+    - calib_params: dict: calibration parameters
+
+    OUTPUTS:
+    - errors_below_thresh: list of float
+    - comb_errors_below_thresh: list of arrays of ints
+    - Q_kpt: list of arrays of floats
+    '''
+
+    error_threshold_tracking = config_dict.get('personAssociation').get('single_person').get('reproj_error_threshold_association')
+    min_cameras_for_triangulation = config_dict.get('triangulation').get('min_cameras_for_triangulation')
+    undistort_points = config_dict.get('triangulation').get('undistort_points')
+    likelihood_threshold = config_dict.get('personAssociation').get('likelihood_threshold_association')
+    nb_hypotheses = config_dict.get('triangulation').get('consensus_hypotheses', 100)
+
+    n_cams = len(detections_f['keypoints'])
+
+    # Coordinates of the tracked keypoint for all persons: (n_cams, max_persons, 3)
+    json_data = detections_f['keypoints']
+    max_persons = max([len(js) for js in json_data] + [1])
+    coords = np.full((n_cams, max_persons, 3), np.nan)
+    for c, js in enumerate(json_data):
+        for n, person in enumerate(js):
+            coords[c, n] = person[tracked_keypoint_id*3:tracked_keypoint_id*3+3]
+    if undistort_points:
+        coords[...,0], coords[...,1] = undistort_points_batch(calib_params, coords[...,0], coords[...,1])
+    with np.errstate(invalid='ignore'):
+        coords[~(coords[...,2] >= likelihood_threshold)] = np.nan
+
+    def inliers_of(Q):
+        # person closest to the reprojection in each camera, inlier if below threshold
+        if undistort_points:
+            x_calc, y_calc = project_points_batch(calib_params, Q)
+        else:
+            x_calc, y_calc = reprojection_batch(projection_matrices, Q)
+        with np.errstate(invalid='ignore'):
+            dist = np.sqrt((coords[...,0]-x_calc[...,None])**2 + (coords[...,1]-y_calc[...,None])**2)
+        dist[np.isnan(dist)] = np.inf
+        persons = np.argmin(dist, axis=-1)
+        dist = np.min(dist, axis=-1)
+        return dist < error_threshold_tracking, persons, dist
+
+    def refit(consensus, persons_consensus):
+        # refit on consensus set, until it does not change
+        error, comb, Q = np.inf, None, None
+        for _ in range(n_cams):
+            if np.count_nonzero(consensus) < max(min_cameras_for_triangulation, 2):
+                break
+            comb_cons = np.where(consensus, persons_consensus, np.nan)
+            coords_comb = coords[np.arange(n_cams), persons_consensus]
+            error_cons, comb_cons, Q_cons = triangulate_comb(comb_cons, coords_comb, projection_matrices, calib_params, config_dict)
+            if not np.isfinite(error_cons):
+                break
+            error, comb, Q = error_cons, comb_cons, Q_cons
+            new_consensus, new_persons, _ = inliers_of(Q_cons)
+            if np.array_equal(new_consensus, consensus) and np.array_equal(new_persons[consensus], persons_consensus[consensus]):
+                break
+            consensus, persons_consensus = new_consensus, new_persons
+        return error, comb, Q
+
+    # Hypotheses: pairs of detections in two different cameras
+    detections = np.argwhere(~np.isnan(coords[...,0]))
+    pairs = detection_pairs_hypotheses(detections[:,0], nb_hypotheses)
+
+    best_error, best_comb, best_Q = np.inf, None, None
+    if len(pairs) > 0:
+        # Triangulate all hypotheses at once, and count their inlier cameras
+        x_hyp, y_hyp, likelihood_hyp = np.full((3, len(pairs), n_cams), np.nan)
+        for k in range(2):
+            cams, persons = detections[pairs[:,k]].T
+            x_hyp[np.arange(len(pairs)), cams], y_hyp[np.arange(len(pairs)), cams], likelihood_hyp[np.arange(len(pairs)), cams] = coords[cams, persons].T
+        Q_hyp = weighted_triangulation_batch(projection_matrices, x_hyp, y_hyp, likelihood_hyp)
+        inliers, persons, _ = inliers_of(Q_hyp)
+        nb_inliers = np.count_nonzero(inliers, axis=1)
+
+        # Hypotheses with the most inliers are tied, since their two-view error is noisy: refit each distinct consensus set
+        top_hyp = np.flatnonzero(nb_inliers == nb_inliers.max())
+        _, distinct_hyp = np.unique(np.where(inliers[top_hyp], persons[top_hyp], -1), axis=0, return_index=True)
+        refits = [refit(inliers[h], persons[h]) for h in top_hyp[np.sort(distinct_hyp)]]
+        refits = [(error, comb, Q) for error, comb, Q in refits if comb is not None]
+
+        if len(refits) > 0:
+            # Below threshold: lowest persons indices (same person as the exhaustive search). Otherwise: smallest refit error
+            errors_refit = np.array([error for error, _, _ in refits])
+            combs_refit = np.array([np.where(np.isnan(comb), max_persons, comb) for _, comb, _ in refits])
+            below_thresh = errors_refit < error_threshold_tracking
+            if below_thresh.any():
+                best_refit = np.flatnonzero(below_thresh)[np.lexsort(combs_refit[below_thresh].T[::-1])[0]]
+            else:
+                best_refit = np.argmin(errors_refit)
+            best_error, best_comb, best_Q = refits[best_refit][0], [refits[best_refit][1]], [refits[best_refit][2]]
+
+    if best_comb is None:
+        return np.inf, [np.array([np.nan]*n_cams)], [np.array([np.nan, np.nan, np.nan])]
+
+    nb_cams_off = np.sum(np.isnan(best_comb))
+    logging.debug(f"Final reprojection error = {best_error:.2f} with {nb_cams_off} cams off and comb {best_comb}")
+    return best_error, best_comb, best_Q
+    
+
 def read_json(js_file):
     '''
     Read OpenPose json file
@@ -274,46 +499,81 @@ def read_json(js_file):
     return json_data
 
 
+def read_frame_detections(json_files_f):
+    '''
+    Parse the json files of all cameras for one frame, only once, 
+    so that they can be shared by all association and rewriting steps.
+
+    INPUT:
+    - json_files_f: list with one entry per camera: json file path, 
+                    or (binary pose file path, frame index) tuple
+
+    OUTPUT:
+    - detections_f: dict of lists with one entry per camera:
+        - 'json': parsed json file, or json content of the binary pose file frame (None if it could not be read)
+        - 'keypoints': array(nb persons * 3*joint_nb) of x, y, likelihood, indexed as in read_json
+        - 'json_ids': array(nb persons) of the position of each person of 'keypoints' in the json 'people' list
+        - 'nb_persons': number of persons with at least one detected keypoint
+    '''
+
+    detections_f = {'json': [], 'keypoints': [], 'json_ids': [], 'nb_persons': []}
+    for js_file in json_files_f:
+        try:
+            js = load_pose_frame(js_file)
+            people = js['people']
+        except:
+            js, people = None, []
+        json_ids = [i for i, p in enumerate(people) if len(p['pose_keypoints_2d']) >= 3]
+        keypoints = [people[i]['pose_keypoints_2d'] for i in json_ids]
+        try:
+            nb_persons = sum([not np.all(np.isnan(np.array(p['pose_keypoints_2d'][::3], dtype=float))) for p in people])
+        except:
+            nb_persons = 0
+        detections_f['json'].append(js)
+        detections_f['keypoints'].append(np.array(keypoints, dtype=float))
+        detections_f['json_ids'].append(np.array(json_ids, dtype=int))
+        detections_f['nb_persons'].append(nb_persons)
+
+    return detections_f
+
+
 def compute_rays(json_coord, calib_params, cam_id):
     '''
     Plucker coordinates of rays from camera to each joint of a person
     Plucker coordinates: camera to keypoint line direction (size 3) 
                          moment: origin ^ line (size 3)
                          additionally, confidence
+    All persons (and frames) seen from a camera can be processed at once.
 
     INPUTS:
-    - json_coord: x, y, likelihood for a person seen from a camera (list of 3*joint_nb)
+    - json_coord: x, y, likelihood for a person seen from a camera (list of 3*joint_nb),
+                  or array(... * 3*joint_nb) for several persons or frames
     - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
     - cam_id: camera id (int)
 
     OUTPUT:
-    - plucker: array. nb joints * (6 plucker coordinates + 1 likelihood)
+    - plucker: array(... * nb joints * (6 plucker coordinates + 1 likelihood)).
+               Zeros for joints with nan coordinates
     '''
 
-    x = json_coord[0::3]
-    y = json_coord[1::3]
-    likelihood = json_coord[2::3]
+    json_coord = np.asarray(json_coord, dtype=float)
+    coords = json_coord.reshape(json_coord.shape[:-1] + (-1,3))
+    q = coords.copy()
+    q[...,2] = 1
     
     inv_K = calib_params['inv_K'][cam_id]
     R_mat = calib_params['R_mat'][cam_id]
     T = calib_params['T'][cam_id]
+    cam_center = calib_params['cam_center'][cam_id]
 
-    cam_center = -R_mat.T @ T
-    plucker = []
-    for i in range(len(x)):
-        q = np.array([x[i], y[i], 1])
-        norm_Q = R_mat.T @ (inv_K @ q -T)
-        
-        line = norm_Q - cam_center
-        norm_line = line/np.linalg.norm(line)
-        moment = np.cross(cam_center, norm_line)
-        plucker_i = np.concatenate([norm_line, moment, [likelihood[i]]])
-        if not np.isnan(plucker_i).any():
-            plucker.append(plucker_i)
-        else:
-            plucker.append(np.array([0.0]*7))
+    norm_Q = (q @ inv_K.T - T) @ R_mat # R_mat.T @ (inv_K @ q -T) for each q
+    line = norm_Q - cam_center
+    norm_line = line/np.linalg.norm(line, axis=-1, keepdims=True)
+    moment = np.cross(cam_center, norm_line)
+    plucker = np.concatenate([norm_line, moment, coords[...,2:]], axis=-1)
+    plucker[np.isnan(plucker).any(axis=-1)] = 0
 
-    return np.array(plucker)
+    return plucker
 
 
 def broadcast_line_to_line_distance(p0, p1):
@@ -344,7 +604,7 @@ def broadcast_line_to_line_distance(p0, p1):
     return dist
 
 
-def compute_affinity(all_json_data_f, calib_params, cum_persons_per_view, reconstruction_error_threshold=0.1):
+def compute_affinity(all_json_data_f, calib_params, cum_persons_per_view, reconstruction_error_threshold=0.1, precheck_distance=0):
     '''
     Compute the affinity between all the people in the different views.
 
@@ -355,12 +615,18 @@ def compute_affinity(all_json_data_f, calib_params, cum_persons_per_view, recons
     Another approach would be to project one epipolar line onto the other camera
     plane and compute the line to point distance, but it is more computationally 
     intensive (simple dot product vs. projection and distance calculation). 
+
+    In crowded scenes, most pairs of persons cannot match. If precheck_distance is set, 
+    the affinity is only computed for the pairs of persons whose rays through their 
+    mean keypoint come closer than precheck_distance (in meters) to each other. 
+    The other ones are left at zero affinity.
     
     INPUTS:
     - all_json_data_f: list of json data. For frame f, nb_views*nb_persons*(x,y,likelihood)*nb_joints
     - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
     - cum_persons_per_view: cumulative number of persons per view
     - reconstruction_error_threshold: maximum distance between epipolar lines to consider a match
+    - precheck_distance: maximum distance between mean keypoint rays to compute the affinity of two persons (0 to compute it for all pairs)
 
     OUTPUT:
     - affinity: affinity matrix between all the people in the different views. 
@@ -369,14 +635,17 @@ def compute_affinity(all_json_data_f, calib_params, cum_persons_per_view, recons
 
     # Compute plucker coordinates for all keypoints for each person in each view
     # pluckers_f: dims=(camera, person, joint, 7 coordinates)
-    pluckers_f = []
-    for cam_id, json_cam  in enumerate(all_json_data_f):
-        pluckers = []
-        for json_coord in json_cam:
-            plucker = compute_rays(json_coord, calib_params, cam_id) # LIMIT TO 15 JOINTS? json_coord[:15*3]
-            pluckers.append(plucker)
-        pluckers = np.array(pluckers)
-        pluckers_f.append(pluckers)
+    pluckers_f = [compute_rays(json_cam, calib_params, cam_id) for cam_id, json_cam in enumerate(all_json_data_f)] # LIMIT TO 15 JOINTS? json_cam[:,:15*3]
+
+    # Rays through the likelihood-weighted mean keypoint of each person, for the proximity precheck
+    if precheck_distance:
+        mean_rays_f = []
+        for cam_id, json_cam in enumerate(all_json_data_f):
+            coords = np.asarray(json_cam, dtype=float).reshape(len(json_cam), -1, 3)
+            likelihood = np.where(np.isnan(coords[...,:2]).any(axis=-1), 0, np.nan_to_num(coords[...,2]))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_xy = np.nansum(coords[...,:2] * likelihood[...,None], axis=1) / likelihood.sum(axis=1)[:,None]
+            mean_rays_f.append(compute_rays(np.concatenate([mean_xy, np.ones((len(coords),1))], axis=-1), calib_params, cam_id))
 
     # Compute affinity matrix
     distance = np.zeros((cum_persons_per_view[-1], cum_persons_per_view[-1])) + 2*reconstruction_error_threshold
@@ -387,11 +656,24 @@ def compute_affinity(all_json_data_f, calib_params, cum_persons_per_view, recons
             continue
 
         # compute distance
-        p0 = pluckers_f[compared_cam0][:,None] # add coordinate on second dimension
-        p1 = pluckers_f[compared_cam1][None,:] # add coordinate on first dimension
-        dist = broadcast_line_to_line_distance(p0, p1)
-        likelihood = np.sqrt(p0[..., -1] * p1[..., -1])
-        mean_weighted_dist = np.sum(dist*likelihood, axis=-1)/(1e-5 + likelihood.sum(axis=-1)) # array(nb_persons_0 * nb_persons_1)
+        if precheck_distance:
+            # only for pairs of persons whose mean keypoint rays are close enough (or parallel)
+            r0, r1 = mean_rays_f[compared_cam0][:,None], mean_rays_f[compared_cam1][None,:]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rays_dist = broadcast_line_to_line_distance(r0, r1)[...,0] / np.linalg.norm(np.cross(r0[...,0,:3], r1[...,0,:3]), axis=-1)
+            candidates = np.nonzero(~(rays_dist > precheck_distance))
+            p0 = pluckers_f[compared_cam0][candidates[0]]
+            p1 = pluckers_f[compared_cam1][candidates[1]]
+            dist = broadcast_line_to_line_distance(p0, p1)
+            likelihood = np.sqrt(p0[..., -1] * p1[..., -1])
+            mean_weighted_dist = np.full(rays_dist.shape, 2*reconstruction_error_threshold)
+            mean_weighted_dist[candidates] = np.sum(dist*likelihood, axis=-1)/(1e-5 + likelihood.sum(axis=-1))
+        else:
+            p0 = pluckers_f[compared_cam0][:,None] # add coordinate on second dimension
+            p1 = pluckers_f[compared_cam1][None,:] # add coordinate on first dimension
+            dist = broadcast_line_to_line_distance(p0, p1)
+            likelihood = np.sqrt(p0[..., -1] * p1[..., -1])
+            mean_weighted_dist = np.sum(dist*likelihood, axis=-1)/(1e-5 + likelihood.sum(axis=-1)) # array(nb_persons_0 * nb_persons_1)
         
         # populate distance matrix
         distance[cum_persons_per_view[compared_cam0]:cum_persons_per_view[compared_cam0+1], \
@@ -408,22 +690,119 @@ def compute_affinity(all_json_data_f, calib_params, cum_persons_per_view, recons
     return affinity
 
 
+def compute_affinity_frames(all_json_data_frames, calib_params, reconstruction_error_threshold=0.1):
+    '''
+    Compute the affinity between all the people in the different views, 
+    for several frames at once. Same as compute_affinity, but rays and distances 
+    are computed for all frames in a few large array operations per pair of cameras, 
+    with persons padded to their maximum count and masked.
+
+    INPUTS:
+    - all_json_data_frames: list of all_json_data_f (as in compute_affinity), one per frame
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
+    - reconstruction_error_threshold: maximum distance between epipolar lines to consider a match
+
+    OUTPUT:
+    - affinity_frames: list of affinity matrices between all the people in the different views, one per frame
+    '''
+
+    n_frames, n_cams = len(all_json_data_frames), len(all_json_data_frames[0])
+    persons_per_view = np.array([[len(json_cam) for json_cam in all_json_data_f] for all_json_data_f in all_json_data_frames], dtype=int).reshape(n_frames, n_cams)
+    max_persons_per_view = persons_per_view.max(axis=0, initial=0)
+
+    # Plucker coordinates for all frames, persons padded with nan (zero rays with zero likelihood)
+    # pluckers_cams: dims=(camera)(frame, person, joint, 7 coordinates)
+    pluckers_cams = []
+    for cam_id in range(n_cams):
+        nb_coords = next((np.shape(all_json_data_f[cam_id])[-1] for all_json_data_f in all_json_data_frames if len(all_json_data_f[cam_id]) > 0), 3)
+        coords_cam = np.full((n_frames, max_persons_per_view[cam_id], nb_coords), np.nan)
+        for f, all_json_data_f in enumerate(all_json_data_frames):
+            coords_cam[f, :len(all_json_data_f[cam_id])] = np.reshape(all_json_data_f[cam_id], (-1, nb_coords))
+        pluckers_cams.append(compute_rays(coords_cam, calib_params, cam_id))
+
+    # Distances between all pairs of persons, for all frames at once
+    mean_weighted_dist_pairs = {}
+    for compared_cam0, compared_cam1 in it.combinations(range(n_cams), 2):
+        if max_persons_per_view[compared_cam0] == 0 or max_persons_per_view[compared_cam1] == 0:
+            continue
+        p0 = pluckers_cams[compared_cam0][:,:,None] # add coordinate on third dimension
+        p1 = pluckers_cams[compared_cam1][:,None,:] # add coordinate on second dimension
+        dist = broadcast_line_to_line_distance(p0, p1)
+        likelihood = np.sqrt(p0[..., -1] * p1[..., -1])
+        mean_weighted_dist_pairs[(compared_cam0, compared_cam1)] = np.sum(dist*likelihood, axis=-1)/(1e-5 + likelihood.sum(axis=-1)) # array(nb_frames * max_persons_0 * max_persons_1)
+
+    # Affinity matrix of each frame
+    affinity_frames = []
+    for f in range(n_frames):
+        cum_persons_per_view = np.cumsum(np.concatenate([[0], persons_per_view[f]]))
+        distance = np.zeros((cum_persons_per_view[-1], cum_persons_per_view[-1])) + 2*reconstruction_error_threshold
+        for (compared_cam0, compared_cam1), mean_weighted_dist in mean_weighted_dist_pairs.items():
+            nb_persons_0, nb_persons_1 = persons_per_view[f, compared_cam0], persons_per_view[f, compared_cam1]
+            if nb_persons_0 == 0 or nb_persons_1 == 0:
+                continue
+            distance[cum_persons_per_view[compared_cam0]:cum_persons_per_view[compared_cam0+1], \
+                     cum_persons_per_view[compared_cam1]:cum_persons_per_view[compared_cam1+1]] \
+                     = mean_weighted_dist[f, :nb_persons_0, :nb_persons_1]
+            distance[cum_persons_per_view[compared_cam1]:cum_persons_per_view[compared_cam1+1], \
+                     cum_persons_per_view[compared_cam0]:cum_persons_per_view[compared_cam0+1]] \
+                     = mean_weighted_dist[f, :nb_persons_0, :nb_persons_1].T
+        distance[distance > reconstruction_error_threshold] = reconstruction_error_threshold
+        affinity_frames.append(1 - distance / reconstruction_error_threshold)
+
+    return affinity_frames
+
+
+def validate_proposals(pluckers_f, proposals, reconstruction_error_threshold=0.1, min_affinity=0.2):
+    '''
+    Check whether proposals from the previous frame still hold on the current one,
+    i.e. whether the rays from all their cameras still nearly intersect.
+    A proposal is valid if the affinity between each pair of its detections is 
+    above min_affinity, with the same distance as in compute_affinity.
+
+    INPUTS:
+    - pluckers_f: list of arrays(nb_persons * nb_joints * 7), one per camera, from compute_rays
+    - proposals: 2D array: n_persons * n_cams, index of each person in each camera (nan if not seen)
+    - reconstruction_error_threshold: maximum distance between epipolar lines to consider a match
+    - min_affinity: affinity below which a correspondence is ignored
+
+    OUTPUT:
+    - valid: boolean array(n_persons)
+    '''
+
+    valid = np.ones(len(proposals), dtype=bool)
+    for p, proposal in enumerate(proposals):
+        cams = np.where(~np.isnan(proposal))[0]
+        for cam0, cam1 in it.combinations(cams, 2):
+            p0 = pluckers_f[cam0][int(proposal[cam0])]
+            p1 = pluckers_f[cam1][int(proposal[cam1])]
+            dist = broadcast_line_to_line_distance(p0, p1)
+            likelihood = np.sqrt(p0[..., -1] * p1[..., -1])
+            mean_weighted_dist = np.sum(dist*likelihood)/(1e-5 + likelihood.sum())
+            if 1 - min(mean_weighted_dist, reconstruction_error_threshold) / reconstruction_error_threshold < min_affinity:
+                valid[p] = False
+                break
+
+    return valid
+
+
+@lru_cache(maxsize=32)
 def circular_constraint(cum_persons_per_view):
     '''
     A person can be matched only with themselves in the same view, and with any 
-    person from other views
+    person from other views.
+    Computed only once per number of persons per view.
 
     INPUT:
-    - cum_persons_per_view: cumulative number of persons per view
+    - cum_persons_per_view: tuple of ints. Cumulative number of persons per view
 
     OUTPUT:
-    - circ_constraint: circular constraint matrix
+    - circ_constraint: read-only circular constraint matrix
     '''
 
-    circ_constraint = np.identity(cum_persons_per_view[-1])
-    for i in range(len(cum_persons_per_view)-1):
-        circ_constraint[cum_persons_per_view[i]:cum_persons_per_view[i+1], cum_persons_per_view[i+1]:cum_persons_per_view[-1]] = 1
-        circ_constraint[cum_persons_per_view[i+1]:cum_persons_per_view[-1], cum_persons_per_view[i]:cum_persons_per_view[i+1]] = 1
+    view_ids = np.repeat(np.arange(len(cum_persons_per_view)-1), np.diff(cum_persons_per_view))
+    circ_constraint = (view_ids[:,None] != view_ids[None,:]).astype(float)
+    np.fill_diagonal(circ_constraint, 1)
+    circ_constraint.flags.writeable = False
     
     return circ_constraint
 
@@ -447,7 +826,30 @@ def SVT(matrix, threshold):
     return matrix_thresh
 
 
-def matchSVT(affinity, cum_persons_per_view, circ_constraint, max_iter = 20, w_rank = 50, tol = 1e-4, w_sparse=0.1):
+def SVT_symmetric(matrix, threshold):
+    '''
+    Singular Value Thresholding of a symmetric matrix, from its eigendecomposition.
+    Singular values are the absolute eigenvalues, and only the eigenvectors whose 
+    eigenvalue is above threshold are used to recompose the matrix.
+    Same result as SVT(), about twice as fast.
+
+    INPUTS:
+    - matrix: symmetric matrix to decompose
+    - threshold: threshold for singular values
+
+    OUTPUT:
+    - matrix_thresh: low-rank approximation of the matrix
+    '''
+
+    eigvals, eigvecs = np.linalg.eigh(matrix) # only the lower triangle is used
+    kept = np.abs(eigvals) > threshold # other singular values are set to zero
+    eigvals_thresh = np.sign(eigvals[kept]) * (np.abs(eigvals[kept]) - threshold)
+    matrix_thresh = (eigvecs[:,kept] * eigvals_thresh) @ eigvecs[:,kept].T # recompose matrix
+
+    return matrix_thresh
+
+
+def matchSVT(affinity, cum_persons_per_view, circ_constraint, max_iter = 20, w_rank = 50, tol = 1e-4, w_sparse=0.1, svd_method='full', init_state=None):
     '''
     Find low-rank approximation of 'affinity' while satisfying the circular constraint.
 
@@ -459,26 +861,40 @@ def matchSVT(affinity, cum_persons_per_view, circ_constraint, max_iter = 20, w_r
     - w_rank: threshold for singular values
     - tol: tolerance for convergence
     - w_sparse: regularization parameter
+    - svd_method: 'full' or 'symmetric' (eigendecomposition, the matrix being symmetric by construction)
+    - init_state: (new_aff, Y, mu) returned by the previous frame, to warm-start from its converged state. 
+                  Default: start from affinity
 
-    OUTPUT:
+    OUTPUTS:
     - new_aff: low-rank approximation of the affinity matrix
+    - nb_iter: number of iterations
+    - converged: False if max_iter was reached before convergence
+    - state: (new_aff, Y, mu) at the last iteration, for warm-starting the next frame
     '''
 
-    new_aff = affinity.copy()
-    N = new_aff.shape[0]
+    affinity = affinity.copy()
+    N = affinity.shape[0]
     index_diag = np.arange(N)
-    new_aff[index_diag, index_diag] = 0.
+    affinity[index_diag, index_diag] = 0.
     # new_aff = (new_aff + new_aff.T)/2 # symmetric by construction
 
-    Y = np.zeros_like(new_aff) # Initial deviation matrix / residual ()
-    W = w_sparse - new_aff # Initial sparse matrix / regularization (prevent overfitting)
-    mu = 64 # initial step size
+    W = w_sparse - affinity # Initial sparse matrix / regularization (prevent overfitting)
+    if init_state is None:
+        new_aff = affinity.copy()
+        Y = np.zeros_like(new_aff) # Initial deviation matrix / residual ()
+        mu = 64 # initial step size
+    else:
+        new_aff, Y, mu = init_state[0].copy(), init_state[1].copy(), init_state[2]
+    converged = False
 
     for iter in range(max_iter):
         new_aff0 = new_aff.copy()
         
         Q = new_aff + Y*1.0/mu
-        Q = SVT(Q, w_rank/mu)
+        if svd_method == 'symmetric':
+            Q = SVT_symmetric(Q, w_rank/mu)
+        else:
+            Q = SVT(Q, w_rank/mu)
         new_aff = Q - (W + Y)/mu
 
         # Project X onto dimGroups
@@ -500,13 +916,12 @@ def matchSVT(affinity, cum_persons_per_view, circ_constraint, max_iter = 20, w_r
         pRes = np.linalg.norm(new_aff - Q) / N # primal residual (diff between new_aff and SVT result)
         dRes = mu * np.linalg.norm(new_aff - new_aff0) / N # dual residual (diff between new_aff and previous new_aff)
         if pRes < tol and dRes < tol:
+            converged = True
             break
         if pRes > 10 * dRes: mu = 2 * mu
         elif dRes > 10 * pRes: mu = mu / 2
 
-        iter +=1
-
-    return new_aff
+    return new_aff, iter+1, converged, (new_aff.copy(), Y, mu)
 
 
 def person_index_per_cam(affinity, cum_persons_per_view, min_cameras_for_triangulation):
@@ -522,40 +937,40 @@ def person_index_per_cam(affinity, cum_persons_per_view, min_cameras_for_triangu
     '''
 
     # index of the max affinity for each group (-1 if no detection)
-    proposals = []
-    for row in range(affinity.shape[0]):
-        proposal_row = []
-        for cam in range(len(cum_persons_per_view)-1):
-            id_persons_per_view = affinity[row, cum_persons_per_view[cam]:cum_persons_per_view[cam+1]]
-            proposal_row += [np.argmax(id_persons_per_view) if (len(id_persons_per_view)>0 and max(id_persons_per_view)>0) else -1]
-        proposals.append(proposal_row)
-    proposals = np.array(proposals, dtype=float)
+    n_cams = len(cum_persons_per_view)-1
+    proposals = np.full((affinity.shape[0], n_cams), -1, dtype=float)
+    for cam in range(n_cams):
+        id_persons_per_view = affinity[:, cum_persons_per_view[cam]:cum_persons_per_view[cam+1]]
+        if id_persons_per_view.shape[1] > 0:
+            proposals[:,cam] = np.where(id_persons_per_view.max(axis=1)>0, np.argmax(id_persons_per_view, axis=1), -1)
 
     # remove duplicates and order
     proposals, nb_detections = np.unique(proposals, axis=0, return_counts=True)
     proposals = proposals[np.argsort(nb_detections)[::-1]]
 
-    # remove row if any value is the same in previous rows at same index (nan!=nan so nan ignored) --> double detections
+    # remove row if any value is the same in previous rows at same index (nan ignored) --> double detections
     proposals[proposals==-1] = np.nan
     mask = np.ones(proposals.shape[0], dtype=bool)
-    for i in range(1, len(proposals)):
-        mask[i] = ~np.any(proposals[i] == proposals[:i], axis=0).any()
+    for cam in range(n_cams):
+        rows = np.where(~np.isnan(proposals[:,cam]))[0]
+        _, first_occurrence, inverse = np.unique(proposals[rows,cam], return_index=True, return_inverse=True)
+        mask[rows[first_occurrence[inverse] < np.arange(len(rows))]] = False
     proposals = proposals[mask]
 
     # remove identifications if less than N cameras see them
-    nb_cams_per_person = [np.count_nonzero(~np.isnan(p)) for p in proposals]
-    proposals = np.array([p for (n,p) in zip(nb_cams_per_person, proposals) if n >= min_cameras_for_triangulation])
+    nb_cams_per_person = np.count_nonzero(~np.isnan(proposals), axis=1)
+    proposals = proposals[nb_cams_per_person >= min_cameras_for_triangulation]
 
     return proposals
 
 
-def rewrite_json_files(json_tracked_files_f, json_files_f, proposals, n_cams):
+def rewrite_json_files(json_tracked_files_f, detections_f, proposals, n_cams):
     '''
     Write new json files with correct association of people across cameras.
 
     INPUTS:
     - json_tracked_files_f: list of strings: json files to write
-    - json_files_f: list of strings: json files to read
+    - detections_f: dict of parsed json files from read_frame_detections
     - proposals: 2D array: n_persons * n_cams
     - n_cams: int: number of cameras
 
@@ -566,21 +981,20 @@ def rewrite_json_files(json_tracked_files_f, json_files_f, proposals, n_cams):
     for cam in range(n_cams):
         try:
             with open(json_tracked_files_f[cam], 'w') as json_tracked_f:
-                with open(json_files_f[cam], 'r') as json_f:
-                    js = json.load(json_f)
-                    js_new = js.copy()
-                    js_new['people'] = []
-                    for new_comb in proposals:
-                        if not np.isnan(new_comb[cam]):
-                            js_new['people'] += [js['people'][int(new_comb[cam])]]
-                        else:
-                            js_new['people'] += [{}]
+                js = detections_f['json'][cam]
+                js_new = js.copy()
+                js_new['people'] = []
+                for new_comb in proposals:
+                    if not np.isnan(new_comb[cam]):
+                        js_new['people'] += [js['people'][detections_f['json_ids'][cam][int(new_comb[cam])]]]
+                    else:
+                        js_new['people'] += [{}]
                 json_tracked_f.write(json.dumps(js_new))
         except:
             os.remove(json_tracked_files_f[cam])
 
 
-def recap_tracking(config_dict, error=0, nb_cams_excluded=0):
+def recap_tracking(config_dict, error=0, nb_cams_excluded=0, svt_stats=None, reuse_stats=None):
     '''
     Print a message giving statistics on reprojection errors (in pixel and in m)
     as well as the number of cameras that had to be excluded to reach threshold
@@ -590,6 +1004,8 @@ def recap_tracking(config_dict, error=0, nb_cams_excluded=0):
     - a Config.toml file
     - error: dataframe 
     - nb_cams_excluded: dataframe
+    - svt_stats: dict of per-frame lists 'iterations', 'converged', 'time', 'warm_start' of matchSVT (multi-person)
+    - reuse_stats: dict of counts 'kept', 'proposed', 'frames_solved', 'frames' of proposals carried over from the previous frame (multi-person)
 
     OUTPUT:
     - Message in console
@@ -607,6 +1023,8 @@ def recap_tracking(config_dict, error=0, nb_cams_excluded=0):
     error_threshold_tracking = config_dict.get('personAssociation').get('single_person').get('reproj_error_threshold_association')
     reconstruction_error_threshold = config_dict.get('personAssociation').get('multi_person').get('reconstruction_error_threshold')
     min_affinity = config_dict.get('personAssociation').get('multi_person').get('min_affinity')
+    svd_method = config_dict.get('personAssociation').get('multi_person').get('svd_method', 'full')
+    temporal_reuse = config_dict.get('personAssociation').get('multi_person').get('temporal_reuse', False)
     poseTracked_dir = os.path.join(project_dir, 'pose-associated')
     calib_dir = [os.path.join(session_dir, c) for c in os.listdir(session_dir) if os.path.isdir(os.path.join(session_dir, c)) and  'calib' in c.lower()][0]
     calib_files = glob.glob(os.path.join(calib_dir, '*.toml'))
@@ -635,10 +1053,190 @@ def recap_tracking(config_dict, error=0, nb_cams_excluded=0):
     else:
         logging.info(f'\n--> A person was reconstructed if the lines from cameras to their keypoints intersected within {reconstruction_error_threshold} m and if the calculated affinity stayed above {min_affinity}.')
         logging.info(f'--> Beware that people were sorted across cameras, but not across frames. This will be done in the triangulation stage.')
-
-    logging.info(f'\nTracked json files are stored in {os.path.realpath(poseTracked_dir)}.')
+        if svt_stats and svt_stats['iterations']:
+            nb_frames = len(svt_stats['iterations'])
+            logging.info(f'--> Affinity matrices were solved with {svd_method} SVD in {np.around(np.mean(svt_stats["iterations"]), decimals=1)} iterations on average (max {max(svt_stats["iterations"])}), '
+                         f'in {np.around(np.mean(svt_stats["time"])*1000, decimals=2)} ms per frame. '
+                         f'{nb_frames - sum(svt_stats["converged"])} out of {nb_frames} frames did not converge, and {sum(svt_stats["warm_start"])} were warm-started from the previous frame.')
+        if temporal_reuse and reuse_stats:
+            logging.info(f'--> {reuse_stats["kept"]} out of {reuse_stats["proposed"]} associations were carried over from the previous frame. '
+                         f'Affinity matrices only had to be solved on {reuse_stats["frames_solved"]} out of {reuse_stats["frames"]} frames.')
+
+    if config_dict.get('personAssociation').get('output_format', 'json') == 'table':
+        logging.info(f'\nAssociation table is stored in {os.path.realpath(os.path.join(poseTracked_dir, "association_table.npy"))}.')
+    else:
+        logging.info(f'\nTracked json files are stored in {os.path.realpath(poseTracked_dir)}.')
     
 
+def associate_frames(config_dict, json_files_frames, json_tracked_files_frames, P_all, calib_params, tracked_keypoint_id=None, F_all=None, progress_bar=False):
+    '''
+    Associate persons across cameras on a sequence of frames, and rewrite their
+    json files (or return their indices if output_format is 'table').
+    Frames are independent, except in multi-person mode with temporal_reuse or
+    warm_start_svt, where each frame starts from the previous one of the sequence.
+
+    INPUTS:
+    - config_dict: dictionary from Config.toml file
+    - json_files_frames: list of lists of strings: json files of each camera, for each frame
+    - json_tracked_files_frames: list of lists of strings: json files to write, for each frame
+    - P_all: list of arrays: projection matrices for each camera
+    - calib_params: dict: calibration parameters
+    - tracked_keypoint_id: int: tracked keypoint (single-person only)
+    - F_all: array of fundamental matrices if epipolar_gating_px is set (single-person only)
+    - progress_bar: bool
+
+    OUTPUTS:
+    - proposals_frames: list of (nb_persons, n_cams) arrays: person indices for each frame (only if output_format is 'table')
+    - error_min_tot: list of floats: reprojection error of the tracked keypoint (single-person only)
+    - cameras_off_tot: list of floats: number of excluded cameras (single-person only)
+    - svt_stats: dict of per-frame lists of matchSVT statistics (multi-person only)
+    - reuse_stats: dict of counts of proposals carried over from the previous frame (multi-person only)
+    '''
+
+    multi_person = config_dict.get('project').get('multi_person')
+    min_cameras_for_triangulation = config_dict.get('triangulation').get('min_cameras_for_triangulation')
+    camera_selection = config_dict.get('triangulation').get('camera_selection', 'exhaustive')
+    epipolar_gating_px = config_dict.get('personAssociation').get('single_person').get('epipolar_gating_px', 0)
+    reconstruction_error_threshold = config_dict.get('personAssociation').get('multi_person').get('reconstruction_error_threshold')
+    min_affinity = config_dict.get('personAssociation').get('multi_person').get('min_affinity')
+    precheck_distance = config_dict.get('personAssociation').get('multi_person').get('precheck_distance', 0)
+    affinity_chunk_size = config_dict.get('personAssociation').get('multi_person').get('affinity_chunk_size', 0)
+    svd_method = config_dict.get('personAssociation').get('multi_person').get('svd_method', 'full')
+    warm_start_svt = config_dict.get('personAssociation').get('multi_person').get('warm_start_svt', False)
+    temporal_reuse = config_dict.get('personAssociation').get('multi_person').get('temporal_reuse', False)
+    output_format = config_dict.get('personAssociation').get('output_format', 'json')
+
+    n_cams = len(P_all)
+    proposals_frames, error_min_tot, cameras_off_tot = [], [], []
+    svt_stats = {'iterations': [], 'converged': [], 'time': [], 'warm_start': []}
+    reuse_stats = {'kept': 0, 'proposed': 0, 'frames_solved': 0, 'frames': 0}
+    persons_per_view_prev, svt_state_prev = None, None
+    all_persons_per_view_prev, proposals_prev = None, np.empty((0, n_cams))
+
+    for i, (json_files_f, json_tracked_files_f) in enumerate(tqdm(zip(json_files_frames, json_tracked_files_frames), total=len(json_files_frames), disable=not progress_bar)):
+        # parse json files once for all
+        if multi_person and affinity_chunk_size:
+            # read the next chunk of frames and compute all their affinities at once
+            if i % affinity_chunk_size == 0:
+                detections_chunk = [read_frame_detections(json_files) for json_files in json_files_frames[i:i+affinity_chunk_size]]
+                affinity_chunk = compute_affinity_frames([detections['keypoints'] for detections in detections_chunk], calib_params, reconstruction_error_threshold=reconstruction_error_threshold)
+            detections_f, affinity_all_f = detections_chunk[i % affinity_chunk_size], affinity_chunk[i % affinity_chunk_size]
+        else:
+            detections_f = read_frame_detections(json_files_f)
+
+        if not multi_person:
+            if camera_selection == 'consensus':
+                # choose persons of interest and exclude cameras with bad pose estimation, from a consensus set
+                error_proposals, proposals, Q_kpt = best_persons_and_cameras_consensus(config_dict, detections_f, P_all, tracked_keypoint_id, calib_params)
+            else:
+                # all possible combinations of persons
+                if epipolar_gating_px:
+                    compatibility = epipolar_compatibility(detections_f, F_all, tracked_keypoint_id, calib_params, config_dict)
+                    personsIDs_comb = persons_combinations(detections_f, compatibility=compatibility)
+                else:
+                    personsIDs_comb = persons_combinations(detections_f) 
+                
+                # choose persons of interest and exclude cameras with bad pose estimation
+                error_proposals, proposals, Q_kpt = best_persons_and_cameras_combination(config_dict, detections_f, personsIDs_comb, P_all, tracked_keypoint_id, calib_params)
+
+            if not np.isinf(error_proposals):
+                error_min_tot.append(np.nanmean(error_proposals))
+            cameras_off_count = np.count_nonzero([np.isnan(comb) for comb in proposals]) / len(proposals)
+            cameras_off_tot.append(cameras_off_count)            
+
+        else:
+            # read data
+            all_json_data_f = detections_f['keypoints']
+            #TODO: remove people with average likelihood < 0.3, no full torso, less than 12 joints... (cf filter2d in dataset/base.py L498)
+            all_persons_per_view = [len(j) for j in all_json_data_f]
+
+            # keep the previous proposals which are still valid if the number of detections per camera is unchanged
+            if temporal_reuse and all_persons_per_view == all_persons_per_view_prev and len(proposals_prev) > 0:
+                pluckers_f = [compute_rays(json_cam, calib_params, cam_id) for cam_id, json_cam in enumerate(all_json_data_f)]
+                valid = validate_proposals(pluckers_f, proposals_prev, reconstruction_error_threshold=reconstruction_error_threshold, min_affinity=min_affinity)
+                proposals_kept = proposals_prev[valid]
+                reuse_stats['kept'] += len(proposals_kept)
+                reuse_stats['proposed'] += len(proposals_prev)
+            else:
+                proposals_kept = np.empty((0, n_cams))
+            
+            # only associate the remaining detections
+            remaining_ids = [[i for i in range(len(all_json_data_f[c])) if i not in proposals_kept[:,c]] for c in range(n_cams)]
+            json_data_f = [[all_json_data_f[c][i] for i in remaining_ids[c]] for c in range(n_cams)]
+            proposals_new = np.empty((0, n_cams))
+            if sum(len(j)>0 for j in json_data_f) >= min_cameras_for_triangulation:
+                # obtain proposals after computing affinity between all the people in the different views
+                persons_per_view = [0] + [len(j) for j in json_data_f]
+                cum_persons_per_view = np.cumsum(persons_per_view)
+                
+                # compute affinity and only keep possible matches
+                if affinity_chunk_size:
+                    # affinity of the remaining detections, from the one of all detections
+                    cum_all_persons_per_view = np.cumsum([0] + all_persons_per_view)
+                    remaining_all_ids = np.concatenate([cum_all_persons_per_view[c] + np.array(remaining_ids[c], dtype=int) for c in range(n_cams)])
+                    affinity = affinity_all_f[np.ix_(remaining_all_ids, remaining_all_ids)]
+                else:
+                    affinity = compute_affinity(json_data_f, calib_params, cum_persons_per_view, reconstruction_error_threshold=reconstruction_error_threshold, precheck_distance=precheck_distance)
+                circ_constraint = circular_constraint(tuple(int(c) for c in cum_persons_per_view))
+                affinity = affinity * circ_constraint
+
+                # For each person, propose their index for each camera
+                #TODO: affinity without hand, face, feet (cf ray.py L31)
+                # Warm start from the previous frame if the number of detections per camera is unchanged
+                warm_start = warm_start_svt and persons_per_view == persons_per_view_prev
+                start_time = time.perf_counter()
+                affinity, nb_iter, converged, svt_state = matchSVT(affinity, cum_persons_per_view, circ_constraint, max_iter = 20, w_rank = 50, tol = 1e-4, w_sparse=0.1, 
+                                                        svd_method=svd_method, init_state=svt_state_prev if warm_start else None)
+                svt_stats['time'].append(time.perf_counter() - start_time)
+                svt_stats['iterations'].append(nb_iter)
+                svt_stats['converged'].append(converged)
+                svt_stats['warm_start'].append(warm_start)
+                persons_per_view_prev, svt_state_prev = persons_per_view, svt_state
+                affinity[affinity<min_affinity] = 0
+                proposals_new = person_index_per_cam(affinity, cum_persons_per_view, min_cameras_for_triangulation).reshape(-1, n_cams)
+                reuse_stats['frames_solved'] += 1
+
+                # indices of the remaining detections in the whole frame
+                for c in range(n_cams):
+                    ids_c = ~np.isnan(proposals_new[:,c])
+                    proposals_new[ids_c,c] = np.array(remaining_ids[c])[proposals_new[ids_c,c].astype(int)]
+            
+            proposals = np.concatenate([proposals_kept, proposals_new])
+            all_persons_per_view_prev, proposals_prev = all_persons_per_view, proposals
+            reuse_stats['frames'] += 1
+        
+        # rewrite json files with a single or multiple persons of interest, or store their indices in the association table
+        if output_format == 'table':
+            # position of the persons in the json files, which may also list persons without keypoints
+            proposals_json = np.array(proposals, dtype=float).reshape(-1, n_cams)
+            for c in range(n_cams):
+                ids_c = ~np.isnan(proposals_json[:,c])
+                proposals_json[ids_c,c] = detections_f['json_ids'][c][proposals_json[ids_c,c].astype(int)]
+            proposals_frames.append(proposals_json)
+        else:
+            rewrite_json_files(json_tracked_files_f, detections_f, proposals, n_cams)
+
+    return proposals_frames, error_min_tot, cameras_off_tot, svt_stats, reuse_stats
+
+
+association_worker_state = {}
+def init_association_worker(config_dict, P_all, calib_params, tracked_keypoint_id, F_all):
+    '''
+    Store the data shared by all frames in each worker process, 
+    so that it is only sent once instead of with each batch of frames.
+    '''
+
+    association_worker_state.update(config_dict=config_dict, P_all=P_all, calib_params=calib_params, tracked_keypoint_id=tracked_keypoint_id, F_all=F_all)
+
+
+def associate_frames_worker(json_files_frames, json_tracked_files_frames):
+    '''
+    associate_frames on a batch of frames, with the data stored by init_association_worker.
+    '''
+
+    return associate_frames(json_files_frames=json_files_frames, json_tracked_files_frames=json_tracked_files_frames, **association_worker_state)
+
+
 def associate_all(config_dict):
     '''
     For each frame,
@@ -651,12 +1249,15 @@ def associate_all(config_dict):
     
     INPUTS: 
     - a calibration file (.toml extension)
-    - json files from each camera folders with several detected persons
+    - json files from each camera folders with several detected persons,
+      or one binary pose file per camera (pose estimation with output_format = 'binary')
     - a Config.toml file
     - a skeleton model
     
     OUTPUTS: 
     - json files for each camera with only one person of interest    
+      or, with output_format = 'table', a single pose-associated/association_table.npy file: 
+      (n_frames, n_persons, n_cams) index of each person in the json files of each camera (-1 if not seen)
     '''
     
     # Read config_dict
@@ -668,11 +1269,13 @@ def associate_all(config_dict):
     multi_person = config_dict.get('project').get('multi_person')
     pose_model = config_dict.get('pose').get('pose_model')
     tracked_keypoint = config_dict.get('personAssociation').get('single_person').get('tracked_keypoint')
-    min_cameras_for_triangulation = config_dict.get('triangulation').get('min_cameras_for_triangulation')
-    reconstruction_error_threshold = config_dict.get('personAssociation').get('multi_person').get('reconstruction_error_threshold')
-    min_affinity = config_dict.get('personAssociation').get('multi_person').get('min_affinity')
+    epipolar_gating_px = config_dict.get('personAssociation').get('single_person').get('epipolar_gating_px', 0)
     frame_range = config_dict.get('project').get('frame_range')
     undistort_points = config_dict.get('triangulation').get('undistort_points')
+    camera_selection = config_dict.get('triangulation').get('camera_selection', 'exhaustive')
+    temporal_reuse = config_dict.get('personAssociation').get('multi_person').get('temporal_reuse', False)
+    output_format = config_dict.get('personAssociation').get('output_format', 'json')
+    parallel_workers = config_dict.get('personAssociation').get('parallel_workers', 1)
     
     try:
         calib_dir = [os.path.join(session_dir, c) for c in os.listdir(session_dir) if os.path.isdir(os.path.join(session_dir, c)) and  'calib' in c.lower()][0]
@@ -710,29 +1313,38 @@ def associate_all(config_dict):
         except:
             raise NameError('{pose_model} not found in skeletons.py nor in Config.toml')
 
-    # 2d-pose files selection
+    # 2d-pose files selection: binary pose files if pose estimation was run with output_format = 'binary' and there are no json folders
     pose_listdirs_names = next(os.walk(pose_dir))[1]
-    try:
-        pose_listdirs_names = sort_stringlist_by_last_number(pose_listdirs_names)
-        os.listdir(os.path.join(pose_dir, pose_listdirs_names[0]))[0]
-    except:
-        raise ValueError(f'No json files found in {pose_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
-    json_dirs_names = [k for k in pose_listdirs_names if 'json' in k]
-    try: 
-        json_files_names = [fnmatch.filter(os.listdir(os.path.join(poseSync_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
-    except:
+    pose_files_dir = poseSync_dir if len(pose_files_names(poseSync_dir)) > 0 else pose_dir
+    pose_files = pose_files_names(pose_files_dir) if not any('json' in k for k in pose_listdirs_names) else []
+    if len(pose_files) > 0:
+        video_names = [pose_file[:-len(pose_file_suffix)] for pose_file in pose_files]
+        json_dirs_names = [f'{video_name}_json' for video_name in video_names]
+        json_files_names = [[f'{video_name}_{f:06d}.json' for f in pose_source_frames(pose_files_dir, pose_file)] for video_name, pose_file in zip(video_names, pose_files)]
+    else:
         try:
-            json_files_names = [fnmatch.filter(os.listdir(os.path.join(pose_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
+            pose_listdirs_names = sort_stringlist_by_last_number(pose_listdirs_names)
+            os.listdir(os.path.join(pose_dir, pose_listdirs_names[0]))[0]
+        except:
+            raise ValueError(f'No json files found in {pose_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
+        json_dirs_names = [k for k in pose_listdirs_names if 'json' in k]
+        try: 
+            json_files_names = [fnmatch.filter(os.listdir(os.path.join(poseSync_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
         except:
-            raise ValueError(f'No json files found in {pose_dir} nor {poseSync_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
-    json_files_names = [sort_stringlist_by_last_number(j) for j in json_files_names]
+            try:
+                json_files_names = [fnmatch.filter(os.listdir(os.path.join(pose_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
+            except:
+                raise ValueError(f'No json files found in {pose_dir} nor {poseSync_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
+        json_files_names = [sort_stringlist_by_last_number(j) for j in json_files_names]
     
     # 2d-pose-associated files creation
     if not os.path.exists(poseTracked_dir): os.mkdir(poseTracked_dir)   
-    try: [os.mkdir(os.path.join(poseTracked_dir,k)) for k in json_dirs_names]
-    except: pass
+    association_table_path = os.path.join(poseTracked_dir, 'association_table.npy')
+    if output_format != 'table':
+        try: [os.mkdir(os.path.join(poseTracked_dir,k)) for k in json_dirs_names]
+        except: pass
+        if os.path.isfile(association_table_path): os.remove(association_table_path) # would take precedence over json files
     
-    error_min_tot, cameras_off_tot = [], []
     f_range = [[0,max([len(j) for j in json_files_names])] if frame_range in ('all', 'auto', []) else frame_range][0]
     n_cams = len(json_dirs_names)
 
@@ -742,6 +1354,7 @@ def associate_all(config_dict):
                     Found {len(P_all)} cameras in the calibration file,\
                     and {n_cams} cameras based on the number of pose folders.')
 
+    tracked_keypoint_id, F_all = None, None
     if not multi_person:
         logging.info('\nSingle-person analysis selected.')
         try:
@@ -751,59 +1364,64 @@ def associate_all(config_dict):
             tracked_keypoint_id = 0
             tracked_keypoint_name = next((node for node in PreOrderIter(model) if getattr(node, 'id', None) == 0), None).name
             logging.warning(f'{tracked_keypoint} not found in {pose_model}, consider editing tracked_keypoint in Config.toml. Tracking {tracked_keypoint_name} instead.')
+        if epipolar_gating_px and camera_selection != 'consensus':
+            F_all = fundamental_matrices(P_all)
+            logging.info(f'Persons combinations restricted to detections within {epipolar_gating_px} px of each other\'s epipolar lines.')
     else:
         logging.info('\nMulti-person analysis selected.')
 
-
-    for f in tqdm(range(*f_range)):
+    json_files_frames, json_tracked_files_frames = [], []
+    for f in range(*f_range):
         # print(f'\nFrame {f}:')
         json_files_names_f = [[j for j in json_files_names[c] if int(re.split(r'(\d+)',j)[-2])==f] for c in range(n_cams)]
         json_files_names_f = [j for j_list in json_files_names_f for j in (j_list or ['none'])]
-        try:
-            json_files_f = [os.path.join(poseSync_dir, json_dirs_names[c], json_files_names_f[c]) for c in range(n_cams)]
-            with open(os.path.exist(json_files_f[0])) as json_exist_test: pass
-        except:
-            json_files_f = [os.path.join(pose_dir, json_dirs_names[c], json_files_names_f[c]) for c in range(n_cams)]
-        json_tracked_files_f = [os.path.join(poseTracked_dir, json_dirs_names[c], json_files_names_f[c]) for c in range(n_cams)]
-
-        if not multi_person:
-            # all possible combinations of persons
-            personsIDs_comb = persons_combinations(json_files_f) 
-            
-            # choose persons of interest and exclude cameras with bad pose estimation
-            error_proposals, proposals, Q_kpt = best_persons_and_cameras_combination(config_dict, json_files_f, personsIDs_comb, P_all, tracked_keypoint_id, calib_params)
-
-            if not np.isinf(error_proposals):
-                error_min_tot.append(np.nanmean(error_proposals))
-            cameras_off_count = np.count_nonzero([np.isnan(comb) for comb in proposals]) / len(proposals)
-            cameras_off_tot.append(cameras_off_count)            
-
+        if len(pose_files) > 0:
+            json_files_f = [(os.path.join(pose_files_dir, pose_files[c]), f) for c in range(n_cams)]
         else:
-            # read data
-            all_json_data_f = []
-            for js_file in json_files_f:
-                all_json_data_f.append(read_json(js_file))
-            #TODO: remove people with average likelihood < 0.3, no full torso, less than 12 joints... (cf filter2d in dataset/base.py L498)
-            
-            # obtain proposals after computing affinity between all the people in the different views
-            persons_per_view = [0] + [len(j) for j in all_json_data_f]
-            cum_persons_per_view = np.cumsum(persons_per_view)
-            
-            # compute affinity and only keep possible matches
-            affinity = compute_affinity(all_json_data_f, calib_params, cum_persons_per_view, reconstruction_error_threshold=reconstruction_error_threshold)
-            circ_constraint = circular_constraint(cum_persons_per_view)
-            affinity = affinity * circ_constraint
-
-            # For each person, propose their index for each camera
-            #TODO: affinity without hand, face, feet (cf ray.py L31)
-            affinity = matchSVT(affinity, cum_persons_per_view, circ_constraint, max_iter = 20, w_rank = 50, tol = 1e-4, w_sparse=0.1)
-            affinity[affinity<min_affinity] = 0
-            proposals = person_index_per_cam(affinity, cum_persons_per_view, min_cameras_for_triangulation)
-        
-        # rewrite json files with a single or multiple persons of interest
-        rewrite_json_files(json_tracked_files_f, json_files_f, proposals, n_cams)
+            try:
+                json_files_f = [os.path.join(poseSync_dir, json_dirs_names[c], json_files_names_f[c]) for c in range(n_cams)]
+                with open(os.path.exist(json_files_f[0])) as json_exist_test: pass
+            except:
+                json_files_f = [os.path.join(pose_dir, json_dirs_names[c], json_files_names_f[c]) for c in range(n_cams)]
+        json_tracked_files_f = [os.path.join(poseTracked_dir, json_dirs_names[c], json_files_names_f[c]) for c in range(n_cams)]
+        json_files_frames.append(json_files_f)
+        json_tracked_files_frames.append(json_tracked_files_f)
+
+    # associate persons, in parallel over batches of frames if requested
+    # (not with temporal_reuse, since each frame then depends on the previous one)
+    if parallel_workers == 'auto':
+        parallel_workers = os.cpu_count()
+    parallel_workers = 1 if parallel_workers is None else int(parallel_workers)
+    if parallel_workers > 1 and multi_person and temporal_reuse:
+        logging.warning('Frames cannot be associated in parallel with temporal_reuse = true. Running sequentially.')
+        parallel_workers = 1
+    if parallel_workers > 1 and len(json_files_frames) >= 2:
+        batch_size = int(np.ceil(len(json_files_frames) / (4*parallel_workers)))
+        with ProcessPoolExecutor(max_workers=parallel_workers, initializer=init_association_worker, initargs=(config_dict, P_all, calib_params, tracked_keypoint_id, F_all)) as executor:
+            futures = [executor.submit(associate_frames_worker, json_files_frames[b:b+batch_size], json_tracked_files_frames[b:b+batch_size]) for b in range(0, len(json_files_frames), batch_size)]
+            results = [future.result() for future in tqdm(futures)]
+    else:
+        results = [associate_frames(config_dict, json_files_frames, json_tracked_files_frames, P_all, calib_params, tracked_keypoint_id=tracked_keypoint_id, F_all=F_all, progress_bar=True)]
+
+    # gather batches, in frame order
+    proposals_tot, error_min_tot, cameras_off_tot = [], [], []
+    svt_stats = {'iterations': [], 'converged': [], 'time': [], 'warm_start': []}
+    reuse_stats = {'kept': 0, 'proposed': 0, 'frames_solved': 0, 'frames': 0}
+    for proposals_frames, error_min_frames, cameras_off_frames, svt_stats_frames, reuse_stats_frames in results:
+        proposals_tot += proposals_frames
+        error_min_tot += error_min_frames
+        cameras_off_tot += cameras_off_frames
+        for k in svt_stats: svt_stats[k] += svt_stats_frames[k]
+        for k in reuse_stats: reuse_stats[k] += reuse_stats_frames[k]
+
+    # association table: index of each person in the json files of each camera, for each frame (-1 if not seen)
+    if output_format == 'table':
+        association_table = np.full((f_range[1], max([len(p) for p in proposals_tot], default=0), n_cams), -1, dtype=np.int32)
+        for f, proposals in zip(range(*f_range), proposals_tot):
+            association_table[f, :len(proposals)] = np.nan_to_num(proposals, nan=-1)
+        np.save(association_table_path, association_table)
 
 
     # recap message
-    recap_tracking(config_dict, error_min_tot, cameras_off_tot)
+    recap_tracking(config_dict, error_min_tot, cameras_off_tot, svt_stats if multi_person else None, reuse_stats if multi_person else None)
     
@@ -38,6 +38,11 @@ import json
 import re
 import logging
 import ast
+import copy
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from tqdm import tqdm
 from anytree.importer import DictImporter
@@ -47,9 +52,11 @@ import cv2
 
 from rtmlib import PoseTracker, BodyWithFeet, Wholebody, Body, Hand, Custom, draw_skeleton
 from rtmlib.tools.object_detection.post_processings import nms
+from rtmlib.tools.solution.pose_tracker import pose_to_bbox
 from Pose2Sim.common import natural_sort_key, sort_people_sports2d, sort_people_deepsort,\
                         colors, thickness, draw_bounding_box, draw_keypts, draw_skel, bbox_xyxy_compute, \
-                        get_screen_size, calculate_display_size
+                        get_screen_size, calculate_display_size, openpose_people, append_pose_file, pose_file_suffix, pose_file_chunk_size, pose_files_names, \
+                        read_pose_file, truncate_pose_file, pad_shape
 from Pose2Sim.skeletons import *
 
 np.set_printoptions(legacy='1.21') # otherwise prints np.float64(3.0) rather than 3.0
@@ -109,6 +116,277 @@ def setup_pose_tracker(ModelClass, det_frequency, mode, tracking, backend, devic
     return pose_tracker
 
 
+def limit_inference_threads(pose_tracker, nb_threads):
+    '''
+    Cap the number of threads used by the detection and pose models of a pose tracker, 
+    so that several trackers running side by side do not oversubscribe the CPU.
+    RTMLib does not expose session options, so the onnxruntime and openvino 
+    sessions are rebuilt with the thread limit.
+
+    INPUTS:
+    - pose_tracker: PoseTracker. Initialized pose tracker object from RTMLib
+    - nb_threads: int. Maximum number of threads for each model
+
+    OUTPUT:
+    - None. The sessions of pose_tracker are replaced
+    '''
+
+    cv2.setNumThreads(nb_threads)
+    for model in [getattr(pose_tracker, 'det_model', None), getattr(pose_tracker, 'pose_model', None)]:
+        if model is None:
+            continue
+        if model.backend == 'onnxruntime':
+            import onnxruntime as ort
+            sess_options = ort.SessionOptions()
+            sess_options.intra_op_num_threads = nb_threads
+            sess_options.inter_op_num_threads = 1
+            model.session = ort.InferenceSession(path_or_bytes=model.onnx_model, sess_options=sess_options, providers=model.session.get_providers())
+        elif model.backend == 'openvino':
+            from openvino import Core
+            from rtmlib.tools.base import RTMLIB_SETTINGS
+            core = Core()
+            model_onnx = core.read_model(model=model.onnx_model)
+            model.compiled_model = core.compile_model(model=model_onnx, 
+                                                      device_name=RTMLIB_SETTINGS['openvino'].get(model.device, model.device.upper()), 
+                                                      config={'PERFORMANCE_HINT': 'LATENCY', 'INFERENCE_NUM_THREADS': nb_threads})
+            model.input_layer = model.compiled_model.input(0)
+            if hasattr(model, '_ov_outputs'):
+                model._ov_outputs = [model.compiled_model.output(i) for i in range(len(model_onnx.outputs))]
+            else:
+                model.output_layer = model.compiled_model.output(0)
+
+
+def setup_batched_inference(pose_tracker):
+    '''
+    Prepare the detection and pose models of a pose tracker to run on several images in one call.
+    Models exported with a fixed batch size of 1 are reshaped to a dynamic batch size
+    with the openvino backend. Models which still cannot take batches are run one image at a time.
+
+    INPUTS:
+    - pose_tracker: PoseTracker. Initialized pose tracker object from RTMLib
+
+    OUTPUT:
+    - bool: False if the models are not supported (one-stage or 3D pose models), True otherwise.
+      model.batched_inference is set on both models
+    '''
+
+    det_model, pose_model = getattr(pose_tracker, 'det_model', None), getattr(pose_tracker, 'pose_model', None)
+    if det_model is None or type(det_model).__name__ not in ['YOLOX', 'RTMDet'] or type(pose_model).__name__ != 'RTMPose':
+        return False
+
+    for model in [det_model, pose_model]:
+        model.batched_inference = False
+        if model.backend == 'onnxruntime':
+            batch_dim = model.session.get_inputs()[0].shape[0]
+            model.batched_inference = not isinstance(batch_dim, int) or batch_dim < 1
+        elif model.backend == 'openvino':
+            if model.compiled_model.input(0).get_partial_shape()[0].is_dynamic:
+                model.batched_inference = True
+                continue
+            try:
+                from openvino import Core, PartialShape, Dimension
+                from rtmlib.tools.base import RTMLIB_SETTINGS
+                core = Core()
+                model_onnx = core.read_model(model=model.onnx_model)
+                input_shape = list(model_onnx.input(0).get_partial_shape())
+                model_onnx.reshape({model_onnx.input(0): PartialShape([Dimension(-1)] + input_shape[1:])})
+                model.compiled_model = core.compile_model(model=model_onnx,
+                                                          device_name=RTMLIB_SETTINGS['openvino'].get(model.device, model.device.upper()),
+                                                          config={'PERFORMANCE_HINT': 'LATENCY'})
+                model.input_layer = model.compiled_model.input(0)
+                if hasattr(model, '_ov_outputs'):
+                    model._ov_outputs = [model.compiled_model.output(i) for i in range(len(model_onnx.outputs))]
+                else:
+                    model.output_layer = model.compiled_model.output(0)
+                model.batched_inference = True
+            except Exception:
+                pass
+        if not model.batched_inference:
+            logging.info(f'{type(model).__name__} model has a fixed batch size of 1: it will be run one image at a time.')
+
+    return True
+
+
+def infer_images(model, images):
+    '''
+    Run a detection or pose model on a list of preprocessed images of identical size.
+    All images go through one call if the model accepts batches, otherwise one call per image.
+    If the batched call fails, the model falls back to one call per image from then on.
+
+    INPUTS:
+    - model: RTMLib model (YOLOX, RTMDet, RTMPose) prepared by setup_batched_inference
+    - images: list of preprocessed image arrays (H * W * 3)
+
+    OUTPUT:
+    - outputs: list of model outputs, each with one row per image
+    '''
+
+    if getattr(model, 'batched_inference', False) and len(images) > 1:
+        try:
+            batch = np.ascontiguousarray(np.stack(images).transpose(0, 3, 1, 2), dtype=np.float32)
+            if model.backend == 'onnxruntime':
+                return model.session.run([out.name for out in model.session.get_outputs()], {model.session.get_inputs()[0].name: batch})
+            elif model.backend == 'openvino':
+                results = model.compiled_model(batch)
+                return [results[out] for out in model._ov_outputs] if hasattr(model, '_ov_outputs') else [results[model.output_layer]]
+        except Exception:
+            logging.warning(f'{type(model).__name__} model cannot run on several images at once. Running it one image at a time.')
+            model.batched_inference = False
+
+    outputs = [model.inference(image) for image in images]
+    return [np.concatenate(output, axis=0) for output in zip(*outputs)]
+
+
+def detect_persons_batch(pose_trackers, frames):
+    '''
+    Detect persons on the frames of all cameras due for detection, with one detection model call.
+    The other cameras reuse the bounding boxes tracked from their previous frame.
+    Same as the detection step of PoseTracker.__call__ in RTMLib.
+
+    INPUTS:
+    - pose_trackers: list of PoseTracker. One per camera, sharing the same models
+    - frames: list of image arrays. One per camera
+
+    OUTPUT:
+    - bboxes: list of bounding boxes (xyxy) per camera, or None where detection failed
+    '''
+
+    det_model = pose_trackers[0].det_model
+    det_cams = [c for c, pose_tracker in enumerate(pose_trackers) if pose_tracker.frame_cnt % pose_tracker.det_frequency == 0]
+    bboxes = [pose_tracker.bboxes_last_frame for pose_tracker in pose_trackers]
+    if len(det_cams) == 0:
+        return bboxes
+
+    preprocessed = [det_model.preprocess(frames[c]) for c in det_cams]
+    outputs = infer_images(det_model, [image for image, _ in preprocessed])[0]
+    for i, (c, (_, ratio)) in enumerate(zip(det_cams, preprocessed)):
+        pose_tracker = pose_trackers[c]
+        try:
+            if pose_tracker.det_categories or pose_tracker.det_mode == 'multiclass':
+                cam_bboxes, classes = det_model.postprocess(outputs[i:i+1], ratio)
+                if pose_tracker.det_categories:
+                    cam_bboxes = [bbox for bbox, cls in zip(cam_bboxes, classes) if cls in pose_tracker.det_categories]
+            else:
+                cam_bboxes = det_model.postprocess(outputs[i:i+1], ratio)
+            bboxes[c] = cam_bboxes
+        except:
+            bboxes[c] = None
+
+    return bboxes
+
+
+def estimate_pose_batch(pose_model, frames, bboxes):
+    '''
+    Estimate the pose of all persons of all cameras, with one pose model call for all crops.
+    Cameras without any bounding box are estimated on the full frame, as in RTMLib.
+
+    INPUTS:
+    - pose_model: RTMPose model
+    - frames: list of image arrays. One per camera
+    - bboxes: list of bounding boxes per camera, or None to skip a camera
+
+    OUTPUTS:
+    - keypoints: list of arrays (nb persons * nb keypoints * 2) per camera, or None for skipped cameras
+    - scores: list of arrays (nb persons * nb keypoints) per camera, or None for skipped cameras
+    '''
+
+    crops, crop_cams, centers, scales = [], [], [], []
+    for c, (frame, cam_bboxes) in enumerate(zip(frames, bboxes)):
+        if cam_bboxes is None:
+            continue
+        if len(cam_bboxes) == 0:
+            cam_bboxes = [[0, 0, frame.shape[1], frame.shape[0]]]
+        for bbox in cam_bboxes:
+            crop, center, scale = pose_model.preprocess(frame, bbox)
+            crops.append(crop)
+            crop_cams.append(c)
+            centers.append(center)
+            scales.append(scale)
+
+    keypoints, scores = [[] if cam_bboxes is not None else None for cam_bboxes in bboxes], [[] if cam_bboxes is not None else None for cam_bboxes in bboxes]
+    if len(crops) == 0:
+        return keypoints, scores
+    outputs = infer_images(pose_model, crops)
+    for i, (c, center, scale) in enumerate(zip(crop_cams, centers, scales)):
+        crop_keypoints, crop_scores = pose_model.postprocess([output[i:i+1] for output in outputs], center, scale)
+        keypoints[c].append(crop_keypoints)
+        scores[c].append(crop_scores)
+    keypoints = [np.concatenate(k, axis=0) if k is not None else None for k in keypoints]
+    scores = [np.concatenate(s, axis=0) if s is not None else None for s in scores]
+
+    return keypoints, scores
+
+
+def update_tracker_state(pose_tracker, keypoints, scores):
+    '''
+    Update the bounding boxes and track ids that a pose tracker carries over to the next frame,
+    from the poses estimated outside of the tracker on the current frame.
+    Same as the end of PoseTracker.__call__ in RTMLib.
+
+    INPUTS:
+    - pose_tracker: PoseTracker. Tracker of one camera
+    - keypoints: array of detected keypoints (nb persons * nb keypoints * 2)
+    - scores: array of confidence scores (nb persons * nb keypoints)
+
+    OUTPUTS:
+    - keypoints, scores: reordered by track id when the tracker matches bounding boxes by IoU
+    '''
+
+    if not pose_tracker.tracking and pose_tracker.det_frequency != 1:
+        bboxes_current_frame = [pose_to_bbox(kpts) for kpts in keypoints]
+    else:
+        if len(pose_tracker.track_ids_last_frame) == 0:
+            pose_tracker.next_id = len(pose_tracker.bboxes_last_frame)
+            pose_tracker.track_ids_last_frame = list(range(pose_tracker.next_id))
+        bboxes_current_frame, track_ids_current_frame = [], []
+        for kpts in keypoints:
+            bbox = pose_to_bbox(kpts)
+            track_id, _ = pose_tracker.track_by_iou(bbox)
+            if track_id > -1:
+                track_ids_current_frame.append(track_id)
+                bboxes_current_frame.append(bbox)
+        pose_tracker.track_ids_last_frame = track_ids_current_frame
+        try:
+            keypoints = np.array([keypoints[i] for i in pose_tracker.track_ids_last_frame])
+            scores = np.array([scores[i] for i in pose_tracker.track_ids_last_frame])
+        except:
+            return keypoints, scores
+
+    pose_tracker.bboxes_last_frame = bboxes_current_frame
+    pose_tracker.frame_cnt += 1
+
+    return keypoints, scores
+
+
+pose_worker_state = {}
+def init_pose_worker(ModelClass, det_frequency, mode, backend, device, nb_threads, deepsort_params=None):
+    '''
+    Set up a pose tracker in each worker process, with at most nb_threads inference threads,
+    and a DeepSort tracker if deepsort_params is given.
+    '''
+
+    pose_tracker = setup_pose_tracker(ModelClass, det_frequency, mode, False, backend, device)
+    limit_inference_threads(pose_tracker, nb_threads)
+    pose_worker_state['pose_tracker'] = pose_tracker
+    if deepsort_params is not None:
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+        pose_worker_state['deepsort_tracker'] = DeepSort(**deepsort_params)
+    else:
+        pose_worker_state['deepsort_tracker'] = None
+
+
+def estimate_pose_worker(process_function, kwargs):
+    '''
+    Run process_video or process_images on one camera, with the trackers of this worker process.
+    '''
+
+    pose_tracker, deepsort_tracker = pose_worker_state['pose_tracker'], pose_worker_state['deepsort_tracker']
+    pose_tracker.reset()
+    if deepsort_tracker is not None:
+        deepsort_tracker.tracker.delete_all_tracks()
+    process_function(pose_tracker=pose_tracker, deepsort_tracker=deepsort_tracker, **kwargs)
+
+
 def setup_model_class_mode(pose_model, mode, config_dict={}):
     '''
     Set up the pose model class and mode for the pose tracker.
@@ -249,28 +527,8 @@ def save_to_openpose(json_file_path, keypoints, scores):
     - JSON file with the detected keypoints and confidence scores in the OpenPose format
     '''
 
-    # Prepare keypoints with confidence scores for JSON output
-    nb_detections = len(keypoints)
-    # print('results: ', keypoints, scores)
-    detections = []
-    for i in range(nb_detections): # nb of detected people
-        keypoints_with_confidence_i = []
-        for kp, score in zip(keypoints[i], scores[i]):
-            keypoints_with_confidence_i.extend([kp[0].item(), kp[1].item(), score.item()])
-        detections.append({
-                    "person_id": [-1],
-                    "pose_keypoints_2d": keypoints_with_confidence_i,
-                    "face_keypoints_2d": [],
-                    "hand_left_keypoints_2d": [],
-                    "hand_right_keypoints_2d": [],
-                    "pose_keypoints_3d": [],
-                    "face_keypoints_3d": [],
-                    "hand_left_keypoints_3d": [],
-                    "hand_right_keypoints_3d": []
-                })
-            
-    # Create JSON output structure
-    json_output = {"version": 1.3, "people": detections}
+    # Create JSON output structure, with keypoints and confidence scores of each detected person
+    json_output = {"version": 1.3, "people": openpose_people(keypoints, scores)}
     
     # Save JSON output for each frame
     json_output_dir = os.path.abspath(os.path.join(json_file_path, '..'))
@@ -279,15 +537,310 @@ def save_to_openpose(json_file_path, keypoints, scores):
         json.dump(json_output, json_file)
 
 
-def process_video(video_path, pose_tracker, pose_model, output_format, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_tracker):
+def put_while(q, item, keep_waiting):
+    '''
+    Put an item in a bounded queue, waiting for a free slot as long as keep_waiting() is True.
+
+    INPUTS:
+    - q: queue.Queue
+    - item: any object
+    - keep_waiting: function returning a bool
+
+    OUTPUT:
+    - bool: True if the item was put in the queue
+    '''
+
+    while keep_waiting():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def draw_detections(frame, keypoints, scores, pose_model):
+    '''
+    Draw bounding boxes, keypoints and skeletons of all detected persons on a copy of the frame.
+
+    INPUTS:
+    - frame: image array
+    - keypoints: array of detected keypoints (nb persons * nb keypoints * 2)
+    - scores: array of confidence scores (nb persons * nb keypoints)
+    - pose_model: anytree skeleton model
+
+    OUTPUT:
+    - img_show: image array with the detections drawn
+    '''
+
+    valid_X, valid_Y, valid_scores = [], [], []
+    for person_keypoints, person_scores in zip(keypoints, scores):
+        person_X, person_Y = person_keypoints[:, 0], person_keypoints[:, 1]
+        valid_X.append(person_X)
+        valid_Y.append(person_Y)
+        valid_scores.append(person_scores)
+    img_show = frame.copy()
+    img_show = draw_bounding_box(img_show, valid_X, valid_Y, colors=colors, fontSize=2, thickness=thickness)
+    img_show = draw_keypts(img_show, valid_X, valid_Y, valid_scores, cmap_str='RdYlGn')
+    img_show = draw_skel(img_show, valid_X, valid_Y, pose_model)
+
+    return img_show
+
+
+def pose_nms(frame_shape, keypoints, scores):
+    '''
+    Non maximum suppression at pose level, not detection, and only using likely keypoints.
+    Persons with a mean score below 0.2 are discarded.
+
+    INPUTS:
+    - frame_shape: tuple. Shape of the image
+    - keypoints: array of detected keypoints (nb persons * nb keypoints * 2)
+    - scores: array of confidence scores (nb persons * nb keypoints)
+
+    OUTPUTS:
+    - keypoints, scores: arrays of the persons kept
+    '''
+
+    mask_scores = np.mean(scores, axis=1) > 0.2
+
+    likely_keypoints = np.where(mask_scores[:, np.newaxis, np.newaxis], keypoints, np.nan)
+    likely_scores = np.where(mask_scores[:, np.newaxis], scores, np.nan)
+    likely_bboxes = bbox_xyxy_compute(frame_shape, likely_keypoints, padding=0)
+    score_likely_bboxes = np.nanmean(likely_scores, axis=1)
+
+    valid_indices = np.where(~np.isnan(score_likely_bboxes))[0]
+    if len(valid_indices) > 0:
+        valid_bboxes = likely_bboxes[valid_indices]
+        valid_scores = score_likely_bboxes[valid_indices]
+        keep_valid = nms(valid_bboxes, valid_scores, nms_thr=0.45)
+        keep = valid_indices[keep_valid]
+    else:
+        keep = []
+
+    return likely_keypoints[keep], likely_scores[keep]
+
+
+def saved_pose_frames(json_output_dir, pose_file_path, output_format, nb_keypoints):
+    '''
+    Poses already saved by a previous, possibly interrupted, run of pose estimation.
+    A frame is saved if its json file can be read, and/or if it is in the binary pose file.
+    When both formats are requested, it must be saved in both.
+    The incomplete last chunk of the binary pose file is cut off, so that new frames can be appended.
+
+    INPUTS:
+    - json_output_dir: str. Folder of the json files of the video
+    - pose_file_path: str. Path of the binary pose file of the video
+    - output_format: str or list. Output format for the pose estimation results ('openpose', 'binary')
+    - nb_keypoints: int. Number of keypoints of the pose model
+
+    OUTPUT:
+    - saved_poses: dict. {frame index: (keypoints (nb persons * nb keypoints * 2), scores (nb persons * nb keypoints))}
+    '''
+
+    saved_poses_formats = []
+    if 'openpose' in output_format:
+        json_poses = {}
+        json_fnames = [f for f in os.listdir(json_output_dir) if f.endswith('.json')] if os.path.isdir(json_output_dir) else []
+        for json_fname in json_fnames:
+            numbers = re.findall(r'\d+', json_fname)
+            try:
+                with open(os.path.join(json_output_dir, json_fname), 'r') as json_f:
+                    people = json.load(json_f)['people']
+                people = np.array([p['pose_keypoints_2d'] for p in people], dtype=float).reshape(len(people), nb_keypoints, 3)
+            except: # interrupted while writing, or other pose model: estimated again
+                continue
+            json_poses[int(numbers[-1])] = (people[:, :, :2], people[:, :, 2])
+        saved_poses_formats.append(json_poses)
+
+    if 'binary' in output_format:
+        binary_poses = {}
+        if os.path.isfile(pose_file_path):
+            truncate_pose_file(pose_file_path)
+            frames, nb_persons, _, keypoints, scores = read_pose_file(pose_file_path)
+            if keypoints.shape[1] in (0, nb_keypoints):
+                offsets = np.r_[0, np.cumsum(nb_persons)]
+                binary_poses = {int(f): (keypoints[offsets[i]:offsets[i+1]], scores[offsets[i]:offsets[i+1]]) for i, f in enumerate(frames)}
+        saved_poses_formats.append(binary_poses)
+
+    if len(saved_poses_formats) == 0:
+        return {}
+    saved_frames = set.intersection(*[set(saved_poses) for saved_poses in saved_poses_formats])
+    return {f: saved_poses_formats[-1][f] for f in sorted(saved_frames)}
+
+
+def resume_tracking(pose_tracker, prev_keypoints, saved_poses, skipped_frames, frame_cnt):
+    '''
+    Bring tracking up to date after skipping frames that had already been saved, 
+    so that the next frame is processed as if the run had never been interrupted:
+    - sports2d previous keypoints are updated with the saved poses of the skipped frames,
+    - the RTMLib tracker gets the bounding boxes of the last skipped frame, and its frame count 
+      (so that detection runs on the same frames as without interruption).
+    DeepSort tracks cannot be restored from saved poses, nor the IoU track ids RTMLib 
+    uses when det_frequency is 1: they are numbered again from the last saved frame.
+
+    INPUTS:
+    - pose_tracker: PoseTracker. Tracker of the camera
+    - prev_keypoints: array. Previous keypoints of sports2d tracking, None if no frame was tracked yet
+    - saved_poses: dict. {frame index: (keypoints, scores)}, as returned by saved_pose_frames
+    - skipped_frames: list of int. Frames skipped since the last processed one, in order
+    - frame_cnt: int. Number of frames since the start of the frame range
+
+    OUTPUT:
+    - prev_keypoints: array. Updated previous keypoints of sports2d tracking
+    '''
+
+    skipped_frames = [f for f in skipped_frames if f in saved_poses]
+    for f in skipped_frames:
+        keypoints = saved_poses[f][0]
+        if prev_keypoints is None:
+            prev_keypoints = keypoints
+        elif len(prev_keypoints) > 0 and len(keypoints) >= len(prev_keypoints): # same as sort_people_sports2d
+            prev_keypoints_padded = pad_shape(prev_keypoints, len(keypoints), fill_value=np.nan)
+            prev_keypoints = np.where(np.isnan(keypoints) & ~np.isnan(prev_keypoints_padded), prev_keypoints_padded, keypoints)
+
+    if len(skipped_frames) > 0:
+        keypoints = saved_poses[skipped_frames[-1]][0]
+        pose_tracker.bboxes_last_frame = [pose_to_bbox(kpts) for kpts in keypoints if not np.isnan(kpts).any()]
+        pose_tracker.track_ids_last_frame = []
+    pose_tracker.frame_cnt = frame_cnt
+
+    return prev_keypoints
+
+
+def setup_det_scheduler(pose_tracker, det_frequency_range):
+    '''
+    Set up an adaptive detection frequency for one camera: person detection is run
+    more often when persons move fast, when their pose confidence drops, or when their
+    number changes, and less often when the scene is static.
+    The RTMLib tracker is then driven by its frame count, which is set to 0 when detection
+    is due. Its det_frequency is set to at least 2, so that bounding boxes are always
+    tracked from the previous poses inbetween.
+
+    INPUTS:
+    - pose_tracker: PoseTracker. Tracker of the camera. Its det_frequency is the initial one
+    - det_frequency_range: list of 2 int. Minimum and maximum det_frequency
+
+    OUTPUT:
+    - det_scheduler: dict. State of the scheduler, updated by schedule_detection
+    '''
+
+    min_det_frequency, max_det_frequency = det_frequency_range
+    det_scheduler = {'det_frequency_range': (min_det_frequency, max_det_frequency),
+                     'fixed_det_frequency': pose_tracker.det_frequency,
+                     'det_frequency': int(np.clip(pose_tracker.det_frequency, min_det_frequency, max_det_frequency)),
+                     'frames_since_detection': 0,
+                     'det_confidence': np.nan,
+                     'prev_keypoints': None,
+                     'nb_frames': 0,
+                     'nb_detections': 0}
+    pose_tracker.det_frequency = max(2, max_det_frequency)
+
+    return det_scheduler
+
+
+def schedule_detection(det_scheduler, pose_tracker, keypoints, scores, slow_motion=0.01, fast_motion=0.05, confidence_drop=0.8):
+    '''
+    Update the detection frequency of a camera from the poses of the last frame,
+    and schedule the next detection:
+    - motion: largest displacement of a person since the previous frame, relative to their size,
+    - confidence: mean keypoint score, compared to the one of the last detection,
+    - person count: compared to the previous frame.
+    The interval between detections is halved when persons move fast or when their number changes,
+    and detection is run on the next frame if this happens, or if confidence drops, between detections
+    (but never less than the minimum det_frequency after the last one).
+    It is increased by one frame at each detection while persons are nearly static.
+
+    INPUTS:
+    - det_scheduler: dict. State of the scheduler, as returned by setup_det_scheduler
+    - pose_tracker: PoseTracker. Tracker of the camera, just called on the frame
+    - keypoints: array of detected keypoints (nb persons * nb keypoints * 2), after non maximum suppression
+    - scores: array of confidence scores (nb persons * nb keypoints)
+    - slow_motion: float. Motion (fraction of the person size per frame) below which detection is made less frequent
+    - fast_motion: float. Motion above which detection is made more frequent
+    - confidence_drop: float. Ratio to the confidence of the last detection below which tracking is considered lost
+
+    OUTPUT:
+    - None. det_scheduler and the frame count of pose_tracker are updated
+    '''
+
+    detected = (pose_tracker.frame_cnt - 1) % pose_tracker.det_frequency == 0
+    prev_keypoints = det_scheduler['prev_keypoints']
+    nb_persons = len(keypoints)
+
+    # Motion, confidence, and person count changes
+    motion = 0.
+    if nb_persons > 0 and prev_keypoints is not None and len(prev_keypoints) > 0:
+        displacements = np.nanmean(np.linalg.norm(keypoints[:, np.newaxis] - prev_keypoints[np.newaxis], axis=3), axis=2)
+        sizes = np.nanmax(np.nanmax(keypoints, axis=1) - np.nanmin(keypoints, axis=1), axis=1)
+        motion = np.nan_to_num(np.nanmax(np.nanmin(displacements, axis=1) / np.maximum(sizes, 1)))
+    confidence = np.nanmean(scores) if nb_persons > 0 else np.nan
+    count_changed = prev_keypoints is not None and nb_persons != len(prev_keypoints)
+    confidence_dropped = not detected and confidence < confidence_drop * det_scheduler['det_confidence']
+
+    # Adjust detection frequency
+    min_det_frequency, max_det_frequency = det_scheduler['det_frequency_range']
+    if motion > fast_motion or count_changed or confidence_dropped:
+        det_scheduler['det_frequency'] = max(min_det_frequency, det_scheduler['det_frequency'] // 2)
+        detect_next = not detected
+    else:
+        if detected and motion < slow_motion:
+            det_scheduler['det_frequency'] = min(max_det_frequency, det_scheduler['det_frequency'] + 1)
+        detect_next = False
+
+    if detected:
+        det_scheduler['nb_detections'] += 1
+        det_scheduler['frames_since_detection'] = 1
+        det_scheduler['det_confidence'] = confidence
+    else:
+        det_scheduler['frames_since_detection'] += 1
+    det_scheduler['nb_frames'] += 1
+    det_scheduler['prev_keypoints'] = keypoints
+
+    # Schedule next detection
+    detect_next = det_scheduler['frames_since_detection'] >= (min_det_frequency if detect_next else det_scheduler['det_frequency'])
+    pose_tracker.frame_cnt = 0 if detect_next else 1
+
+
+def report_det_scheduler(det_scheduler, pose_tracker, name):
+    '''
+    Log the detector calls saved by the adaptive detection frequency of a camera,
+    compared to a fixed det_frequency, and give the tracker its fixed det_frequency back.
+
+    INPUTS:
+    - det_scheduler: dict. State of the scheduler, as returned by setup_det_scheduler
+    - pose_tracker: PoseTracker. Tracker of the camera
+    - name: str. Name of the video or image folder
+
+    OUTPUT:
+    - None
+    '''
+
+    pose_tracker.det_frequency = det_scheduler['fixed_det_frequency']
+    nb_frames, nb_detections = det_scheduler['nb_frames'], det_scheduler['nb_detections']
+    if nb_frames == 0 or nb_detections == 0:
+        return
+    nb_fixed_detections = len(range(0, nb_frames, det_scheduler['fixed_det_frequency']))
+    nb_saved = nb_fixed_detections - nb_detections
+    logging.info(f"--> Adaptive detection frequency for {name}: persons detected on {nb_detections} of {nb_frames} frames (every {nb_frames/nb_detections:.1f} frames on average), "
+                 f"{abs(nb_saved)} detector calls {'saved' if nb_saved >= 0 else 'added'} compared to det_frequency = {det_scheduler['fixed_det_frequency']} ({abs(nb_saved)/nb_fixed_detections*100:.0f}%).")
+
+
+def process_video(video_path, pose_tracker, pose_model, output_format, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_tracker, frame_queue_size=8, write_queue_size=8, resume=False, det_frequency_range=None):
     '''
     Estimate pose from a video file
+
+    Runs as a pipeline of three stages connected by bounded queues, so that 
+    inference does not wait for decoding and writing:
+    - a decoder thread reads frames ahead of inference,
+    - the main thread runs pose estimation, tracking, and real-time display,
+    - a writer thread saves json files, draws detections, and writes videos and images.
+    The fraction of time each stage was busy is reported at the end.
     
     INPUTS:
     - video_path: str. Path to the input video file
     - pose_tracker: PoseTracker. Initialized pose tracker object from RTMLib
     - pose_model: str. The pose model to use for pose estimation (HALPE_26, COCO_133, COCO_17)
-    - output_format: str. Output format for the pose estimation results ('openpose', 'mmpose', 'deeplabcut')
+    - output_format: str or list. Output format for the pose estimation results ('openpose', 'binary')
     - save_video: bool. Whether to save the output video
     - save_images: bool. Whether to save the output images
     - display_detection: bool. Whether to show real-time visualization
@@ -295,9 +848,16 @@ def process_video(video_path, pose_tracker, pose_model, output_format, save_vide
     - multi_person: bool. Whether to detect multiple people in the video
     - tracking_mode: str. The tracking mode to use for person tracking (deepsort, sports2d)
     - deepsort_tracker: DeepSort tracker object or None
+    - frame_queue_size: int. Maximum number of frames decoded ahead of inference
+    - write_queue_size: int. Maximum number of processed frames waiting to be written
+    - resume: bool. Only process the frames that were not saved by a previous, interrupted run.
+      Tracking is restored from the saved poses of the skipped frames
+    - det_frequency_range: list of 2 int or None. Minimum and maximum det_frequency if it is adapted
+      to motion, pose confidence, and person count changes. None to keep the det_frequency of pose_tracker
 
     OUTPUTS:
-    - JSON files with the detected keypoints and confidence scores in the OpenPose format
+    - JSON files with the detected keypoints and confidence scores in the OpenPose format,
+      and/or a binary pose file with the same data for the whole video
     - if save_video: Video file with the detected keypoints and confidence scores drawn on the frames
     - if save_images: Image files with the detected keypoints and confidence scores drawn on the frames
     '''
@@ -311,8 +871,34 @@ def process_video(video_path, pose_tracker, pose_model, output_format, save_vide
     if not os.path.isdir(pose_dir): os.makedirs(pose_dir)
     video_name_wo_ext = os.path.splitext(os.path.basename(video_path))[0]
     json_output_dir = os.path.join(pose_dir, f'{video_name_wo_ext}_json')
+    pose_file_path = os.path.join(pose_dir, f'{video_name_wo_ext}{pose_file_suffix}')
     output_video_path = os.path.join(pose_dir, f'{video_name_wo_ext}_pose.mp4')
     img_output_dir = os.path.join(pose_dir, f'{video_name_wo_ext}_img')
+
+    # Retrieve keypoint names from model
+    keypoints_ids = [node.id for _, _, node in RenderTree(pose_model) if node.id!=None]
+    kpt_id_max = max(keypoints_ids)+1
+
+    # Frames to process: when resuming, only those that were not saved by the previous run
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    f_range = [[0,total_frames] if frame_range in ('all', 'auto', []) else frame_range][0]
+    if resume:
+        saved_poses = saved_pose_frames(json_output_dir, pose_file_path, output_format, kpt_id_max)
+    else:
+        saved_poses = {}
+        if 'binary' in output_format and os.path.isfile(pose_file_path):
+            os.remove(pose_file_path)
+    frames_to_process = [f for f in range(*f_range) if f not in saved_poses]
+    if len(frames_to_process) == 0:
+        logging.info(f"--> All frames of {os.path.basename(video_path)} were already processed.")
+        cap.release()
+        return
+    if len(frames_to_process) < f_range[1]-f_range[0]:
+        logging.info(f"--> Resuming {os.path.basename(video_path)}: {len(frames_to_process)} frames left to process out of {f_range[1]-f_range[0]}, from frame {frames_to_process[0]}.")
+        if save_video:
+            logging.warning(f"The output video of {os.path.basename(video_path)} will only contain the frames processed in this run.")
+        if tracking_mode == 'deepsort':
+            logging.warning('DeepSort tracks cannot be restored from saved poses: person IDs may change after resuming.')
     
     W, H = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) # Get the width and height from the raw video
 
@@ -327,53 +913,109 @@ def process_video(video_path, pose_tracker, pose_model, output_format, save_vide
         cv2.namedWindow(f"Pose Estimation {os.path.basename(video_path)}", cv2.WINDOW_NORMAL)
         cv2.resizeWindow(f"Pose Estimation {os.path.basename(video_path)}", display_width, display_height)
 
-    frame_idx = 0
     cap = cv2.VideoCapture(video_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    f_range = [[0,total_frames] if frame_range in ('all', 'auto', []) else frame_range][0]
-    cap.set(cv2.CAP_PROP_POS_FRAMES, f_range[0])
-    frame_idx = f_range[0]
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frames_to_process[0])
 
-    # Retrieve keypoint names from model
-    keypoints_ids = [node.id for _, _, node in RenderTree(pose_model) if node.id!=None]
-    kpt_id_max = max(keypoints_ids)+1
+    frame_queue = queue.Queue(maxsize=max(1, frame_queue_size))
+    write_queue = queue.Queue(maxsize=max(1, write_queue_size))
+    stop_decoding = threading.Event()
+    busy_time = {'decoding': 0., 'inference': 0., 'writing': 0.}
+    writing_errors = []
 
-    with tqdm(iterable=range(*f_range), desc=f'Processing {os.path.basename(video_path)}') as pbar:
-        while cap.isOpened():
-            if frame_idx in range(*f_range):
-                # print('\nFrame ', frame_idx)
+    def decode_frames():
+        # Read frames to process ahead of inference, until the end or until asked to stop
+        try:
+            next_frame_idx = frames_to_process[0]
+            for frame_idx in frames_to_process:
+                start_time = time.perf_counter()
+                if frame_idx != next_frame_idx: # skip frames already saved
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
                 success, frame = cap.read()
-                if not success:
+                next_frame_idx = frame_idx + 1
+                busy_time['decoding'] += time.perf_counter() - start_time
+                if not success or not put_while(frame_queue, (frame_idx, frame), lambda: not stop_decoding.is_set()):
                     break
-            
+        finally:
+            put_while(frame_queue, None, lambda: not stop_decoding.is_set())
+
+    def write_frames():
+        # Save json files or binary pose file, draw detections, and write videos and images, in frame order
+        pose_file_buffer = []
+        try:
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    break
+                start_time = time.perf_counter()
+                frame_idx, frame, keypoints, scores, img_show = item
+
+                # Save to json
+                if 'openpose' in output_format:
+                    json_file_path = os.path.join(json_output_dir, f'{video_name_wo_ext}_{frame_idx:06d}.json')
+                    save_to_openpose(json_file_path, keypoints, scores)
+
+                # Save to binary pose file, by chunks of frames
+                if 'binary' in output_format:
+                    pose_file_buffer.append((frame_idx, keypoints, scores))
+                    if len(pose_file_buffer) >= pose_file_chunk_size:
+                        append_pose_file(pose_file_path, *zip(*pose_file_buffer))
+                        pose_file_buffer = []
+
+                # Draw skeleton on the frame
+                if (save_video or save_images) and img_show is None:
+                    img_show = draw_detections(frame, keypoints, scores, pose_model)
+
+                if save_video:
+                    out.write(img_show)
+
+                if save_images:
+                    if not os.path.isdir(img_output_dir): os.makedirs(img_output_dir)
+                    cv2.imwrite(os.path.join(img_output_dir, f'{video_name_wo_ext}_{frame_idx:06d}.jpg'), img_show)
+                busy_time['writing'] += time.perf_counter() - start_time
+        except Exception as e:
+            writing_errors.append(e)
+        finally:
+            if pose_file_buffer:
+                append_pose_file(pose_file_path, *zip(*pose_file_buffer))
+
+    decoder = threading.Thread(target=decode_frames, daemon=True)
+    writer = threading.Thread(target=write_frames, daemon=True)
+    start_time_all = time.perf_counter()
+    decoder.start()
+    writer.start()
+
+    prev_keypoints, last_frame_idx = None, f_range[0]-1
+    det_scheduler = setup_det_scheduler(pose_tracker, det_frequency_range) if det_frequency_range else None
+    try:
+        with tqdm(iterable=frames_to_process, desc=f'Processing {os.path.basename(video_path)}') as pbar:
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    break
+                frame_idx, frame = item
+                start_time = time.perf_counter()
+
+                # Restore tracking after frames skipped because they were already saved
+                if frame_idx != last_frame_idx+1:
+                    prev_keypoints = resume_tracking(pose_tracker, prev_keypoints, saved_poses, range(last_frame_idx+1, frame_idx), frame_idx-f_range[0])
+                last_frame_idx = frame_idx
+
                 try: # Frames with no detection cause errors on MacOS CoreMLExecutionProvider
                     # Detect poses
                     keypoints, scores = pose_tracker(frame)
 
                     # Non maximum suppression (at pose level, not detection, and only using likely keypoints)
-                    frame_shape = frame.shape
-                    mask_scores = np.mean(scores, axis=1) > 0.2
-
-                    likely_keypoints = np.where(mask_scores[:, np.newaxis, np.newaxis], keypoints, np.nan)
-                    likely_scores = np.where(mask_scores[:, np.newaxis], scores, np.nan)
-                    likely_bboxes = bbox_xyxy_compute(frame_shape, likely_keypoints, padding=0)
-                    score_likely_bboxes = np.nanmean(likely_scores, axis=1)
-
-                    valid_indices = np.where(~np.isnan(score_likely_bboxes))[0]
-                    if len(valid_indices) > 0:
-                        valid_bboxes = likely_bboxes[valid_indices]
-                        valid_scores = score_likely_bboxes[valid_indices]
-                        keep_valid = nms(valid_bboxes, valid_scores, nms_thr=0.45)
-                        keep = valid_indices[keep_valid]
-                    else:
-                        keep = []
-                    keypoints, scores = likely_keypoints[keep], likely_scores[keep]
+                    keypoints, scores = pose_nms(frame.shape, keypoints, scores)
+
+                    # Adapt detection frequency to motion, pose confidence, and person count changes
+                    if det_scheduler is not None:
+                        schedule_detection(det_scheduler, pose_tracker, keypoints, scores)
 
                     # Track poses across frames
                     if tracking_mode == 'deepsort':
                         keypoints, scores = sort_people_deepsort(keypoints, scores, deepsort_tracker, frame, frame_idx)
                     if tracking_mode == 'sports2d': 
-                        if 'prev_keypoints' not in locals(): 
+                        if prev_keypoints is None: 
                             prev_keypoints = keypoints
                         prev_keypoints, keypoints, scores = sort_people_sports2d(prev_keypoints, keypoints, scores=scores, max_dist=max_distance_px)
                     else:
@@ -382,52 +1024,38 @@ def process_video(video_path, pose_tracker, pose_model, output_format, save_vide
                 except:
                     keypoints = np.full((1,kpt_id_max,2), fill_value=np.nan)
                     scores = np.full((1,kpt_id_max), fill_value=np.nan)
-                    
-                # Save to json
-                if 'openpose' in output_format:
-                    json_file_path = os.path.join(json_output_dir, f'{video_name_wo_ext}_{frame_idx:06d}.json')
-                    save_to_openpose(json_file_path, keypoints, scores)
 
-                # Draw skeleton on the frame
-                if display_detection or save_video or save_images:
-                    # try:
-                    #     # MMPose skeleton
-                    #     img_show = frame.copy()
-                    #     img_show = draw_skeleton(img_show, keypoints, scores, kpt_thr=0.1) # maybe change this value if 0.1 is too low
-                    # except:
-                        # Sports2D skeleton
-                        valid_X, valid_Y, valid_scores = [], [], []
-                        for person_keypoints, person_scores in zip(keypoints, scores):
-                            person_X, person_Y = person_keypoints[:, 0], person_keypoints[:, 1]
-                            valid_X.append(person_X)
-                            valid_Y.append(person_Y)
-                            valid_scores.append(person_scores)
-                        img_show = frame.copy()
-                        img_show = draw_bounding_box(img_show, valid_X, valid_Y, colors=colors, fontSize=2, thickness=thickness)
-                        img_show = draw_keypts(img_show, valid_X, valid_Y, valid_scores, cmap_str='RdYlGn')
-                        img_show = draw_skel(img_show, valid_X, valid_Y, pose_model)
-                
+                # Real-time display (drawn here, since windows must be handled by the main thread)
+                img_show = draw_detections(frame, keypoints, scores, pose_model) if display_detection else None
+                busy_time['inference'] += time.perf_counter() - start_time
                 if display_detection:
                     cv2.imshow(f"Pose Estimation {os.path.basename(video_path)}", img_show)
                     if cv2.waitKey(1) & 0xFF == ord('q'):
                         break
 
-                if save_video:
-                    out.write(img_show)
-
-                if save_images:
-                    if not os.path.isdir(img_output_dir): os.makedirs(img_output_dir)
-                    cv2.imwrite(os.path.join(img_output_dir, f'{video_name_wo_ext}_{frame_idx:06d}.jpg'), img_show)
-
-                frame_idx += 1
+                # Hand over to the writer thread
+                if not put_while(write_queue, (frame_idx, frame, keypoints, scores, img_show), writer.is_alive):
+                    break
                 pbar.update(1)
 
-            if frame_idx >= f_range[1]:
-                break
-
-    cap.release()
+    finally:
+        stop_decoding.set()
+        decoder.join()
+        put_while(write_queue, None, writer.is_alive)
+        writer.join()
+        cap.release()
+        if save_video:
+            out.release()
+    if writing_errors:
+        raise writing_errors[0]
+
+    elapsed_time = time.perf_counter() - start_time_all
+    logging.info(f"--> Decoding, inference and writing were busy {', '.join([f'{np.around(t/elapsed_time*100, decimals=0):.0f}%' for t in busy_time.values()])} of the time (queue sizes: {frame_queue_size} frames to infer, {write_queue_size} to write).")
+    if det_scheduler is not None:
+        report_det_scheduler(det_scheduler, pose_tracker, os.path.basename(video_path))
+    if 'binary' in output_format:
+        logging.info(f"--> Binary pose file saved to {pose_file_path}.")
     if save_video:
-        out.release()
         logging.info(f"--> Output video saved to {output_video_path}.")
     if save_images:
         logging.info(f"--> Output images saved to {img_output_dir}.")
@@ -435,7 +1063,289 @@ def process_video(video_path, pose_tracker, pose_model, output_format, save_vide
         cv2.destroyAllWindows()
 
 
-def process_images(image_folder_path, vid_img_extension, pose_tracker, pose_model, output_format, fps, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_tracker):
+def process_videos_batched(video_paths, pose_tracker, pose_model, output_format, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_trackers, frame_queue_size=8, write_queue_size=8, resume=False, det_frequency_range=None):
+    '''
+    Estimate pose from synchronized video files, all cameras at once
+
+    Frame t is read from every video, and the detection and pose models each run
+    once on the images and crops of all cameras. Tracking state (RTMLib tracker,
+    sports2d, DeepSort) is kept separately for each camera.
+    Runs as the same decoding/inference/writing pipeline as process_video.
+
+    INPUTS:
+    - video_paths: list of str. Paths to the input video files
+    - pose_tracker: PoseTracker. Initialized pose tracker object from RTMLib, prepared by setup_batched_inference
+    - pose_model: str. The pose model to use for pose estimation (HALPE_26, COCO_133, COCO_17)
+    - output_format: str or list. Output format for the pose estimation results ('openpose', 'binary')
+    - save_video: bool. Whether to save the output videos
+    - save_images: bool. Whether to save the output images
+    - display_detection: bool. Whether to show real-time visualization
+    - frame_range: list. Range of frames to process
+    - tracking_mode: str. The tracking mode to use for person tracking (deepsort, sports2d)
+    - max_distance_px: float. Maximum distance for sports2d tracking
+    - deepsort_trackers: list of DeepSort tracker objects or None, one per video
+    - frame_queue_size: int. Maximum number of synchronized frames decoded ahead of inference
+    - write_queue_size: int. Maximum number of processed synchronized frames waiting to be written
+    - resume: bool. Only process the frames that were not saved by a previous, interrupted run.
+      Tracking of each camera is restored from the saved poses of its skipped frames
+    - det_frequency_range: list of 2 int or None. Minimum and maximum det_frequency if it is adapted
+      to motion, pose confidence, and person count changes, for each camera separately. None to keep the det_frequency of pose_tracker
+
+    OUTPUTS:
+    - JSON files with the detected keypoints and confidence scores in the OpenPose format,
+      and/or a binary pose file with the same data for each video
+    - if save_video: Video files with the detected keypoints and confidence scores drawn on the frames
+    - if save_images: Image files with the detected keypoints and confidence scores drawn on the frames
+    '''
+
+    # Retrieve keypoint names from model
+    keypoints_ids = [node.id for _, _, node in RenderTree(pose_model) if node.id!=None]
+    kpt_id_max = max(keypoints_ids)+1
+
+    caps, video_names, json_output_dirs, pose_file_paths, img_output_dirs, output_video_paths, outs, f_ranges = [], [], [], [], [], [], [], []
+    saved_poses, frames_to_process = [], []
+    for video_path in video_paths:
+        cap = cv2.VideoCapture(video_path)
+        cap.read()
+        if cap.read()[0] == False:
+            raise NameError(f"{video_path} is not a video. Images must be put in one subdirectory per camera.")
+
+        pose_dir = os.path.abspath(os.path.join(video_path, '..', '..', 'pose'))
+        if not os.path.isdir(pose_dir): os.makedirs(pose_dir)
+        video_name_wo_ext = os.path.splitext(os.path.basename(video_path))[0]
+        video_names.append(video_name_wo_ext)
+        json_output_dirs.append(os.path.join(pose_dir, f'{video_name_wo_ext}_json'))
+        pose_file_paths.append(os.path.join(pose_dir, f'{video_name_wo_ext}{pose_file_suffix}'))
+        output_video_paths.append(os.path.join(pose_dir, f'{video_name_wo_ext}_pose.mp4'))
+        img_output_dirs.append(os.path.join(pose_dir, f'{video_name_wo_ext}_img'))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        f_ranges.append([[0,total_frames] if frame_range in ('all', 'auto', []) else frame_range][0])
+
+        # Frames to process: when resuming, only those that were not saved by the previous run
+        if resume:
+            saved_poses.append(saved_pose_frames(json_output_dirs[-1], pose_file_paths[-1], output_format, kpt_id_max))
+        else:
+            saved_poses.append({})
+            if 'binary' in output_format and os.path.isfile(pose_file_paths[-1]):
+                os.remove(pose_file_paths[-1])
+        frames_to_process.append([f for f in range(*f_ranges[-1]) if f not in saved_poses[-1]])
+        if len(frames_to_process[-1]) < f_ranges[-1][1]-f_ranges[-1][0]:
+            logging.info(f"--> Resuming {os.path.basename(video_path)}: {len(frames_to_process[-1])} frames left to process out of {f_ranges[-1][1]-f_ranges[-1][0]}{f', from frame {frames_to_process[-1][0]}' if frames_to_process[-1] else ''}.")
+
+        W, H = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) # Get the width and height from the raw video
+
+        if save_video: # Set up video writer
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v') # Codec for the output video
+            fps = round(cap.get(cv2.CAP_PROP_FPS)) # Get the frame rate from the raw video
+            outs.append(cv2.VideoWriter(output_video_paths[-1], fourcc, fps, (W, H)) if frames_to_process[-1] else None) # Create the output video file, unless all frames were already processed
+
+        if display_detection:
+            screen_width, screen_height = get_screen_size()
+            display_width, display_height = calculate_display_size(W, H, screen_width, screen_height, margin=50)
+            cv2.namedWindow(f"Pose Estimation {os.path.basename(video_path)}", cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(f"Pose Estimation {os.path.basename(video_path)}", display_width, display_height)
+
+        cap = cv2.VideoCapture(video_path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frames_to_process[-1][0] if frames_to_process[-1] else f_ranges[-1][0])
+        caps.append(cap)
+    frames_to_process_all = sorted(set().union(*frames_to_process))
+    if len(frames_to_process_all) == 0:
+        logging.info(f"--> All frames of {', '.join([os.path.basename(v) for v in video_paths])} were already processed.")
+        for cap in caps:
+            cap.release()
+        return
+    if any(len(frames_to_process[c]) < f_ranges[c][1]-f_ranges[c][0] for c in range(len(video_paths))):
+        if save_video:
+            logging.warning('The output videos will only contain the frames processed in this run.')
+        if tracking_mode == 'deepsort':
+            logging.warning('DeepSort tracks cannot be restored from saved poses: person IDs may change after resuming.')
+    frames_to_process = [set(frames) for frames in frames_to_process]
+
+    # One tracker state per camera, all sharing the same models
+    cam_trackers = [copy.copy(pose_tracker) for _ in video_paths]
+    for cam_tracker in cam_trackers:
+        cam_tracker.reset()
+    prev_keypoints = [None for _ in video_paths]
+    last_frame_idx = [f_range[0]-1 for f_range in f_ranges]
+    det_schedulers = [setup_det_scheduler(cam_tracker, det_frequency_range) for cam_tracker in cam_trackers] if det_frequency_range else None
+
+    frame_queue = queue.Queue(maxsize=max(1, frame_queue_size))
+    write_queue = queue.Queue(maxsize=max(1, write_queue_size))
+    stop_decoding = threading.Event()
+    busy_time = {'decoding': 0., 'inference': 0., 'writing': 0.}
+    writing_errors = []
+
+    def decode_frames():
+        # Read frame t of every video that still needs it ahead of inference, until all videos end or until asked to stop
+        try:
+            video_ended = [False for _ in caps]
+            next_frame_idx = [cap.get(cv2.CAP_PROP_POS_FRAMES) for cap in caps]
+            for frame_idx in frames_to_process_all:
+                start_time = time.perf_counter()
+                frames = []
+                for c, cap in enumerate(caps):
+                    frame = None
+                    if not video_ended[c] and frame_idx in frames_to_process[c]:
+                        if frame_idx != next_frame_idx[c]: # skip frames already saved
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                        success, frame = cap.read()
+                        next_frame_idx[c] = frame_idx + 1
+                        if not success:
+                            video_ended[c], frame = True, None
+                    frames.append(frame)
+                busy_time['decoding'] += time.perf_counter() - start_time
+                if all(frame is None for frame in frames):
+                    if all(video_ended[c] or frame_idx >= max(frames_to_process[c], default=-1) for c in range(len(caps))):
+                        break
+                    continue
+                if not put_while(frame_queue, (frame_idx, frames), lambda: not stop_decoding.is_set()):
+                    break
+        finally:
+            put_while(frame_queue, None, lambda: not stop_decoding.is_set())
+
+    def write_frames():
+        # Save json files or binary pose files, draw detections, and write videos and images, in frame order
+        pose_file_buffers = [[] for _ in video_paths]
+        try:
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    break
+                start_time = time.perf_counter()
+                frame_idx, frames, keypoints_all, scores_all, imgs_show = item
+                for c, (frame, keypoints, scores, img_show) in enumerate(zip(frames, keypoints_all, scores_all, imgs_show)):
+                    if frame is None:
+                        continue
+
+                    # Save to json
+                    if 'openpose' in output_format:
+                        json_file_path = os.path.join(json_output_dirs[c], f'{video_names[c]}_{frame_idx:06d}.json')
+                        save_to_openpose(json_file_path, keypoints, scores)
+
+                    # Save to binary pose file, by chunks of frames
+                    if 'binary' in output_format:
+                        pose_file_buffers[c].append((frame_idx, keypoints, scores))
+                        if len(pose_file_buffers[c]) >= pose_file_chunk_size:
+                            append_pose_file(pose_file_paths[c], *zip(*pose_file_buffers[c]))
+                            pose_file_buffers[c] = []
+
+                    # Draw skeleton on the frame
+                    if (save_video or save_images) and img_show is None:
+                        img_show = draw_detections(frame, keypoints, scores, pose_model)
+
+                    if save_video:
+                        outs[c].write(img_show)
+
+                    if save_images:
+                        if not os.path.isdir(img_output_dirs[c]): os.makedirs(img_output_dirs[c])
+                        cv2.imwrite(os.path.join(img_output_dirs[c], f'{video_names[c]}_{frame_idx:06d}.jpg'), img_show)
+                busy_time['writing'] += time.perf_counter() - start_time
+        except Exception as e:
+            writing_errors.append(e)
+        finally:
+            for pose_file_path, pose_file_buffer in zip(pose_file_paths, pose_file_buffers):
+                if pose_file_buffer:
+                    append_pose_file(pose_file_path, *zip(*pose_file_buffer))
+
+    decoder = threading.Thread(target=decode_frames, daemon=True)
+    writer = threading.Thread(target=write_frames, daemon=True)
+    start_time_all = time.perf_counter()
+    decoder.start()
+    writer.start()
+
+    try:
+        with tqdm(iterable=frames_to_process_all, desc=f'Processing {", ".join([os.path.basename(v) for v in video_paths])}') as pbar:
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    break
+                frame_idx, frames = item
+                start_time = time.perf_counter()
+                cams = [c for c, frame in enumerate(frames) if frame is not None]
+
+                # Restore tracking of cameras whose frames were skipped because they were already saved
+                for c in cams:
+                    if frame_idx != last_frame_idx[c]+1:
+                        prev_keypoints[c] = resume_tracking(cam_trackers[c], prev_keypoints[c], saved_poses[c], range(last_frame_idx[c]+1, frame_idx), frame_idx-f_ranges[c][0])
+                    last_frame_idx[c] = frame_idx
+
+                # Detect persons and estimate poses on all cameras at once
+                try:
+                    bboxes = detect_persons_batch([cam_trackers[c] for c in cams], [frames[c] for c in cams])
+                    keypoints_cams, scores_cams = estimate_pose_batch(pose_tracker.pose_model, [frames[c] for c in cams], bboxes)
+                except:
+                    keypoints_cams, scores_cams = [None for _ in cams], [None for _ in cams]
+
+                # Track poses of each camera separately
+                keypoints_all, scores_all, imgs_show = [None for _ in frames], [None for _ in frames], [None for _ in frames]
+                for c, keypoints, scores in zip(cams, keypoints_cams, scores_cams):
+                    try: # Frames with no detection cause errors on MacOS CoreMLExecutionProvider
+                        if keypoints is None:
+                            raise ValueError
+                        keypoints, scores = update_tracker_state(cam_trackers[c], keypoints, scores)
+
+                        # Non maximum suppression (at pose level, not detection, and only using likely keypoints)
+                        keypoints, scores = pose_nms(frames[c].shape, keypoints, scores)
+
+                        # Adapt detection frequency to motion, pose confidence, and person count changes
+                        if det_schedulers is not None:
+                            schedule_detection(det_schedulers[c], cam_trackers[c], keypoints, scores)
+
+                        # Track poses across frames
+                        if tracking_mode == 'deepsort':
+                            keypoints, scores = sort_people_deepsort(keypoints, scores, deepsort_trackers[c], frames[c], frame_idx)
+                        if tracking_mode == 'sports2d':
+                            if prev_keypoints[c] is None:
+                                prev_keypoints[c] = keypoints
+                            prev_keypoints[c], keypoints, scores = sort_people_sports2d(prev_keypoints[c], keypoints, scores=scores, max_dist=max_distance_px)
+
+                    except:
+                        keypoints = np.full((1,kpt_id_max,2), fill_value=np.nan)
+                        scores = np.full((1,kpt_id_max), fill_value=np.nan)
+                    keypoints_all[c], scores_all[c] = keypoints, scores
+
+                    # Real-time display (drawn here, since windows must be handled by the main thread)
+                    if display_detection:
+                        imgs_show[c] = draw_detections(frames[c], keypoints, scores, pose_model)
+                        cv2.imshow(f"Pose Estimation {os.path.basename(video_paths[c])}", imgs_show[c])
+                busy_time['inference'] += time.perf_counter() - start_time
+                if display_detection and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+                # Hand over to the writer thread
+                if not put_while(write_queue, (frame_idx, frames, keypoints_all, scores_all, imgs_show), writer.is_alive):
+                    break
+                pbar.update(1)
+
+    finally:
+        stop_decoding.set()
+        decoder.join()
+        put_while(write_queue, None, writer.is_alive)
+        writer.join()
+        for cap in caps:
+            cap.release()
+        for out in outs:
+            if out is not None:
+                out.release()
+    if writing_errors:
+        raise writing_errors[0]
+
+    elapsed_time = time.perf_counter() - start_time_all
+    logging.info(f"--> Decoding, inference and writing were busy {', '.join([f'{np.around(t/elapsed_time*100, decimals=0):.0f}%' for t in busy_time.values()])} of the time (queue sizes: {frame_queue_size} frames to infer, {write_queue_size} to write).")
+    if det_schedulers is not None:
+        for c, det_scheduler in enumerate(det_schedulers):
+            report_det_scheduler(det_scheduler, cam_trackers[c], os.path.basename(video_paths[c]))
+    if 'binary' in output_format:
+        logging.info(f"--> Binary pose files saved to {', '.join(pose_file_paths)}.")
+    if save_video:
+        logging.info(f"--> Output videos saved to {', '.join(output_video_paths)}.")
+    if save_images:
+        logging.info(f"--> Output images saved to {', '.join(img_output_dirs)}.")
+    if display_detection:
+        cv2.destroyAllWindows()
+
+
+def process_images(image_folder_path, vid_img_extension, pose_tracker, pose_model, output_format, fps, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_tracker, resume=False, det_frequency_range=None):
     '''
     Estimate pose estimation from a folder of images
     
@@ -444,16 +1354,21 @@ def process_images(image_folder_path, vid_img_extension, pose_tracker, pose_mode
     - vid_img_extension: str. Extension of the image files
     - pose_tracker: PoseTracker. Initialized pose tracker object from RTMLib
     - pose_model: str. The pose model to use for pose estimation (HALPE_26, COCO_133, COCO_17)
-    - output_format: str. Output format for the pose estimation results ('openpose', 'mmpose', 'deeplabcut')
+    - output_format: str or list. Output format for the pose estimation results ('openpose', 'binary')
     - save_video: bool. Whether to save the output video
     - save_images: bool. Whether to save the output images
     - display_detection: bool. Whether to show real-time visualization
     - frame_range: list. Range of frames to process
     - tracking_mode: str. The tracking mode to use for person tracking (deepsort, sports2d)
     - deepsort_tracker: DeepSort tracker object or None
+    - resume: bool. Only process the images that were not saved by a previous, interrupted run.
+      Tracking is restored from the saved poses of the skipped images
+    - det_frequency_range: list of 2 int or None. Minimum and maximum det_frequency if it is adapted
+      to motion, pose confidence, and person count changes. None to keep the det_frequency of pose_tracker
 
     OUTPUTS:
-    - JSON files with the detected keypoints and confidence scores in the OpenPose format
+    - JSON files with the detected keypoints and confidence scores in the OpenPose format,
+      and/or a binary pose file with the same data for the whole video
     - if save_video: Video file with the detected keypoints and confidence scores drawn on the frames
     - if save_images: Image files with the detected keypoints and confidence scores drawn on the frames
     '''    
@@ -461,12 +1376,37 @@ def process_images(image_folder_path, vid_img_extension, pose_tracker, pose_mode
     pose_dir = os.path.abspath(os.path.join(image_folder_path, '..', '..', 'pose'))
     if not os.path.isdir(pose_dir): os.makedirs(pose_dir)
     json_output_dir = os.path.join(pose_dir, f'{os.path.basename(image_folder_path)}_json')
+    pose_file_path = os.path.join(pose_dir, f'{os.path.basename(image_folder_path)}{pose_file_suffix}')
+    pose_file_buffer = []
     output_video_path = os.path.join(pose_dir, f'{os.path.basename(image_folder_path)}_pose.mp4')
     img_output_dir = os.path.join(pose_dir, f'{os.path.basename(image_folder_path)}_img')
 
     image_files = glob.glob(os.path.join(image_folder_path, '*'+vid_img_extension))
     sorted(image_files, key=natural_sort_key)
 
+    # Retrieve keypoint names from model
+    keypoints_ids = [node.id for _, _, node in RenderTree(pose_model) if node.id!=None]
+    kpt_id_max = max(keypoints_ids)+1
+    
+    # Images to process (numbered from 1 in output files): when resuming, only those that were not saved by the previous run
+    f_range = [[0,len(image_files)] if frame_range in ('all', 'auto', []) else frame_range][0]
+    if resume:
+        saved_poses = saved_pose_frames(json_output_dir, pose_file_path, output_format, kpt_id_max)
+    else:
+        saved_poses = {}
+        if 'binary' in output_format and os.path.isfile(pose_file_path):
+            os.remove(pose_file_path)
+    nb_frames_to_process = len([f for f in range(*f_range) if f < len(image_files) and f+1 not in saved_poses])
+    if nb_frames_to_process == 0:
+        logging.info(f"--> All images of {os.path.basename(image_folder_path)} were already processed.")
+        return
+    if nb_frames_to_process < min(f_range[1], len(image_files))-f_range[0]:
+        logging.info(f"--> Resuming {os.path.basename(image_folder_path)}: {nb_frames_to_process} images left to process.")
+        if save_video:
+            logging.warning(f"The output video of {os.path.basename(image_folder_path)} will only contain the images processed in this run.")
+        if tracking_mode == 'deepsort':
+            logging.warning('DeepSort tracks cannot be restored from saved poses: person IDs may change after resuming.')
+
     if save_video: # Set up video writer
         logging.warning('Using default framerate of 60 fps.')
         fourcc = cv2.VideoWriter_fourcc(*'mp4v') # Codec for the output video
@@ -479,28 +1419,34 @@ def process_images(image_folder_path, vid_img_extension, pose_tracker, pose_mode
         cv2.namedWindow(f"Pose Estimation {os.path.basename(image_folder_path)}", cv2.WINDOW_NORMAL)
         cv2.resizeWindow(f"Pose Estimation {os.path.basename(image_folder_path)}", display_width, display_height)
     
-    # Retrieve keypoint names from model
-    keypoints_ids = [node.id for _, _, node in RenderTree(pose_model) if node.id!=None]
-    kpt_id_max = max(keypoints_ids)+1
-    
-    f_range = [[0,len(image_files)] if frame_range in ('all', 'auto', []) else frame_range][0]
+    prev_keypoints, last_frame_idx = None, f_range[0]
+    det_scheduler = setup_det_scheduler(pose_tracker, det_frequency_range) if det_frequency_range else None
     for frame_idx, image_file in enumerate(tqdm(image_files, desc=f'\nProcessing {os.path.basename(img_output_dir)}')):
-        if frame_idx in range(*f_range):
+        if frame_idx in range(*f_range) and frame_idx+1 not in saved_poses:
             try:
                 frame = cv2.imread(image_file)
                 frame_idx += 1
             except:
                 raise NameError(f"{image_file} is not an image. Videos must be put in the video directory, not in subdirectories.")
+
+            # Restore tracking after images skipped because they were already saved
+            if frame_idx != last_frame_idx+1:
+                prev_keypoints = resume_tracking(pose_tracker, prev_keypoints, saved_poses, range(last_frame_idx+1, frame_idx), frame_idx-1-f_range[0])
+            last_frame_idx = frame_idx
             
             try:
                 # Detect poses
                 keypoints, scores = pose_tracker(frame)
 
+                # Adapt detection frequency to motion, pose confidence, and person count changes
+                if det_scheduler is not None:
+                    schedule_detection(det_scheduler, pose_tracker, np.asarray(keypoints), np.asarray(scores))
+
                 # Track poses across frames
                 if tracking_mode == 'deepsort':
                     keypoints, scores = sort_people_deepsort(keypoints, scores, deepsort_tracker, frame, frame_idx)
                 if tracking_mode == 'sports2d': 
-                    if 'prev_keypoints' not in locals(): 
+                    if prev_keypoints is None: 
                         prev_keypoints = keypoints
                     prev_keypoints, keypoints, scores = sort_people_sports2d(prev_keypoints, keypoints, scores=scores, max_dist=max_distance_px)
             except:
@@ -512,6 +1458,13 @@ def process_images(image_folder_path, vid_img_extension, pose_tracker, pose_mode
                 json_file_path = os.path.join(json_output_dir, f"{os.path.splitext(os.path.basename(image_file))[0]}_{frame_idx:06d}.json")
                 save_to_openpose(json_file_path, keypoints, scores)
 
+            # Save to binary pose file, by chunks of frames
+            if 'binary' in output_format:
+                pose_file_buffer.append((frame_idx, keypoints, scores))
+                if len(pose_file_buffer) >= pose_file_chunk_size:
+                    append_pose_file(pose_file_path, *zip(*pose_file_buffer))
+                    pose_file_buffer = []
+
             # Draw skeleton on the image
             if display_detection or save_video or save_images:
                 try:
@@ -543,6 +1496,13 @@ def process_images(image_folder_path, vid_img_extension, pose_tracker, pose_mode
                 if not os.path.isdir(img_output_dir): os.makedirs(img_output_dir)
                 cv2.imwrite(os.path.join(img_output_dir, f'{os.path.splitext(os.path.basename(image_file))[0]}_{frame_idx:06d}.png'), img_show)
 
+    if pose_file_buffer:
+        append_pose_file(pose_file_path, *zip(*pose_file_buffer))
+
+    if det_scheduler is not None:
+        report_det_scheduler(det_scheduler, pose_tracker, os.path.basename(image_folder_path))
+    if 'binary' in output_format:
+        logging.info(f"--> Binary pose file saved to {pose_file_path}.")
     if save_video:
         logging.info(f"--> Output video saved to {output_video_path}.")
     if save_images:
@@ -596,9 +1556,17 @@ def estimate_pose_all(config_dict):
     save_images = True if 'to_images' in config_dict['pose']['save_video'] else False
     display_detection = config_dict['pose']['display_detection']
     overwrite_pose = config_dict['pose']['overwrite_pose']
+    resume_pose = config_dict.get('pose').get('resume_pose', False)
     det_frequency = config_dict['pose']['det_frequency']
+    adaptive_det_frequency = config_dict.get('pose').get('adaptive_det_frequency', False)
+    det_frequency_range = config_dict.get('pose').get('det_frequency_range', [1, 12])
     tracking_mode = config_dict.get('pose').get('tracking_mode')
     max_distance_px = config_dict.get('pose').get('max_distance_px', None)
+    frame_queue_size = config_dict.get('pose').get('frame_queue_size', 8)
+    write_queue_size = config_dict.get('pose').get('write_queue_size', 8)
+    parallel_videos = config_dict.get('pose').get('parallel_videos', 1)
+    batch_cameras = config_dict.get('pose').get('batch_cameras', False)
+    deepsort_params = None
     if tracking_mode == 'deepsort' and multi_person:
         deepsort_params = config_dict.get('pose').get('deepsort_params')
         try:
@@ -607,10 +1575,6 @@ def estimate_pose_all(config_dict):
             deepsort_params = deepsort_params.strip("'").replace('\n', '').replace(" ", "").replace(",", '", "').replace(":", '":"').replace("{", '{"').replace("}", '"}').replace('":"/',':/').replace('":"\\',':\\')
             deepsort_params = re.sub(r'"\[([^"]+)",\s?"([^"]+)\]"', r'[\1,\2]', deepsort_params) # changes "[640", "640]" to [640,640]
             deepsort_params = json.loads(deepsort_params)
-        from deep_sort_realtime.deepsort_tracker import DeepSort
-        deepsort_tracker = DeepSort(**deepsort_params)
-    else:
-        deepsort_tracker = None
 
     backend = config_dict['pose']['backend']
     device = config_dict['pose']['device']
@@ -636,6 +1600,12 @@ def estimate_pose_all(config_dict):
         logging.info(f'Inference run on every single frame.')
     else:
         raise ValueError(f"Invalid det_frequency: {det_frequency}. Must be an integer greater or equal to 1.")
+    if adaptive_det_frequency:
+        if len(det_frequency_range) != 2 or not 1 <= det_frequency_range[0] <= det_frequency_range[1]:
+            raise ValueError(f"Invalid det_frequency_range: {det_frequency_range}. Must be [min, max] with 1 <= min <= max.")
+        logging.info(f'Detection frequency adapted to motion, pose confidence, and person count changes for each camera, between every {det_frequency_range[0]} and every {det_frequency_range[1]} frames.')
+    else:
+        det_frequency_range = None
 
     # Select the appropriate model based on the model_type
     logging.info('\nEstimating pose...')
@@ -647,52 +1617,106 @@ def estimate_pose_all(config_dict):
 
     # Estimate pose
     try:
-        pose_listdirs_names = next(os.walk(pose_dir))[1]
-        os.listdir(os.path.join(pose_dir, pose_listdirs_names[0]))[0]
-        if not overwrite_pose:
-            logging.info('Skipping pose estimation as it has already been done. Set overwrite_pose to true in Config.toml if you want to run it again.')
-        else:
+        if len(pose_files_names(pose_dir)) == 0:
+            pose_listdirs_names = next(os.walk(pose_dir))[1]
+            os.listdir(os.path.join(pose_dir, pose_listdirs_names[0]))[0]
+        if overwrite_pose:
             logging.info('Overwriting previous pose estimation. Set overwrite_pose to false in Config.toml if you want to keep the previous results.')
             raise
+        elif resume_pose:
+            logging.info('Resuming previous pose estimation: only frames without a valid output will be processed. Set resume_pose to false in Config.toml if you want to skip pose estimation when it has already been done.')
+            raise
+        else:
+            logging.info('Skipping pose estimation as it has already been done. Set overwrite_pose to true in Config.toml if you want to run it again, or resume_pose to true if it was interrupted.')
             
     except:
-        # Set up pose tracker
-        try:
-            pose_tracker = setup_pose_tracker(ModelClass, det_frequency, mode, False, backend, device)
-        except:
-            logging.error('Error: Pose estimation failed. Check in Config.toml that pose_model and mode are valid.')
-            raise ValueError('Error: Pose estimation failed. Check in Config.toml that pose_model and mode are valid.')
-
         if tracking_mode not in ['deepsort', 'sports2d']:
             logging.warning(f"Tracking mode {tracking_mode} not recognized. Using sports2d method.")
             tracking_mode = 'sports2d'
-        logging.info(f'\nPose tracking set up for "{pose_model_name}" model.')
-        logging.info(f'Mode: {mode}.')
-        logging.info(f'Tracking is performed with {tracking_mode}{"" if not tracking_mode=="deepsort" else f" with parameters: {deepsort_params}"}.\n')
 
+        # Only process frames that have no valid output yet, unless overwriting
+        resume = resume_pose and not overwrite_pose
+
+        # List videos or image folders to process
         video_files = sorted(glob.glob(os.path.join(video_dir, '*'+vid_img_extension)))
         if not len(video_files) == 0: 
-            # Process video files
             logging.info(f'Found video files with {vid_img_extension} extension.')
-            for video_path in video_files:
-                pose_tracker.reset()
-                if tracking_mode == 'deepsort': 
-                    deepsort_tracker.tracker.delete_all_tracks()
-                process_video(video_path, pose_tracker, pose_model, output_format, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_tracker)
-
+            jobs = [(process_video, dict(video_path=video_path, pose_model=pose_model, output_format=output_format, save_video=save_video, save_images=save_images, display_detection=display_detection, 
+                                         frame_range=frame_range, tracking_mode=tracking_mode, max_distance_px=max_distance_px, frame_queue_size=frame_queue_size, write_queue_size=write_queue_size, resume=resume, det_frequency_range=det_frequency_range)) 
+                    for video_path in video_files]
         else:
-            # Process image folders
             image_folders = sorted([os.path.join(video_dir,f) for f in os.listdir(video_dir) if os.path.isdir(os.path.join(video_dir, f))])
             empty_folders = [folder for folder in image_folders if len(glob.glob(os.path.join(folder, '*'+vid_img_extension)))==0]
             if len(empty_folders) != 0:
                 raise NameError(f'No image files with {vid_img_extension} extension found in {empty_folders}.')
             elif len(image_folders) == 0:
                 raise NameError(f'No image folders containing files with {vid_img_extension} extension found in {video_dir}.')
+            logging.info(f'Found image folders with {vid_img_extension} extension.')
+            jobs = [(process_images, dict(image_folder_path=os.path.join(video_dir, image_folder), vid_img_extension=vid_img_extension, pose_model=pose_model, output_format=output_format, fps=frame_rate, save_video=save_video, save_images=save_images, 
+                                          display_detection=display_detection, frame_range=frame_range, tracking_mode=tracking_mode, max_distance_px=max_distance_px, resume=resume, det_frequency_range=det_frequency_range)) 
+                    for image_folder in image_folders]
+
+        # Number of cameras processed concurrently
+        if parallel_videos == 'auto':
+            parallel_videos = os.cpu_count()
+        parallel_videos = min(1 if parallel_videos is None else int(parallel_videos), len(jobs))
+        if batch_cameras and parallel_videos > 1:
+            logging.warning('batch_cameras is ignored when processing cameras in parallel. Set parallel_videos to 1 if you need it.')
+            batch_cameras = False
+        elif batch_cameras and len(video_files) == 0:
+            logging.warning('batch_cameras is only available for video files. Image folders will be processed one after the other.')
+            batch_cameras = False
+
+        logging.info(f'\nPose tracking set up for "{pose_model_name}" model.')
+        logging.info(f'Mode: {mode}.')
+        logging.info(f'Tracking is performed with {tracking_mode}{"" if not tracking_mode=="deepsort" else f" with parameters: {deepsort_params}"}.\n')
+
+        if parallel_videos > 1:
+            # Process several cameras at once, each worker process with its own trackers and a share of the cores
+            nb_threads = max(1, os.cpu_count() // parallel_videos)
+            if display_detection:
+                logging.warning('Real-time display is not available when processing cameras in parallel. Set parallel_videos to 1 if you need it.')
+                for _, kwargs in jobs: kwargs['display_detection'] = False
+            logging.info(f'Processing {parallel_videos} cameras in parallel, with {nb_threads} inference thread{"s" if nb_threads>1 else ""} each.')
+            with ProcessPoolExecutor(max_workers=parallel_videos, initializer=init_pose_worker, 
+                                     initargs=(ModelClass, det_frequency, mode, backend, device, nb_threads, deepsort_params if tracking_mode == 'deepsort' else None)) as executor:
+                futures = [executor.submit(estimate_pose_worker, process_function, kwargs) for process_function, kwargs in jobs]
+                for future in futures:
+                    future.result()
+
+        else:
+            # Set up pose tracker
+            try:
+                pose_tracker = setup_pose_tracker(ModelClass, det_frequency, mode, False, backend, device)
+            except:
+                logging.error('Error: Pose estimation failed. Check in Config.toml that pose_model and mode are valid.')
+                raise ValueError('Error: Pose estimation failed. Check in Config.toml that pose_model and mode are valid.')
+
+            if batch_cameras and not setup_batched_inference(pose_tracker):
+                logging.warning('batch_cameras is only available with a detection model (YOLOX, RTMDet) followed by a 2D RTMPose model. Videos will be processed one after the other.')
+                batch_cameras = False
+
+            # Set up DeepSort tracker (in each worker process instead if cameras are processed in parallel)
+            if deepsort_params is not None:
+                from deep_sort_realtime.deepsort_tracker import DeepSort
+                deepsort_tracker = DeepSort(**deepsort_params)
+            else:
+                deepsort_tracker = None
+
+            if batch_cameras:
+                # Process all video files at once, frame by frame, with one tracker state per camera
+                if deepsort_tracker is not None:
+                    deepsort_trackers = [deepsort_tracker] + [DeepSort(**deepsort_params) for _ in video_files[1:]]
+                else:
+                    deepsort_trackers = [None for _ in video_files]
+                logging.info(f'Processing {len(video_files)} cameras at once, with batched detection and pose estimation.')
+                process_videos_batched(video_files, pose_tracker, pose_model, output_format, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_trackers, 
+                                       frame_queue_size=frame_queue_size, write_queue_size=write_queue_size, resume=resume, det_frequency_range=det_frequency_range)
+
             else:
-                logging.info(f'Found image folders with {vid_img_extension} extension.')
-                for image_folder in image_folders:
+                # Process video files or image folders one after the other
+                for process_function, kwargs in jobs:
                     pose_tracker.reset()
-                    image_folder_path = os.path.join(video_dir, image_folder)
-                    if tracking_mode == 'deepsort': 
-                        deepsort_tracker.tracker.delete_all_tracks()                
-                    process_images(image_folder_path, vid_img_extension, pose_tracker, pose_model, output_format, frame_rate, save_video, save_images, display_detection, frame_range, tracking_mode, max_distance_px, deepsort_tracker)
+                    if deepsort_tracker is not None: 
+                        deepsort_tracker.tracker.delete_all_tracks()
+                    process_function(pose_tracker=pose_tracker, deepsort_tracker=deepsort_tracker, **kwargs)
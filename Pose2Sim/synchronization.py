@@ -45,12 +45,14 @@ import glob
 import fnmatch
 import re
 import shutil
+from contextlib import nullcontext
 from anytree import RenderTree
 from anytree.importer import DictImporter
 from matplotlib.widgets import TextBox, Button
 import logging
 
-from Pose2Sim.common import sort_stringlist_by_last_number, bounding_boxes, interpolate_zeros_nans
+from Pose2Sim.common import sort_stringlist_by_last_number, bounding_boxes, interpolate_zeros_nans, \
+    pose_sources_names, pose_source_frames, read_pose_file, read_pose_file_frame, append_pose_file, pose_file_suffix
 from Pose2Sim.skeletons import *
 
 
@@ -1134,6 +1136,25 @@ def select_person(vid_or_img_files, cam_names, json_files_names_range, search_ar
 
 
 # SYNC FUNCTIONS
+def pose_frame_source(pose_dir, json_dir_name, json_file_name):
+    '''
+    Where to read the pose of a frame: path of the json file, 
+    or (binary pose file path, frame index) if json_dir_name is a binary pose file.
+
+    INPUTS:
+    - pose_dir: str. Path to the directory containing pose data.
+    - json_dir_name: str. Name of the JSON directory or binary pose file of the camera.
+    - json_file_name: str. Name of the JSON file, the frame index being its last number.
+
+    OUTPUT:
+    - json_file_path: str or tuple. Accepted by bounding_boxes and convert_json2pandas.
+    '''
+
+    if json_dir_name.endswith(pose_file_suffix):
+        return (os.path.join(pose_dir, json_dir_name), int(re.split(r'(\d+)', json_file_name)[-2]))
+    return os.path.join(pose_dir, json_dir_name, json_file_name)
+
+
 def load_frame_and_bounding_boxes(cap, frame_number, frame_to_json, pose_dir, json_dir_name):
     '''
     Given a video capture object or a list of image files and a frame number, 
@@ -1144,7 +1165,7 @@ def load_frame_and_bounding_boxes(cap, frame_number, frame_to_json, pose_dir, js
     - frame_number: int. The frame number to load.
     - frame_to_json: dict. Mapping from frame numbers to JSON file names.
     - pose_dir: str. Path to the directory containing pose data.
-    - json_dir_name: str. Name of the JSON directory for the current camera.
+    - json_dir_name: str. Name of the JSON directory (or binary pose file) for the current camera.
 
     OUTPUTS:
     - frame_rgb: The RGB image of the frame or image.
@@ -1176,7 +1197,7 @@ def load_frame_and_bounding_boxes(cap, frame_number, frame_to_json, pose_dir, js
     json_file_name = frame_to_json.get(frame_number)
     bounding_boxes_list = []
     if json_file_name:
-        json_file_path = os.path.join(pose_dir, json_dir_name, json_file_name)
+        json_file_path = pose_frame_source(pose_dir, json_dir_name, json_file_name)
         bounding_boxes_list.extend(bounding_boxes(json_file_path))
 
     return frame_rgb, bounding_boxes_list
@@ -1188,7 +1209,8 @@ def convert_json2pandas(json_files, likelihood_threshold=0.6, keypoints_ids=[],
     Only takes one person in the JSON file.
 
     INPUTS:
-    - json_files: list of str. Paths of the the JSON files.
+    - json_files: list of str. Paths of the the JSON files, 
+                  or (binary pose file path, frame index) tuples.
     - likelihood_threshold: float. Drop values if confidence is below likelihood_threshold.
     - keypoints_ids: list of int. Indices of the keypoints to extract.
 
@@ -1199,9 +1221,9 @@ def convert_json2pandas(json_files, likelihood_threshold=0.6, keypoints_ids=[],
     nb_coords = len(keypoints_ids)
     json_coords = []
     for j_p in json_files:
-        with open(j_p) as j_f:
+        with (open(j_p) if not isinstance(j_p, tuple) else nullcontext()) as j_f:
             try:
-                json_data_all = json.load(j_f)['people']
+                json_data_all = read_pose_file_frame(*j_p)['people'] if isinstance(j_p, tuple) else json.load(j_f)['people'] # tuple: frame of a binary pose file
 
                 # # Read files in original order (not good if the person of interest appears later)
                 # json_data = np.array([p['pose_keypoints_2d'][3*i:3*i+3] if 'pose_keypoints_2d' in p else [np.nan, np.nan, np.nan] for p in json_data_all for i in keypoints_ids])
@@ -1360,12 +1382,12 @@ def synchronize_cams_all(config_dict):
     filtered with a butterworth filter.
 
     INPUTS: 
-    - json files from each camera folders
+    - json files from each camera folders, or one binary pose file per camera
     - a Config.toml file
     - a skeleton model
 
     OUTPUTS: 
-    - synchronized json files for each camera
+    - synchronized json files (or binary pose files) for each camera
     '''
     
     # Get parameters from Config.toml
@@ -1433,18 +1455,20 @@ def synchronize_cams_all(config_dict):
     keypoints_ids = [node.id for _, _, node in RenderTree(model) if node.id!=None]
     keypoints_names = [node.name for _, _, node in RenderTree(model) if node.id!=None]
 
-    # List json files
+    # List json files, or binary pose files if there are no json folders
+    json_dirs_names = pose_sources_names(pose_dir)
+    binary_pose = len(json_dirs_names) > 0 and json_dirs_names[0].endswith(pose_file_suffix)
     try:
-        pose_listdirs_names = next(os.walk(pose_dir))[1]
-        os.listdir(os.path.join(pose_dir, pose_listdirs_names[0]))[0]
+        if binary_pose:
+            json_files_names = [[f'{j_d[:-len(pose_file_suffix)]}_{f:06d}.json' for f in pose_source_frames(pose_dir, j_d)] for j_d in json_dirs_names]
+        else:
+            json_files_names = [fnmatch.filter(os.listdir(os.path.join(pose_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
+        json_files_names[0][0]
     except:
         raise ValueError(f'No json files found in {pose_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
-    pose_listdirs_names = sort_stringlist_by_last_number(pose_listdirs_names)
-    json_dirs_names = [k for k in pose_listdirs_names if 'json' in k]
-    json_dirs = [os.path.join(pose_dir, j_d) for j_d in json_dirs_names] # list of json directories in pose_dir
-    json_files_names = [fnmatch.filter(os.listdir(os.path.join(pose_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
+    json_dirs = [os.path.join(pose_dir, j_d) for j_d in json_dirs_names] # list of json directories (or binary pose files) in pose_dir
     json_files_names = [sort_stringlist_by_last_number(j) for j in json_files_names]
-    nb_frames_per_cam = [len(fnmatch.filter(os.listdir(os.path.join(json_dir)), '*.json')) for json_dir in json_dirs]
+    nb_frames_per_cam = [len(j) for j in json_files_names]
     cam_nb = len(json_dirs)
     cam_list = list(range(cam_nb))
     cam_names = [os.path.basename(j_dir).split('_')[0] for j_dir in json_dirs]
@@ -1459,7 +1483,6 @@ def synchronize_cams_all(config_dict):
             approx_time_maxspeed *= cam_nb
 
         approx_frame_maxspeed = [int(fps * t) for t in approx_time_maxspeed]
-        nb_frames_per_cam = [len(fnmatch.filter(os.listdir(os.path.join(json_dir)), '*.json')) for json_dir in json_dirs]
 
         search_around_frames = []
         for i, frame in enumerate(approx_frame_maxspeed):
@@ -1496,7 +1519,7 @@ def synchronize_cams_all(config_dict):
     if np.array([j==[] for j in json_files_names_range]).any():
         raise ValueError(f'No json files found within the specified frame range ({frame_range}) at the times {approx_time_maxspeed} +/- {time_range_around_maxspeed} s.')
     
-    json_files_range = [[os.path.join(pose_dir, j_dir, j_file) for j_file in json_files_names_range[j]] for j, j_dir in enumerate(json_dirs_names)]
+    json_files_range = [[pose_frame_source(pose_dir, j_dir, j_file) for j_file in json_files_names_range[j]] for j, j_dir in enumerate(json_dirs_names)]
     kpt_indices = [i for i,k in zip(keypoints_ids, keypoints_names) if k in keypoints_to_consider]
     kpt_id_in_df = np.array([[keypoints_ids.index(k)*2,keypoints_ids.index(k)*2+1]  for k in kpt_indices]).ravel()
     
@@ -1520,7 +1543,7 @@ def synchronize_cams_all(config_dict):
                 # Recalculate json_files_names_range and json_files_range with updated search_around_frames
                 json_files_names_range = [[j for j in json_files_cam if int(re.split(r'(\d+)',j)[-2]) in range(*frames_cam)] 
                                         for (json_files_cam, frames_cam) in zip(json_files_names,search_around_frames)]
-                json_files_range = [[os.path.join(pose_dir, j_dir, j_file) for j_file in json_files_names_range[j]] 
+                json_files_range = [[pose_frame_source(pose_dir, j_dir, j_file) for j_file in json_files_names_range[j]] 
                                for j, j_dir in enumerate(json_dirs_names)]
 
         else:
@@ -1599,6 +1622,21 @@ def synchronize_cams_all(config_dict):
     if save_plots:
         logging.info(f'Synchronization plots saved in {sync_dir}.')
 
+    # shift frame indices of binary pose files according to the offset and write them to pose-sync
+    if binary_pose:
+        for d, j_dir in enumerate(json_dirs):
+            frames, nb_persons, person_ids, keypoints, scores = read_pose_file(j_dir)
+            offsets = np.r_[0, np.cumsum(nb_persons)]
+            keep = np.where(frames - offset[d] > 0)[0]
+            pose_sync_path = os.path.join(sync_dir, os.path.basename(j_dir))
+            if os.path.exists(pose_sync_path): os.remove(pose_sync_path)
+            append_pose_file(pose_sync_path, frames[keep] - offset[d], 
+                            [keypoints[offsets[i]:offsets[i+1]] for i in keep], 
+                            [scores[offsets[i]:offsets[i+1]] for i in keep], 
+                            [person_ids[offsets[i]:offsets[i+1]] for i in keep])
+        logging.info(f'Synchronized binary pose files saved in {sync_dir}.')
+        return
+
     # rename json files according to the offset and copy them to pose-sync
     for d, j_dir in enumerate(json_dirs):
         os.makedirs(os.path.join(sync_dir, os.path.basename(j_dir)), exist_ok=True)
@@ -40,24 +40,26 @@ OUTPUTS:
 ## INIT
 import os
 import glob
-import fnmatch
-import re
 import numpy as np
 np.set_printoptions(legacy='1.21') # otherwise prints np.float64(3.0) rather than 3.0
-import json
+import tempfile
 import itertools as it
+from functools import lru_cache
 import pandas as pd
 import cv2
 import toml
 from tqdm import tqdm
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from anytree import RenderTree
 from anytree.importer import DictImporter
 import logging
 
-from Pose2Sim.common import retrieve_calib_params, computeP, weighted_triangulation, \
-    reprojection, euclidean_distance, sort_people_sports2d, interpolate_zeros_nans, \
-    sort_stringlist_by_last_number, zup2yup, convert_to_c3d
+from Pose2Sim.common import retrieve_calib_params, computeP, weighted_triangulation_batch, \
+    reprojection_batch, project_points_batch, undistort_points_batch, euclidean_distance, sort_people_sports2d, interpolate_zeros_nans, \
+    load_pose_tensor, zup2yup, convert_to_c3d, \
+    pose_sources_names, pose_source_frames, pose_files_names, pose_file_suffix
 from Pose2Sim.skeletons import *
 
 
@@ -74,22 +76,6 @@ __status__ = "Development"
 
 
 ## FUNCTIONS
-def count_persons_in_json(file_path):
-    '''
-    Count the number of persons in a json file.
-
-    INPUT:
-    - file_path: path to the json file
-
-    OUTPUT:
-    - int: number of persons in the json file
-    '''
-
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-        return len(data.get('people', []))
-    
-
 def indices_of_first_last_non_nan_chunks(series, min_chunk_size=10, chunk_choice_method='largest', trim_output_chunk=True):
     '''
     Find indices of the chunks of at least min_chunk_size consecutive non-NaN values.
@@ -148,14 +134,16 @@ def indices_of_first_last_non_nan_chunks(series, min_chunk_size=10, chunk_choice
     return first_run_start, last_run_end
 
 
-def make_trc(config_dict, Q, keypoints_names, id_person=-1):
+def make_trc(config_dict, Q, keypoints_names, id_person=-1, f_range=None):
     '''
     Make Opensim compatible trc file from a dataframe with 3D coordinates
 
     INPUT:
     - config_dict: dictionary of configuration parameters
-    - Q: pandas dataframe with 3D coordinates as columns, frame number as rows
+    - Q: pandas dataframe with 3D coordinates as columns, frame number as rows,
+         or iterable of such dataframes on consecutive frames, written one after the other
     - keypoints_names: list of strings
+    - f_range: [first_frame, last_frame+1]. Required if Q is an iterable of dataframes
 
     OUTPUT:
     - trc file
@@ -186,31 +174,37 @@ def make_trc(config_dict, Q, keypoints_names, id_person=-1):
             logging.warning(f'Cannot read video. Frame rate will be set to 60 fps.')
             frame_rate = 30  
 
-    trc_f = f'{seq_name}_{Q.index[0]}-{Q.index[-1]}.trc'
+    if isinstance(Q, pd.DataFrame):
+        Q_chunks = [Q]
+        f_range = [Q.index[0], Q.index[-1]+1]
+    else:
+        Q_chunks = Q
+    trc_f = f'{seq_name}_{f_range[0]}-{f_range[1]-1}.trc'
 
     #Header
     DataRate = CameraRate = OrigDataRate = frame_rate
-    NumFrames = len(Q)
+    NumFrames = f_range[1] - f_range[0]
     NumMarkers = len(keypoints_names)
     header_trc = ['PathFileType\t4\t(X/Y/Z)\t' + trc_f, 
             'DataRate\tCameraRate\tNumFrames\tNumMarkers\tUnits\tOrigDataRate\tOrigDataStartFrame\tOrigNumFrames', 
-            '\t'.join(map(str,[DataRate, CameraRate, NumFrames, NumMarkers, 'm', OrigDataRate, Q.index[0], NumFrames])),
+            '\t'.join(map(str,[DataRate, CameraRate, NumFrames, NumMarkers, 'm', OrigDataRate, f_range[0], NumFrames])),
             'Frame#\tTime\t' + '\t\t\t'.join(keypoints_names) + '\t\t\t',
             '\t\t'+'\t'.join([f'X{i+1}\tY{i+1}\tZ{i+1}' for i in range(len(keypoints_names))]) + '\t']
-    
-    # Zup to Yup coordinate system
-    Q = zup2yup(Q)
-    
-    #Add Frame# and Time columns
-    Q.insert(0, 't', Q.index/ frame_rate)
-    # Q = Q.fillna(' ')
 
     #Write file
     if not os.path.exists(pose3d_dir): os.mkdir(pose3d_dir)
     trc_path = os.path.realpath(os.path.join(pose3d_dir, trc_f))
     with open(trc_path, 'w') as trc_o:
         [trc_o.write(line+'\n') for line in header_trc]
-        Q.to_csv(trc_o, sep='\t', index=True, header=None, lineterminator='\n')
+        for Q_chunk in Q_chunks:
+            # Zup to Yup coordinate system
+            Q_chunk = zup2yup(Q_chunk)
+            
+            #Add Frame# and Time columns
+            Q_chunk.insert(0, 't', Q_chunk.index/ frame_rate)
+            # Q_chunk = Q_chunk.fillna(' ')
+
+            Q_chunk.to_csv(trc_o, sep='\t', index=True, header=None, lineterminator='\n')
 
     return trc_path
 
@@ -252,7 +246,7 @@ def retrieve_right_trc_order(trc_paths):
     return trc_id
 
 
-def recap_triangulate(config_dict, error, nb_cams_excluded, keypoints_names, cam_excluded_count, interp_frames, non_interp_frames, f_range_trimmed, f_range, trc_paths):
+def recap_triangulate(config_dict, error, nb_cams_excluded, keypoints_names, cam_excluded_count, interp_frames, non_interp_frames, f_range_trimmed, f_range, trc_paths, warm_start_stats=None):
     '''
     Print a message giving statistics on reprojection errors (in pixel and in m)
     as well as the number of cameras that had to be excluded to reach threshold 
@@ -260,9 +254,12 @@ def recap_triangulate(config_dict, error, nb_cams_excluded, keypoints_names, cam
 
     INPUT:
     - a Config.toml file
-    - error: dataframe 
-    - nb_cams_excluded: dataframe
+    - error: list of pandas series, one per person. Mean reprojection error of each keypoint, 
+             and of all keypoints under 'mean'
+    - nb_cams_excluded: list of pandas series, one per person. Mean number of excluded cameras,
+             for each keypoint and for all keypoints under 'mean'
     - keypoints_names: list of strings
+    - warm_start_stats: [hits, attempts] of the warm start with previous frame's cameras
 
     OUTPUT:
     - Message in console
@@ -293,6 +290,7 @@ def recap_triangulate(config_dict, error, nb_cams_excluded, keypoints_names, cam
     make_c3d = config_dict.get('triangulation').get('make_c3d')
     handle_LR_swap = config_dict.get('triangulation').get('handle_LR_swap')
     undistort_points = config_dict.get('triangulation').get('undistort_points')
+    warm_start_cameras = config_dict.get('triangulation').get('warm_start_cameras', False) and not config_dict.get('project').get('multi_person')
     
     # Recap
     calib_cam1 = calib[cal_keys[0]]
@@ -310,9 +308,9 @@ def recap_triangulate(config_dict, error, nb_cams_excluded, keypoints_names, cam
             logging.info(f'\n\nPARTICIPANT {n}\n')
         
         for idx, name in enumerate(keypoints_names):
-            mean_error_keypoint_px = np.around(error[n].iloc[:,idx].mean(), decimals=1) # RMS à la place?
+            mean_error_keypoint_px = np.around(error[n].iloc[idx], decimals=1) # RMS à la place?
             mean_error_keypoint_m = np.around(mean_error_keypoint_px * Dm / fm, decimals=3)
-            mean_cam_excluded_keypoint = np.around(nb_cams_excluded[n].iloc[:,idx].mean(), decimals=2)
+            mean_cam_excluded_keypoint = np.around(nb_cams_excluded[n].iloc[idx], decimals=2)
             logging.info(f'Mean reprojection error for {name} is {mean_error_keypoint_px} px (~ {mean_error_keypoint_m} m), reached with {mean_cam_excluded_keypoint} excluded cameras. ')
             if show_interp_indices:
                 if interpolation_kind != 'none':
@@ -327,9 +325,9 @@ def recap_triangulate(config_dict, error, nb_cams_excluded, keypoints_names, cam
                 else:
                     logging.info(f'  No frames were interpolated because \'interpolation_kind\' was set to none. ')
         
-        mean_error_px = np.around(error[n]['mean'].mean(), decimals=1)
+        mean_error_px = np.around(error[n]['mean'], decimals=1)
         mean_error_mm = np.around(mean_error_px * Dm / fm *1000, decimals=1)
-        mean_cam_excluded = np.around(nb_cams_excluded[n]['mean'].mean(), decimals=2)
+        mean_cam_excluded = np.around(nb_cams_excluded[n]['mean'], decimals=2)
 
         logging.info(f'\n--> Mean reprojection error for all points on frames {f_range_trimmed[n][0]} to {f_range_trimmed[n][1]} is {mean_error_px} px, which roughly corresponds to {mean_error_mm} mm. ')
         logging.info(f'Cameras were excluded if likelihood was below {likelihood_threshold} and if the reprojection error was above {error_threshold_triangulation} px.') 
@@ -358,6 +356,312 @@ def recap_triangulate(config_dict, error, nb_cams_excluded, keypoints_names, cam
         logging.info('All trc files have been converted to c3d.')
     logging.info(f'Limb swapping was {"handled" if handle_LR_swap else "not handled"}.')
     logging.info(f'Lens distortions were {"taken into account" if undistort_points else "not taken into account"}.')
+    if warm_start_cameras and warm_start_stats is not None:
+        hits, attempts = warm_start_stats
+        hit_rate = f'{int(np.round(hits/attempts*100))}%' if attempts else 'n/a'
+        logging.info(f'Cameras excluded on the previous frame were excluded again straight away for {hits} out of {attempts} keypoints (warm start hit rate: {hit_rate}).')
+
+
+@lru_cache(maxsize=None)
+def camera_subsets(n_cams, nb_cams_off):
+    '''
+    Boolean masks of all the subsets obtained by taking off nb_cams_off cameras 
+    out of n_cams (same order as it.combinations). 
+    Computed only once per camera count.
+
+    INPUTS:
+    - n_cams: int. Total number of cameras
+    - nb_cams_off: int. Number of cameras taken off
+
+    OUTPUT:
+    - cams_kept: (n_subsets, n_cams) read-only boolean array. True if the camera is kept in the subset
+    '''
+
+    id_cams_off = list(it.combinations(range(n_cams), nb_cams_off))
+    id_cams_off = np.array(id_cams_off, dtype=int).reshape(len(id_cams_off), nb_cams_off)
+    cams_kept = np.ones((len(id_cams_off), n_cams), dtype=bool)
+    cams_kept[np.arange(len(id_cams_off))[:,None], id_cams_off] = False
+    cams_kept.flags.writeable = False
+
+    return cams_kept
+
+
+def reprojection_error_subsets(Q, x_files, y_files, cams_on, projection_matrices, calib_params, undistort_points):
+    '''
+    Mean reprojection error of triangulated points on the cameras they were triangulated from.
+
+    INPUTS:
+    - Q: (..., 4) array of triangulated points (x,y,z,1.)
+    - x_files, y_files: (..., n_cams) arrays of 2D coordinates
+    - cams_on: (..., n_cams) boolean array. True for cameras used for triangulation
+    - projection_matrices: list of arrays
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
+    - undistort_points: bool. If True, points are reprojected with distortions
+
+    OUTPUT:
+    - error: (...) array. Mean reprojection error in px, 
+             inf if the point could not be triangulated, nan if a used camera has no coordinates
+    '''
+
+    if undistort_points:
+        x_calc, y_calc = project_points_batch(calib_params, Q)
+    else:
+        x_calc, y_calc = reprojection_batch(projection_matrices, Q)
+
+    dist = np.where(cams_on, np.sqrt((x_files-x_calc)**2 + (y_files-y_calc)**2), 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        error = dist.sum(axis=-1) / cams_on.sum(axis=-1)
+    error = np.where(np.isnan(Q[...,0]) & ~np.isnan(error), np.inf, error)
+
+    return error
+
+
+def LR_swap_pruned_search(x_files, y_files, x_files_swapped, y_files_swapped, likelihood_files, cams_on_filt, Q_filt, max_cams_swapped, error_threshold_triangulation, projection_matrices, calib_params, undistort_points):
+    '''
+    Pruned search of the cameras to swap left and right sides on, for all camera subsets at once.
+
+    The swap benefit of each camera is scored first, as how much closer its swapped 
+    point is than its original point to the unswapped triangulation. Cameras are then 
+    swapped one at a time, in decreasing order of benefit. A configuration is not 
+    expanded further if its error minus the benefits of all remaining cameras, scored 
+    again on its own triangulation, already exceeds the best error found.
+    Configurations are solved with the normal equations of the DLT: the 4x4 blocks of 
+    all cameras are computed once, and swapping a camera only replaces its block.
+
+    N.B.: This is a heuristic. Triangulating again moves the reprojections on all 
+    cameras, so the pruning estimate is not a lower bound of the error of the pruned 
+    configurations, and the best configuration can be missed. This is why 
+    triangulation_from_best_cameras falls back to the exhaustive search if no 
+    configuration below error_threshold_triangulation is found.
+
+    INPUTS:
+    - x_files, y_files: (n_cams,) arrays of 2D coordinates
+    - x_files_swapped, y_files_swapped: (n_cams,) arrays of 2D coordinates with left/right swap
+    - likelihood_files: (n_cams,) array of likelihoods
+    - cams_on_filt: (n_subsets, n_cams) boolean array. True for cameras used for triangulation
+    - Q_filt: (n_subsets, 4) array of unswapped triangulated points
+    - max_cams_swapped: float. Strict upper bound on the number of swapped cameras
+    - error_threshold_triangulation: float. Search stops once a configuration is below this error
+    - projection_matrices: list of arrays
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
+    - undistort_points: bool. If True, points are reprojected with distortions
+
+    OUTPUTS:
+    - error_off_swap_min: float. Best reprojection error, inf if no configuration was found
+    - id_off_cams: int. Index of the camera subset of the best configuration
+    - cams_swapped_best: (n_cams,) boolean array. Swapped cameras of the best configuration
+    '''
+
+    P_all = np.asarray(projection_matrices, dtype=float)
+    n_subsets, n_cams = np.shape(cams_on_filt)
+
+    # Normal-equation blocks of each camera, unswapped and swapped
+    def camera_blocks(x, y):
+        valid = ~(np.isnan(x) | np.isnan(y)) & (likelihood_files > 0)
+        w = np.where(valid, likelihood_files, 0.)[:,None]
+        a_x = (P_all[:,0] - np.where(valid, x, 0.)[:,None]*P_all[:,2]) * w
+        a_y = (P_all[:,1] - np.where(valid, y, 0.)[:,None]*P_all[:,2]) * w
+        return np.einsum('ci,cj->cij', a_x, a_x) + np.einsum('ci,cj->cij', a_y, a_y)
+    blocks = camera_blocks(x_files, y_files)
+    blocks_swapped = camera_blocks(x_files_swapped, y_files_swapped)
+    blocks_diff = blocks_swapped - blocks
+
+    def reproject(Q):
+        if undistort_points:
+            return project_points_batch(calib_params, Q)
+        return reprojection_batch(P_all, Q)
+
+    def swap_benefit(x_calc, y_calc, swapped):
+        # how much closer the other side is to the reprojected point, for each camera
+        with np.errstate(invalid='ignore'):
+            dist = np.sqrt((x_files-x_calc)**2 + (y_files-y_calc)**2)
+            dist_swapped = np.sqrt((x_files_swapped-x_calc)**2 + (y_files_swapped-y_calc)**2)
+        dist_current = np.where(swapped, dist_swapped, dist)
+        return dist_current, np.where(swapped, dist_swapped - dist, dist - dist_swapped)
+
+    # Swap benefit of each camera on each subset, sorted in decreasing order
+    x_calc, y_calc = reproject(Q_filt)
+    _, benefit = swap_benefit(x_calc, y_calc, False)
+    candidates = cams_on_filt & ~np.isnan(benefit) & ~np.isnan(x_files_swapped) & ~np.isnan(y_files_swapped)
+    order = np.argsort(-np.where(candidates, benefit, -np.inf), axis=1, kind='stable')
+    rank = np.empty_like(order)
+    rank[np.arange(n_subsets)[:,None], order] = np.arange(n_cams)[None,:]
+    nb_cams_on = np.count_nonzero(cams_on_filt, axis=1)
+
+    # Root nodes: unswapped configuration of each subset
+    node_subset = np.arange(n_subsets)
+    node_swapped = np.zeros((n_subsets, n_cams), dtype=bool)
+    node_last_rank = np.full(n_subsets, -1)
+    node_M = np.einsum('sc,cij->sij', cams_on_filt.astype(float), blocks)
+
+    error_off_swap_min, id_off_cams, cams_swapped_best = np.inf, None, None
+    n_cams_swapped = 1
+    while len(node_subset) and error_off_swap_min > error_threshold_triangulation and n_cams_swapped < max_cams_swapped:
+        # Children: add one more candidate camera, of lower benefit than the previous ones
+        child_mask = candidates[node_subset] & (rank[node_subset] > node_last_rank[:,None])
+        parent, cam = np.nonzero(child_mask)
+        if len(parent) == 0:
+            break
+        child_subset = node_subset[parent]
+        child_swapped = node_swapped[parent]
+        child_swapped[np.arange(len(parent)), cam] = True
+        child_rank = rank[child_subset, cam]
+        child_M = node_M[parent] + blocks_diff[cam]
+
+        # Triangulate: eigenvector of the smallest eigenvalue of the normal matrix
+        _, eigvecs = np.linalg.eigh(child_M)
+        X = eigvecs[...,0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Q_child = X / X[:,3:4]
+        Q_child[:,3] = 1
+        
+        # Reprojection error, and swap benefit of the remaining candidates
+        x_calc, y_calc = reproject(Q_child)
+        dist_current, benefit = swap_benefit(x_calc, y_calc, child_swapped)
+        cams_on_child = cams_on_filt[child_subset]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            error_child = np.where(cams_on_child, dist_current, 0).sum(axis=1) / nb_cams_on[child_subset]
+            remaining = candidates[child_subset] & (rank[child_subset] > child_rank[:,None]) & (benefit > 0)
+        error_child[np.isnan(error_child) | np.isnan(Q_child[:,0])] = np.inf
+
+        best_child = np.argmin(error_child)
+        if error_child[best_child] < error_off_swap_min:
+            error_off_swap_min = error_child[best_child]
+            id_off_cams = child_subset[best_child]
+            cams_swapped_best = child_swapped[best_child]
+
+        # Prune children that are unlikely to beat the best configuration, i.e. not even if all remaining candidates 
+        # brought their current benefit (heuristic: the benefits change once the point is triangulated again)
+        bound = error_child - np.where(remaining, benefit, 0).sum(axis=1) / nb_cams_on[child_subset]
+        keep = bound < error_off_swap_min
+        node_subset, node_swapped, node_last_rank, node_M = child_subset[keep], child_swapped[keep], child_rank[keep], child_M[keep]
+        
+        n_cams_swapped += 1
+
+    return error_off_swap_min, id_off_cams, cams_swapped_best
+
+
+def camera_pairs_hypotheses(n_cams, valid_cams, nb_hypotheses):
+    '''
+    Pairs of cameras to triangulate consensus hypotheses from.
+    All pairs if there are fewer than nb_hypotheses of them, otherwise a deterministic 
+    random sample, so that results are reproducible from one run to another.
+
+    INPUTS:
+    - n_cams: int. Total number of cameras
+    - valid_cams: (n_cams,) boolean array. True for cameras with valid coordinates
+    - nb_hypotheses: int. Maximum number of pairs
+
+    OUTPUT:
+    - pairs_mask: (n_pairs, n_cams) boolean array. True for the two cameras of each pair
+    '''
+
+    pairs_mask = camera_subsets(n_cams, n_cams-2) if n_cams >= 2 else np.zeros((0, n_cams), dtype=bool)
+    pairs_mask = pairs_mask[np.all(valid_cams | ~pairs_mask, axis=1)]
+    if len(pairs_mask) > nb_hypotheses:
+        rng = np.random.default_rng(0)
+        pairs_mask = pairs_mask[np.sort(rng.choice(len(pairs_mask), nb_hypotheses, replace=False))]
+
+    return pairs_mask
+
+
+def triangulation_consensus(config_dict, coords_2D_kpt, coords_2D_kpt_swapped, projection_matrices, calib_params):
+    '''
+    Triangulates 2D keypoint coordinates from the consensus set of cameras (RANSAC-style), 
+    instead of trying all subsets of excluded cameras. 
+
+    1. Triangulates from pairs of cameras (all of them, or a fixed number of sampled ones)
+    2. Cameras whose reprojection error is below threshold are inliers of the hypothesis
+    3. Keeps the hypothesis with the most inliers (smallest error if tie), and refits on its inliers
+    If handle_LR_swap, hypotheses are still scored on unswapped coordinates, but the swapped 
+    side of a camera can join the consensus set when refitting, if it is closer to the reprojection.
+    Cost is bounded by the number of hypotheses, regardless of the number of cameras.
+
+    INPUTS:
+    - a Config.toml file
+    - coords_2D_kpt: (x,y,likelihood) * ncams array
+    - coords_2D_kpt_swapped: (x,y,likelihood) * ncams array  with left/right swap
+    - projection_matrices: list of arrays
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
+
+    OUTPUTS:
+    - Q: array of triangulated point (x,y,z)
+    - error_min: float
+    - nb_cams_excluded: int
+    - id_excluded_cams: array of int
+    '''
+
+    # Read config_dict
+    error_threshold_triangulation = config_dict.get('triangulation').get('reproj_error_threshold_triangulation')
+    min_cameras_for_triangulation = config_dict.get('triangulation').get('min_cameras_for_triangulation')
+    handle_LR_swap = config_dict.get('triangulation').get('handle_LR_swap')
+    undistort_points = config_dict.get('triangulation').get('undistort_points')
+    nb_hypotheses = config_dict.get('triangulation').get('consensus_hypotheses', 100)
+
+    # Initialize
+    x_files, y_files, likelihood_files = np.asarray(coords_2D_kpt, dtype=float)
+    x_files_swapped, y_files_swapped, _ = np.asarray(coords_2D_kpt_swapped, dtype=float)
+    n_cams = len(x_files)
+    valid_cams = ~(np.isnan(x_files) | np.isnan(y_files) | np.isnan(likelihood_files)) & (likelihood_files != 0)
+    if not handle_LR_swap:
+        x_files_swapped, y_files_swapped = np.full(n_cams, np.nan), np.full(n_cams, np.nan)
+
+    def inliers_of(Q, allow_swap):
+        # per camera distance to the closest side, inliers below threshold
+        if undistort_points:
+            x_calc, y_calc = project_points_batch(calib_params, Q)
+        else:
+            x_calc, y_calc = reprojection_batch(projection_matrices, Q)
+        with np.errstate(invalid='ignore'):
+            dist = np.sqrt((x_files-x_calc)**2 + (y_files-y_calc)**2)
+            dist_swapped = np.sqrt((x_files_swapped-x_calc)**2 + (y_files_swapped-y_calc)**2)
+            swapped = (dist_swapped < dist) & allow_swap
+            dist = np.where(swapped, dist_swapped, dist)
+            inliers = valid_cams & (dist < error_threshold_triangulation)
+        return inliers, swapped, np.where(inliers, dist, 0)
+    
+    Q, error_min, consensus = np.array([np.nan, np.nan, np.nan]), np.nan, np.zeros(n_cams, dtype=bool)
+    pairs_mask = camera_pairs_hypotheses(n_cams, valid_cams, nb_hypotheses)
+    if len(pairs_mask) > 0:
+        # Triangulate all hypotheses at once, and count their inliers
+        Q_hyp = weighted_triangulation_batch(projection_matrices, x_files, y_files, np.where(pairs_mask, likelihood_files, np.nan))
+        inliers, swapped, dist = inliers_of(Q_hyp, False)
+        nb_inliers = np.count_nonzero(inliers, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            error_hyp = np.where(nb_inliers > 0, dist.sum(axis=1) / nb_inliers, np.inf)
+        best_hyp = np.lexsort((error_hyp, -nb_inliers))[0] # most inliers, then smallest error
+        consensus, swapped_consensus = inliers[best_hyp], swapped[best_hyp]
+
+        # Refit on consensus set, until it does not change. 
+        # Q, error and consensus set are only updated together, after a successful refit
+        last_fit = None # (Q, error, consensus, swapped_consensus)
+        for _ in range(n_cams):
+            if np.count_nonzero(consensus) < max(min_cameras_for_triangulation, 2):
+                break
+            x_cons = np.where(swapped_consensus, x_files_swapped, x_files)
+            y_cons = np.where(swapped_consensus, y_files_swapped, y_files)
+            Q_cons = weighted_triangulation_batch(projection_matrices, x_cons, y_cons, np.where(consensus, likelihood_files, np.nan))
+            error_cons = reprojection_error_subsets(Q_cons, x_cons, y_cons, consensus, projection_matrices, calib_params, undistort_points)[()]
+            last_fit = (Q_cons[:-1], error_cons, consensus, swapped_consensus)
+            new_consensus, new_swapped, _ = inliers_of(Q_cons, True)
+            if np.array_equal(new_consensus, consensus) and np.array_equal(new_swapped[consensus], swapped_consensus[consensus]):
+                break
+            consensus, swapped_consensus = new_consensus, new_swapped
+        if last_fit is not None:
+            Q, error_min, consensus, swapped_consensus = last_fit
+
+    # Index of excluded cams for this keypoint
+    id_excluded_cams = np.argwhere(~consensus).ravel()
+    nb_cams_excluded = len(id_excluded_cams)
+
+    # If triangulation not successful, error = nan,  and 3D coordinates as missing values
+    if not error_min <= error_threshold_triangulation or np.count_nonzero(consensus) < min_cameras_for_triangulation:
+        error_min = np.nan
+        Q = np.array([np.nan, np.nan, np.nan])
+        id_excluded_cams = list(range(n_cams)) if not consensus.any() else id_excluded_cams
+        nb_cams_excluded = len(id_excluded_cams)
+
+    return Q, error_min, nb_cams_excluded, id_excluded_cams
 
 
 def triangulation_from_best_cameras(config_dict, coords_2D_kpt, coords_2D_kpt_swapped, projection_matrices, calib_params):
@@ -372,285 +676,336 @@ def triangulation_from_best_cameras(config_dict, coords_2D_kpt, coords_2D_kpt_sw
     If error too big, take off one more camera.
         If then below threshold, retain result.
         If better but still too big, take off one more camera.
+
+    All the subsets of a given number of excluded cameras (and all their swapped 
+    configurations) are triangulated and reprojected at once, as masked arrays.
+    With LR_swap_search = 'pruned', swapped configurations are first searched with 
+    LR_swap_pruned_search, and exhaustively only if no configuration below threshold 
+    is found: as many cameras are excluded as with the exhaustive search, but the 
+    selected configuration may not be the one with the smallest error.
+    With camera_selection = 'consensus', cameras are selected with triangulation_consensus.
     
     INPUTS:
     - a Config.toml file
     - coords_2D_kpt: (x,y,likelihood) * ncams array
     - coords_2D_kpt_swapped: (x,y,likelihood) * ncams array  with left/right swap
     - projection_matrices: list of arrays
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
 
     OUTPUTS:
-    - Q: array of triangulated point (x,y,z,1.)
+    - Q: array of triangulated point (x,y,z)
     - error_min: float
     - nb_cams_excluded: int
+    - id_excluded_cams: array of int
     '''
     
     # Read config_dict
     error_threshold_triangulation = config_dict.get('triangulation').get('reproj_error_threshold_triangulation')
     min_cameras_for_triangulation = config_dict.get('triangulation').get('min_cameras_for_triangulation')
     handle_LR_swap = config_dict.get('triangulation').get('handle_LR_swap')
-
+    LR_swap_search = config_dict.get('triangulation').get('LR_swap_search', 'exhaustive')
     undistort_points = config_dict.get('triangulation').get('undistort_points')
-    if undistort_points:
-        calib_params_K = calib_params['K']
-        calib_params_dist = calib_params['dist']
-        calib_params_R = calib_params['R']
-        calib_params_T = calib_params['T']
+    camera_selection = config_dict.get('triangulation').get('camera_selection', 'exhaustive')
+
+    if camera_selection == 'consensus':
+        return triangulation_consensus(config_dict, coords_2D_kpt, coords_2D_kpt_swapped, projection_matrices, calib_params)
 
     # Initialize
-    x_files, y_files, likelihood_files = coords_2D_kpt
-    x_files_swapped, y_files_swapped, likelihood_files_swapped = coords_2D_kpt_swapped
+    x_files, y_files, likelihood_files = np.asarray(coords_2D_kpt, dtype=float)
+    x_files_swapped, y_files_swapped, _ = np.asarray(coords_2D_kpt_swapped, dtype=float)
     n_cams = len(x_files)
-    error_min = np.inf 
+    error_min = np.inf
+    best_cams = None
     
     nb_cams_off = 0 # cameras will be taken-off until reprojection error is under threshold
-    # print('\n')
     while error_min > error_threshold_triangulation and n_cams - nb_cams_off >= min_cameras_for_triangulation:
-        # print("error min ", error_min, "thresh ", error_threshold_triangulation, 'nb_cams_off ', nb_cams_off)
-        # Create subsets with "nb_cams_off" cameras excluded
-        id_cams_off = np.array(list(it.combinations(range(n_cams), nb_cams_off)))
+        # Subsets with "nb_cams_off" cameras excluded: likelihood set to nan for excluded cameras
+        likelihood_files_filt = np.where(camera_subsets(n_cams, nb_cams_off), likelihood_files, np.nan)
+        cams_on_filt = ~np.isnan(likelihood_files_filt) & (likelihood_files_filt != 0)
         
-        if undistort_points:
-            calib_params_K_filt = [calib_params_K]*len(id_cams_off)
-            calib_params_dist_filt = [calib_params_dist]*len(id_cams_off)
-            calib_params_R_filt = [calib_params_R]*len(id_cams_off)
-            calib_params_T_filt = [calib_params_T]*len(id_cams_off)
-        projection_matrices_filt = [projection_matrices]*len(id_cams_off)
-
-        x_files_filt = np.vstack([x_files.copy()]*len(id_cams_off))
-        y_files_filt = np.vstack([y_files.copy()]*len(id_cams_off))
-        x_files_swapped_filt = np.vstack([x_files_swapped.copy()]*len(id_cams_off))
-        y_files_swapped_filt = np.vstack([y_files_swapped.copy()]*len(id_cams_off))
-        likelihood_files_filt = np.vstack([likelihood_files.copy()]*len(id_cams_off))
-        
-        if nb_cams_off > 0:
-            for i in range(len(id_cams_off)):
-                x_files_filt[i][id_cams_off[i]] = np.nan
-                y_files_filt[i][id_cams_off[i]] = np.nan
-                x_files_swapped_filt[i][id_cams_off[i]] = np.nan
-                y_files_swapped_filt[i][id_cams_off[i]] = np.nan
-                likelihood_files_filt[i][id_cams_off[i]] = np.nan
-        
-        # Excluded cameras index and count
-        id_cams_off_tot_new = [np.argwhere(np.isnan(x)).ravel() for x in likelihood_files_filt]
-        nb_cams_excluded_filt = [np.count_nonzero(np.nan_to_num(x)==0) for x in likelihood_files_filt] # count nans and zeros
-        nb_cams_off_tot = max(nb_cams_excluded_filt)
-        # print('likelihood_files_filt ',likelihood_files_filt)
-        # print('nb_cams_excluded_filt ', nb_cams_excluded_filt, 'nb_cams_off_tot ', nb_cams_off_tot)
+        # Excluded cameras count (nans and zeros)
+        nb_cams_excluded_filt = n_cams - np.count_nonzero(cams_on_filt, axis=1)
+        nb_cams_off_tot = nb_cams_excluded_filt.max()
         if nb_cams_off_tot > n_cams - min_cameras_for_triangulation:
             break
-        id_cams_off_tot = id_cams_off_tot_new
         
-        # print('still in loop')
-        if undistort_points:
-            calib_params_K_filt = [ [ c[i] for i in range(n_cams) if not np.isnan(likelihood_files_filt[j][i]) and not likelihood_files_filt[j][i]==0. ] for j, c in enumerate(calib_params_K_filt) ]
-            calib_params_dist_filt = [ [ c[i] for i in range(n_cams) if not np.isnan(likelihood_files_filt[j][i]) and not likelihood_files_filt[j][i]==0. ] for j, c in enumerate(calib_params_dist_filt) ]
-            calib_params_R_filt = [ [ c[i] for i in range(n_cams) if not np.isnan(likelihood_files_filt[j][i]) and not likelihood_files_filt[j][i]==0. ] for j, c in enumerate(calib_params_R_filt) ]
-            calib_params_T_filt = [ [ c[i] for i in range(n_cams) if not np.isnan(likelihood_files_filt[j][i]) and not likelihood_files_filt[j][i]==0. ] for j, c in enumerate(calib_params_T_filt) ]
-        projection_matrices_filt = [ [ p[i] for i in range(n_cams) if not np.isnan(likelihood_files_filt[j][i]) and not likelihood_files_filt[j][i]==0. ] for j, p in enumerate(projection_matrices_filt) ]
-        
-        # print('\nnb_cams_off', repr(nb_cams_off), 'nb_cams_excluded', repr(nb_cams_excluded_filt))
-        # print('likelihood_files ', repr(likelihood_files))
-        # print('y_files ', repr(y_files))
-        # print('x_files ', repr(x_files))
-        # print('x_files_swapped ', repr(x_files_swapped))
-        # print('likelihood_files_filt ', repr(likelihood_files_filt))
-        # print('x_files_filt ', repr(x_files_filt))
-        # print('id_cams_off_tot ', id_cams_off_tot)
-        
-        x_files_filt = [ np.array([ xx for ii, xx in enumerate(x) if not np.isnan(likelihood_files_filt[i][ii]) and not likelihood_files_filt[i][ii]==0. ]) for i,x in enumerate(x_files_filt) ]
-        y_files_filt = [ np.array([ xx for ii, xx in enumerate(x) if not np.isnan(likelihood_files_filt[i][ii]) and not likelihood_files_filt[i][ii]==0. ]) for i,x in enumerate(y_files_filt) ]
-        x_files_swapped_filt = [ np.array([ xx for ii, xx in enumerate(x) if not np.isnan(likelihood_files_filt[i][ii]) and not likelihood_files_filt[i][ii]==0. ]) for i,x in enumerate(x_files_swapped_filt) ]
-        y_files_swapped_filt = [ np.array([ xx for ii, xx in enumerate(x) if not np.isnan(likelihood_files_filt[i][ii]) and not likelihood_files_filt[i][ii]==0. ]) for i,x in enumerate(y_files_swapped_filt) ]
-        likelihood_files_filt = [ np.array([ xx for ii, xx in enumerate(x) if not np.isnan(xx) and not xx==0. ]) for x in likelihood_files_filt ]
-        # print('y_files_filt ', repr(y_files_filt))
-        # print('x_files_filt ', repr(x_files_filt))
-        # Triangulate 2D points
-        Q_filt = [weighted_triangulation(projection_matrices_filt[i], x_files_filt[i], y_files_filt[i], likelihood_files_filt[i]) for i in range(len(id_cams_off))]
-        
-        # Reprojection
-        if undistort_points:
-            coords_2D_kpt_calc_filt = [np.array([cv2.projectPoints(np.array(Q_filt[i][:-1]), calib_params_R_filt[i][j], calib_params_T_filt[i][j], calib_params_K_filt[i][j], calib_params_dist_filt[i][j])[0].ravel() 
-                                        for j in range(n_cams-nb_cams_excluded_filt[i])]) 
-                                        for i in range(len(id_cams_off))]
-            coords_2D_kpt_calc_filt = [[coords_2D_kpt_calc_filt[i][:,0], coords_2D_kpt_calc_filt[i][:,1]] for i in range(len(id_cams_off))]
-        else:
-            coords_2D_kpt_calc_filt = [reprojection(projection_matrices_filt[i], Q_filt[i]) for i in range(len(id_cams_off))]
-        coords_2D_kpt_calc_filt = np.array(coords_2D_kpt_calc_filt, dtype=object)
-        x_calc_filt = coords_2D_kpt_calc_filt[:,0]
-        # print('x_calc_filt ', x_calc_filt)
-        y_calc_filt = coords_2D_kpt_calc_filt[:,1]
-        
-        # Reprojection error
-        error = []
-        for config_off_id in range(len(x_calc_filt)):
-            q_file = [(x_files_filt[config_off_id][i], y_files_filt[config_off_id][i]) for i in range(len(x_files_filt[config_off_id]))]
-            q_calc = [(x_calc_filt[config_off_id][i], y_calc_filt[config_off_id][i]) for i in range(len(x_calc_filt[config_off_id]))]
-            error.append( np.mean( [euclidean_distance(q_file[i], q_calc[i]) for i in range(len(q_file))] ) )
-        # print('error ', error)
+        # Triangulate 2D points of all subsets at once, and compute their reprojection errors
+        Q_filt = weighted_triangulation_batch(projection_matrices, x_files, y_files, likelihood_files_filt)
+        error = reprojection_error_subsets(Q_filt, x_files, y_files, cams_on_filt, projection_matrices, calib_params, undistort_points)
+        error[np.isnan(error)] = np.inf
             
         # Choosing best triangulation (with min reprojection error)
-        # print('\n', error)
-        # print('len(error) ', len(error))
-        # print('len(x_calc_filt) ', len(x_calc_filt))
-        # print('len(likelihood_files_filt) ', len(likelihood_files_filt))
-        # print('len(id_cams_off_tot) ', len(id_cams_off_tot))
-        # print('min error ', np.nanmin(error))
-        # print('argmin error ', np.nanargmin(error))
-        error_min = np.nanmin(error)
-        # print(error_min)
-        best_cams = np.nanargmin(error)
+        best_cams = np.argmin(error)
+        error_min = error[best_cams]
+        id_excluded_cams = np.argwhere(np.isnan(likelihood_files_filt[best_cams])).ravel()
         nb_cams_excluded = nb_cams_excluded_filt[best_cams]
-        
         Q = Q_filt[best_cams][:-1]
 
-
         # Swap left and right sides if reprojection error still too high
+        if handle_LR_swap and error_min > error_threshold_triangulation and LR_swap_search == 'pruned':
+            error_off_swap_min, id_off_cams, cams_swapped_best = LR_swap_pruned_search(x_files, y_files, x_files_swapped, y_files_swapped, likelihood_files, cams_on_filt, Q_filt, (n_cams - nb_cams_off_tot) / 2, error_threshold_triangulation, projection_matrices, calib_params, undistort_points)
+            if id_off_cams is not None:
+                # Final solution with the same SVD as unswapped triangulations
+                x_files_off_swap = np.where(cams_swapped_best, x_files_swapped, x_files)
+                y_files_off_swap = np.where(cams_swapped_best, y_files_swapped, y_files)
+                Q_off_swap = weighted_triangulation_batch(projection_matrices, x_files_off_swap, y_files_off_swap, likelihood_files_filt[id_off_cams])
+                error_off_swap_min = reprojection_error_subsets(Q_off_swap, x_files_off_swap, y_files_off_swap, cams_on_filt[id_off_cams], projection_matrices, calib_params, undistort_points)[()]
+                Q_best = Q_off_swap[:-1]
+            if error_off_swap_min < error_min:
+                error_min = error_off_swap_min
+                best_cams = id_off_cams
+                id_excluded_cams = np.argwhere(np.isnan(likelihood_files_filt[best_cams])).ravel()
+                nb_cams_excluded = nb_cams_excluded_filt[best_cams]
+                Q = Q_best
+
+        # Exhaustive search, also if the pruned search did not get below threshold
         if handle_LR_swap and error_min > error_threshold_triangulation:
-            # print('handle')
             n_cams_swapped = 1
-            error_off_swap_min = error_min
+            error_off_swap_min = np.inf
             while error_off_swap_min > error_threshold_triangulation and n_cams_swapped < (n_cams - nb_cams_off_tot) / 2: # more than half of the cameras switched: may triangulate twice the same side
-                # print('SWAP: nb_cams_off ', nb_cams_off, 'n_cams_swapped ', n_cams_swapped, 'nb_cams_off_tot ', nb_cams_off_tot)
-                # Create subsets 
-                id_cams_swapped = np.array(list(it.combinations(range(n_cams-nb_cams_off_tot), n_cams_swapped)))
-                # print('id_cams_swapped ', id_cams_swapped)
-                x_files_filt_off_swap = [[x] * len(id_cams_swapped) for x in x_files_filt]
-                y_files_filt_off_swap = [[y] * len(id_cams_swapped) for y in y_files_filt]
-                # print('x_files_filt_off_swap ', x_files_filt_off_swap)
-                # print('y_files_filt_off_swap ', y_files_filt_off_swap)
-                for id_off in range(len(id_cams_off)): # for each configuration with nb_cams_off_tot removed 
-                    for id_swapped, config_swapped in enumerate(id_cams_swapped): # for each of these configurations, test all subconfigurations with with n_cams_swapped swapped
-                        # print('id_off ', id_off, 'id_swapped ', id_swapped, 'config_swapped ',  config_swapped)
-                        x_files_filt_off_swap[id_off][id_swapped][config_swapped] = x_files_swapped_filt[id_off][config_swapped] 
-                        y_files_filt_off_swap[id_off][id_swapped][config_swapped] = y_files_swapped_filt[id_off][config_swapped]
-                                
-                # Triangulate 2D points
-                Q_filt_off_swap = np.array([[weighted_triangulation(projection_matrices_filt[id_off], x_files_filt_off_swap[id_off][id_swapped], y_files_filt_off_swap[id_off][id_swapped], likelihood_files_filt[id_off]) 
-                                                for id_swapped in range(len(id_cams_swapped))]
-                                                for id_off in range(len(id_cams_off))] )
-                
-                # Reprojection
-                if undistort_points:
-                    coords_2D_kpt_calc_off_swap = [np.array([[cv2.projectPoints(np.array(Q_filt_off_swap[id_off][id_swapped][:-1]), calib_params_R_filt[id_off][j], calib_params_T_filt[id_off][j], calib_params_K_filt[id_off][j], calib_params_dist_filt[id_off][j])[0].ravel() 
-                                                    for j in range(n_cams-nb_cams_off_tot)] 
-                                                    for id_swapped in range(len(id_cams_swapped))])
-                                                    for id_off in range(len(id_cams_off))]
-                    coords_2D_kpt_calc_off_swap = np.array([[[coords_2D_kpt_calc_off_swap[id_off][id_swapped,:,0], coords_2D_kpt_calc_off_swap[id_off][id_swapped,:,1]] 
-                                                    for id_swapped in range(len(id_cams_swapped))] 
-                                                    for id_off in range(len(id_cams_off))])
-                else:
-                    coords_2D_kpt_calc_off_swap = [np.array([reprojection(projection_matrices_filt[id_off], Q_filt_off_swap[id_off][id_swapped]) 
-                                                    for id_swapped in range(len(id_cams_swapped))])
-                                                    for id_off in range(len(id_cams_off))]
-                # print(repr(coords_2D_kpt_calc_off_swap))
-                x_calc_off_swap = [c[:,0] for c in coords_2D_kpt_calc_off_swap]
-                y_calc_off_swap = [c[:,1] for c in coords_2D_kpt_calc_off_swap]
+                # Subsets with "n_cams_swapped" cameras swapped among the ones still on: (n_subsets, n_swaps, n_cams)
+                cams_swapped = ~camera_subsets(n_cams, n_cams_swapped)
+                valid_swaps = np.all(cams_on_filt[:,None,:] | ~cams_swapped[None,:,:], axis=-1)
+                x_files_off_swap = np.where(cams_swapped, x_files_swapped, x_files)
+                y_files_off_swap = np.where(cams_swapped, y_files_swapped, y_files)
+                likelihood_files_off_swap = np.where(valid_swaps[...,None], likelihood_files_filt[:,None,:], np.nan)
+                cams_on_off_swap = cams_on_filt[:,None,:] & valid_swaps[...,None]
                 
-                # Reprojection error
-                # print('x_files_filt_off_swap ', x_files_filt_off_swap)
-                # print('x_calc_off_swap ', x_calc_off_swap)
-                error_off_swap = []
-                for id_off in range(len(id_cams_off)):
-                    error_percam = []
-                    for id_swapped, config_swapped in enumerate(id_cams_swapped):
-                        # print(id_off,id_swapped,n_cams,nb_cams_off)
-                        # print(repr(x_files_filt_off_swap))
-                        q_file_off_swap = [(x_files_filt_off_swap[id_off][id_swapped][i], y_files_filt_off_swap[id_off][id_swapped][i]) for i in range(n_cams - nb_cams_off_tot)]
-                        q_calc_off_swap = [(x_calc_off_swap[id_off][id_swapped][i], y_calc_off_swap[id_off][id_swapped][i]) for i in range(n_cams - nb_cams_off_tot)]
-                        error_percam.append( np.mean( [euclidean_distance(q_file_off_swap[i], q_calc_off_swap[i]) for i in range(len(q_file_off_swap))] ) )
-                    error_off_swap.append(error_percam)
-                error_off_swap = np.array(error_off_swap)
-                # print('error_off_swap ', error_off_swap)
+                # Triangulate and reproject all swapped configurations at once
+                Q_filt_off_swap = weighted_triangulation_batch(projection_matrices, x_files_off_swap, y_files_off_swap, likelihood_files_off_swap)
+                error_off_swap = reprojection_error_subsets(Q_filt_off_swap, x_files_off_swap, y_files_off_swap, cams_on_off_swap, projection_matrices, calib_params, undistort_points)
+                error_off_swap[np.isnan(error_off_swap) | ~valid_swaps] = np.inf
                 
                 # Choosing best triangulation (with min reprojection error)
-                error_off_swap_min = np.min(error_off_swap)
-                best_off_swap_config = np.unravel_index(error_off_swap.argmin(), error_off_swap.shape)
-                
-                id_off_cams = best_off_swap_config[0]
-                id_swapped_cams = id_cams_swapped[best_off_swap_config[1]]
-                Q_best = Q_filt_off_swap[best_off_swap_config][:-1]
+                best_off_swap_config = np.unravel_index(np.argmin(error_off_swap), error_off_swap.shape)
+                if error_off_swap[best_off_swap_config] < error_off_swap_min:
+                    error_off_swap_min = error_off_swap[best_off_swap_config]
+                    id_off_cams = best_off_swap_config[0]
+                    Q_best = Q_filt_off_swap[best_off_swap_config][:-1]
 
                 n_cams_swapped += 1
 
             if error_off_swap_min < error_min:
                 error_min = error_off_swap_min
                 best_cams = id_off_cams
+                id_excluded_cams = np.argwhere(np.isnan(likelihood_files_filt[best_cams])).ravel()
+                nb_cams_excluded = nb_cams_excluded_filt[best_cams]
                 Q = Q_best
         
-        # print(error_min)
-        
         nb_cams_off += 1
     
     # Index of excluded cams for this keypoint
-    # print('Loop ended')
-    
-    if 'best_cams' in locals():
-        # print(id_cams_off_tot)
-        # print('len(id_cams_off_tot) ', len(id_cams_off_tot))
-        # print('id_cams_off_tot ', id_cams_off_tot)
-        id_excluded_cams = id_cams_off_tot[best_cams]
-        # print('id_excluded_cams ', id_excluded_cams)
-    else:
+    if best_cams is None:
         id_excluded_cams = list(range(n_cams))
         nb_cams_excluded = n_cams
-    # print('id_excluded_cams ', id_excluded_cams)
     
     # If triangulation not successful, error = nan,  and 3D coordinates as missing values
-    if error_min > error_threshold_triangulation:
+    if not error_min <= error_threshold_triangulation:
         error_min = np.nan
         Q = np.array([np.nan, np.nan, np.nan])
         
     return Q, error_min, nb_cams_excluded, id_excluded_cams
 
 
-def extract_files_frame_f(json_tracked_files_f, keypoints_ids, nb_persons_to_detect):
+def triangulation_from_previous_cameras(config_dict, coords_2D_kpt, cams_excluded_prev, projection_matrices, calib_params):
     '''
-    Extract data from json files for frame f, 
-    in the order of the body model hierarchy.
+    Triangulates 2D keypoint coordinates without the cameras that had to be excluded
+    on the previous frame. Used as a warm start before the full camera search.
 
     INPUTS:
-    - json_tracked_files_f: list of str. Paths of json_files for frame f.
-    - keypoints_ids: list of int. Keypoints IDs in the order of the hierarchy.
-    - nb_persons_to_detect: int
+    - a Config.toml file
+    - coords_2D_kpt: (x,y,likelihood) * ncams array
+    - cams_excluded_prev: (n_cams,) boolean array. Cameras excluded on the previous frame
+    - projection_matrices: list of arrays
+    - calib_params: calibration parameters from retrieve_calib_params('calib.toml')
 
     OUTPUTS:
-    - x_files, y_files, likelihood_files: [[[list of coordinates] * n_cams ] * nb_persons_to_detect]
+    - Q: array of triangulated point (x,y,z)
+    - error: float. nan if not below reproj_error_threshold_triangulation
+    - nb_cams_excluded: int
+    - id_excluded_cams: array of int
     '''
 
-    n_cams = len(json_tracked_files_f)
-    
-    x_files = [[] for n in range(nb_persons_to_detect)]
-    y_files = [[] for n in range(nb_persons_to_detect)]
-    likelihood_files = [[] for n in range(nb_persons_to_detect)]
-    for n in range(nb_persons_to_detect):
-        for cam_nb in range(n_cams):
-            x_files_cam, y_files_cam, likelihood_files_cam = [], [], []
-            try:
-                with open(json_tracked_files_f[cam_nb], 'r') as json_f:
-                    js = json.load(json_f)
-                    for keypoint_id in keypoints_ids:
-                        try:
-                            x_files_cam.append( js['people'][n]['pose_keypoints_2d'][keypoint_id*3] )
-                            y_files_cam.append( js['people'][n]['pose_keypoints_2d'][keypoint_id*3+1] )
-                            likelihood_files_cam.append( js['people'][n]['pose_keypoints_2d'][keypoint_id*3+2] )
-                        except:
-                            x_files_cam.append( np.nan )
-                            y_files_cam.append( np.nan )
-                            likelihood_files_cam.append( np.nan )
-            except:
-                x_files_cam = [np.nan] * len(keypoints_ids)
-                y_files_cam = [np.nan] * len(keypoints_ids)
-                likelihood_files_cam = [np.nan] * len(keypoints_ids)
-            x_files[n].append(x_files_cam)
-            y_files[n].append(y_files_cam)
-            likelihood_files[n].append(likelihood_files_cam)
+    error_threshold_triangulation = config_dict.get('triangulation').get('reproj_error_threshold_triangulation')
+    min_cameras_for_triangulation = config_dict.get('triangulation').get('min_cameras_for_triangulation')
+    undistort_points = config_dict.get('triangulation').get('undistort_points')
+
+    x_files, y_files, likelihood_files = np.asarray(coords_2D_kpt, dtype=float)
+    n_cams = len(x_files)
+    likelihood_files_filt = np.where(cams_excluded_prev, np.nan, likelihood_files)
+    cams_on = ~np.isnan(likelihood_files_filt) & (likelihood_files_filt != 0)
+    id_excluded_cams = np.argwhere(np.isnan(likelihood_files_filt)).ravel()
+    nb_cams_excluded = n_cams - np.count_nonzero(cams_on)
+
+    if np.count_nonzero(cams_on) < max(min_cameras_for_triangulation, 2):
+        return np.array([np.nan, np.nan, np.nan]), np.nan, nb_cams_excluded, id_excluded_cams
+
+    Q = weighted_triangulation_batch(projection_matrices, x_files, y_files, likelihood_files_filt)
+    error = reprojection_error_subsets(Q, x_files, y_files, cams_on, projection_matrices, calib_params, undistort_points)[()]
+    if not error <= error_threshold_triangulation:
+        return np.array([np.nan, np.nan, np.nan]), np.nan, nb_cams_excluded, id_excluded_cams
+
+    return Q[:-1], error, nb_cams_excluded, id_excluded_cams
+
+
+def triangulate_frames(config_dict, coords_frames, projection_matrices, calib_params, keypoints_idx_swapped, cams_excluded_prev=None, progress_bar=False):
+    '''
+    Triangulate all persons and keypoints of a sequence of frames, 
+    with the cameras that give the lowest reprojection error.
+    Frames are processed independently, persons are not reidentified across frames.
+    If warm_start_cameras, each keypoint is first triangulated without the cameras 
+    excluded on the previous frame of the sequence, and the full search only runs 
+    if the error is not below threshold. The cameras excluded on the frame preceding 
+    the sequence can be passed as cams_excluded_prev, so that the warm start carries 
+    over from one chunk of frames to the next. Since persons are only reidentified 
+    after triangulation, the warm start is only used in single-person mode.
+
+    INPUTS:
+    - config_dict: dictionary from Config.toml
+    - coords_frames: (n_frames, n_cams, nb_persons, keypoints_nb, 3) array of x, y, likelihood (already undistorted if undistort_points)
+    - projection_matrices: list of arrays. Projection matrices of all cameras
+    - calib_params: dict. Calibration parameters of all cameras
+    - keypoints_idx_swapped: list of int. Index of the left/right swapped keypoint of each keypoint
+    - cams_excluded_prev: (nb_persons, keypoints_nb, n_cams) boolean array or None. Cameras excluded on the preceding frame
+    - progress_bar: bool. Show a tqdm progress bar over frames
+
+    OUTPUTS:
+    - Q_frames, error_frames, nb_cams_excluded_frames, id_excluded_cams_frames: 
+      lists with one item per frame, of [[values]*keypoints_nb]*nb_persons
+    - warm_start_stats: [hits, attempts]. Number of keypoints solved by the warm start, 
+      out of those for which a camera had been excluded on the previous frame
+    - cams_excluded_prev: (nb_persons, keypoints_nb, n_cams) boolean array. Cameras excluded on the last frame
+    '''
+
+    likelihood_threshold = config_dict.get('triangulation').get('likelihood_threshold_triangulation')
+    warm_start_cameras = config_dict.get('triangulation').get('warm_start_cameras', False) and not config_dict.get('project').get('multi_person')
+
+    n_cams, nb_persons_to_detect, keypoints_nb = np.shape(coords_frames)[1:4]
+    keypoints_idx = list(range(keypoints_nb))
+
+    Q_frames, error_frames, nb_cams_excluded_frames, id_excluded_cams_frames = [], [], [], []
+    cams_excluded_prev = np.zeros((nb_persons_to_detect, keypoints_nb, n_cams), dtype=bool) if cams_excluded_prev is None else cams_excluded_prev.copy()
+    warm_start_stats = [0, 0]
+    for coords_f in tqdm(coords_frames, disable=not progress_bar):
+        x_files, y_files, likelihood_files = coords_f.astype(float).transpose(3,1,0,2) # each (nb_persons_to_detect, n_cams, keypoints_nb)
+
+        # Replace likelihood by 0 if under likelihood_threshold
+        with np.errstate(invalid='ignore'):
+            for n in range(nb_persons_to_detect):
+                x_files[n][likelihood_files[n] < likelihood_threshold] = np.nan
+                y_files[n][likelihood_files[n] < likelihood_threshold] = np.nan
+                likelihood_files[n][likelihood_files[n] < likelihood_threshold] = np.nan
         
-    x_files = np.array(x_files)
-    y_files = np.array(y_files)
-    likelihood_files = np.array(likelihood_files)
+        Q = [[] for n in range(nb_persons_to_detect)]
+        error = [[] for n in range(nb_persons_to_detect)]
+        nb_cams_excluded = [[] for n in range(nb_persons_to_detect)]
+        id_excluded_cams = [[] for n in range(nb_persons_to_detect)]
+        for n in range(nb_persons_to_detect):
+            for keypoint_idx in keypoints_idx:
+                # Triangulate cameras with min reprojection error
+                coords_2D_kpt = np.array( (x_files[n][:, keypoint_idx], y_files[n][:, keypoint_idx], likelihood_files[n][:, keypoint_idx]) )
+                coords_2D_kpt_swapped = np.array(( x_files[n][:, keypoints_idx_swapped[keypoint_idx]], y_files[n][:, keypoints_idx_swapped[keypoint_idx]], likelihood_files[n][:, keypoints_idx_swapped[keypoint_idx]] ))
 
-    return x_files, y_files, likelihood_files
+                # Warm start with the cameras of the previous frame
+                cams_valid = ~np.isnan(coords_2D_kpt[2])
+                warm_start = warm_start_cameras and np.any(cams_excluded_prev[n, keypoint_idx] & cams_valid)
+                if warm_start:
+                    Q_kpt, error_kpt, nb_cams_excluded_kpt, id_excluded_cams_kpt = triangulation_from_previous_cameras(config_dict, coords_2D_kpt, cams_excluded_prev[n, keypoint_idx], projection_matrices, calib_params)
+                    warm_start_stats[1] += 1
+                    warm_start_stats[0] += not np.isnan(error_kpt)
+                if not warm_start or np.isnan(error_kpt):
+                    Q_kpt, error_kpt, nb_cams_excluded_kpt, id_excluded_cams_kpt = triangulation_from_best_cameras(config_dict, coords_2D_kpt, coords_2D_kpt_swapped, projection_matrices, calib_params)
+                
+                # Cameras with valid coordinates that had to be excluded
+                cams_excluded_prev[n, keypoint_idx] = False
+                if warm_start_cameras and not np.isnan(error_kpt):
+                    cams_excluded_prev[n, keypoint_idx, id_excluded_cams_kpt] = True
+                    cams_excluded_prev[n, keypoint_idx] &= cams_valid
+
+                Q[n].append(Q_kpt)
+                error[n].append(error_kpt)
+                nb_cams_excluded[n].append(nb_cams_excluded_kpt)
+                id_excluded_cams[n].append(id_excluded_cams_kpt)
+
+        Q_frames.append(Q)
+        error_frames.append(error)
+        nb_cams_excluded_frames.append(nb_cams_excluded)
+        id_excluded_cams_frames.append(id_excluded_cams)
+
+    return Q_frames, error_frames, nb_cams_excluded_frames, id_excluded_cams_frames, warm_start_stats, cams_excluded_prev
+
+
+def extract_coords_frames(pose_tensor, f_start, f_stop, keypoints_ids, nb_persons, association_table=None):
+    '''
+    2D coordinates of frames f_start to f_stop, frame-major, for the first nb_persons persons
+    and the selected keypoints. Frames, persons, or keypoints absent from pose_tensor are nan.
+    Only these frames are read, so pose_tensor can be memory-mapped.
+
+    INPUTS:
+    - pose_tensor: (n_cams, n_frames, n_persons, n_keypoints, 3) array of x, y, likelihood
+    - f_start, f_stop: int. Frame range, f_stop excluded
+    - keypoints_ids: list of int. Keypoint ids, in the order of the body model hierarchy
+    - nb_persons: int. Number of persons to keep
+    - association_table: (n_frames, n_persons, n_cams) array from personAssociation, index of each 
+                         associated person in pose_tensor (-1 if not seen). Default: persons in pose_tensor order
+
+    OUTPUT:
+    - coords_frames: (f_stop-f_start, n_cams, nb_persons, len(keypoints_ids), 3) float32 array
+    '''
+
+    n_cams, n_frames, n_persons, n_keypoints, _ = pose_tensor.shape
+    coords_frames = np.full((f_stop-f_start, n_cams, nb_persons, len(keypoints_ids), 3), np.nan, dtype=np.float32)
+    
+    f_start_in, f_stop_in = max(f_start, 0), min(f_stop, n_frames)
+    keypoints_in = np.array(keypoints_ids) < n_keypoints
+    if f_stop_in > f_start_in and association_table is None:
+        nb_persons_in = min(nb_persons, n_persons)
+        coords_in = np.asarray(pose_tensor[:, f_start_in:f_stop_in, :nb_persons_in])[:,:,:,np.array(keypoints_ids)[keypoints_in]]
+        coords_frames[f_start_in-f_start:f_stop_in-f_start, :, :nb_persons_in, keypoints_in] = coords_in.transpose(1,0,2,3,4)
+    elif f_stop_in > f_start_in and n_persons > 0:
+        # persons in the order found by personAssociation
+        persons_ids = np.full((f_stop_in-f_start_in, nb_persons, n_cams), -1)
+        table_in = association_table[f_start_in:f_stop_in, :nb_persons]
+        persons_ids[:len(table_in), :table_in.shape[1]] = table_in
+        persons_ids = np.where(persons_ids < n_persons, persons_ids, -1).transpose(2,0,1) # (n_cams, n_frames, nb_persons)
+        coords_in = np.asarray(pose_tensor[:, f_start_in:f_stop_in])[:,:,:,np.array(keypoints_ids)[keypoints_in]]
+        coords_in = np.take_along_axis(coords_in, np.maximum(persons_ids, 0)[...,None,None], axis=2)
+        coords_in[persons_ids < 0] = np.nan
+        coords_frames[f_start_in-f_start:f_stop_in-f_start, :, :, keypoints_in] = coords_in.transpose(1,0,2,3,4)
+
+    return coords_frames
+
+
+def interpolate_frames_chunk(Q_person, start, stop, f_first, overlap, interpolation_kind, interp_gap_smaller_than):
+    '''
+    Interpolate the small gaps of one person's 3D coordinates on frames start to stop.
+    Interpolation runs on overlap extra frames on each side, so that gaps crossing 
+    the chunk borders are measured and interpolated as on the whole sequence.
+
+    INPUTS:
+    - Q_person: (n_frames, n_keypoints, 3) array of 3D coordinates, possibly memory-mapped
+    - start, stop: int. Chunk of frames to return, indices of Q_person
+    - f_first: int. Frame number of Q_person[0]
+    - overlap: int. Number of frames added on each side of the chunk
+    - interpolation_kind: 'linear', 'slinear', 'quadratic', 'cubic', or 'none'
+    - interp_gap_smaller_than: int. Larger gaps are not interpolated
+
+    OUTPUTS:
+    - Q_chunk: pandas dataframe with 3D coordinates as columns, frame numbers as rows
+    - interp_failed: bool. True if interpolation was not possible
+    '''
+
+    start_ext, stop_ext = max(start-overlap, 0), min(stop+overlap, len(Q_person))
+    Q_chunk = pd.DataFrame(np.asarray(Q_person[start_ext:stop_ext]).reshape(stop_ext-start_ext, -1).astype(float), index=range(f_first+start_ext, f_first+stop_ext))
+    
+    interp_failed = False
+    if interpolation_kind != 'none':
+        try:
+            Q_chunk = Q_chunk.apply(interpolate_zeros_nans, axis=0, args=[interp_gap_smaller_than, interpolation_kind])
+        except:
+            interp_failed = True
+    
+    return Q_chunk.iloc[start-start_ext:stop-start_ext], interp_failed
 
 
 def triangulate_all(config_dict):
@@ -683,7 +1038,6 @@ def triangulate_all(config_dict):
     multi_person = config_dict.get('project').get('multi_person')
     pose_model = config_dict.get('pose').get('pose_model')
     frame_range = config_dict.get('project').get('frame_range')
-    likelihood_threshold = config_dict.get('triangulation').get('likelihood_threshold_triangulation')
     interpolation_kind = config_dict.get('triangulation').get('interpolation')
     interp_gap_smaller_than = config_dict.get('triangulation').get('interp_if_gap_smaller_than')
     max_distance_m = config_dict.get('triangulation').get('max_distance_m', None)
@@ -694,6 +1048,13 @@ def triangulate_all(config_dict):
     show_interp_indices = config_dict.get('triangulation').get('show_interp_indices')
     undistort_points = config_dict.get('triangulation').get('undistort_points')
     make_c3d = config_dict.get('triangulation').get('make_c3d')
+    parallel_workers = config_dict.get('triangulation').get('parallel_workers', 1)
+    frames_per_chunk = config_dict.get('triangulation').get('frames_per_chunk', 0)
+    warm_start_cameras = config_dict.get('triangulation').get('warm_start_cameras', False)
+    if warm_start_cameras and multi_person:
+        logging.warning('warm_start_cameras is only available in single-person mode, since persons are not reidentified across frames before triangulation. It will be ignored.')
+    elif warm_start_cameras and parallel_workers not in (1, None):
+        logging.warning('With warm_start_cameras, the warm start restarts at the beginning of each batch of frames processed in parallel: results may differ slightly from parallel_workers = 1.')
     
     try:
         calib_dir = [os.path.join(session_dir, c) for c in os.listdir(session_dir) if os.path.isdir(os.path.join(session_dir, c)) and  'calib' in c.lower()][0]
@@ -748,28 +1109,34 @@ def triangulate_all(config_dict):
         keypoints_idx_swapped = keypoints_idx
         logging.warning('No left/right swap was performed.')
     
-    # 2d-pose files selection
+    # 2d-pose files selection: json folders, or binary pose files if pose estimation was run with output_format = 'binary'
+    json_dirs_names = pose_sources_names(pose_dir)
     try:
-        pose_listdirs_names = next(os.walk(pose_dir))[1]
-        os.listdir(os.path.join(pose_dir, pose_listdirs_names[0]))[0]
+        if not json_dirs_names[0].endswith(pose_file_suffix):
+            os.listdir(os.path.join(pose_dir, json_dirs_names[0]))[0]
     except:
         raise ValueError(f'No json files found in {pose_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
-    pose_listdirs_names = sort_stringlist_by_last_number(pose_listdirs_names)
-    json_dirs_names = [k for k in pose_listdirs_names if 'json' in k]
     n_cams = len(json_dirs_names)
-    try: 
-        json_files_names = [fnmatch.filter(os.listdir(os.path.join(poseTracked_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
-        pose_dir = poseTracked_dir
-    except:
-        try: 
-            json_files_names = [fnmatch.filter(os.listdir(os.path.join(poseSync_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
+    association_table_path = os.path.join(poseTracked_dir, 'association_table.npy')
+    association_table = None
+    if os.path.isfile(association_table_path):
+        # persons associated across cameras, indexed in the json files read by personAssociation
+        association_table = np.load(association_table_path)
+        if json_dirs_names[0].endswith(pose_file_suffix) and len(pose_files_names(poseSync_dir)) == n_cams:
             pose_dir = poseSync_dir
-        except:
-            try:
-                json_files_names = [fnmatch.filter(os.listdir(os.path.join(pose_dir, js_dir)), '*.json') for js_dir in json_dirs_names]
-            except:
-                raise Exception(f'No json files found in {pose_dir}, {poseSync_dir}, nor {poseTracked_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
-    json_files_names = [sort_stringlist_by_last_number(js) for js in json_files_names]    
+            json_dirs_names = pose_files_names(poseSync_dir)
+        json_files_names = [pose_source_frames(pose_dir, js_dir) for js_dir in json_dirs_names]
+    else:
+        for candidate_dir in [poseTracked_dir, poseSync_dir, pose_dir]:
+            candidate_names = pose_sources_names(candidate_dir)
+            if len(candidate_names) == n_cams:
+                pose_dir, json_dirs_names = candidate_dir, candidate_names
+                break
+        else:
+            raise Exception(f'No json files found in {pose_dir}, {poseSync_dir}, nor {poseTracked_dir} subdirectories. Make sure you run Pose2Sim.poseEstimation() first.')
+        json_files_names = [pose_source_frames(pose_dir, js_dir) for js_dir in json_dirs_names]
+    if association_table is not None:
+        json_files_names = [js[:len(association_table)] for js in json_files_names]    
 
     # frame range selection
     f_range = [[0,min([len(j) for j in json_files_names])] if frame_range in ('all', 'auto', []) else frame_range][0]
@@ -779,181 +1146,215 @@ def triangulate_all(config_dict):
     if n_cams != len(P):
         raise Exception(f'Error: The number of cameras is not consistent: Found {len(P)} cameras in the calibration file, and {n_cams} cameras based on the number of pose folders.')
     
+    # Read all json files at once (memory-mapped if frames are processed by chunks)
+    pose_tensor = load_pose_tensor(pose_dir, json_dirs_names, mmap_mode='r' if frames_per_chunk else None) # (n_cams, n_frames, n_persons, n_keypoints, 3)
+
     # Triangulation
     if multi_person:
-        nb_persons_to_detect = max(max(count_persons_in_json(os.path.join(pose_dir, json_dirs_names[c], json_fname)) for json_fname in json_files_names[c]) for c in range(n_cams))
+        nb_persons_to_detect = pose_tensor.shape[2] if association_table is None else association_table.shape[1]
     else:
         nb_persons_to_detect = 1
 
-    Q = [[[np.nan]*3]*keypoints_nb for n in range(nb_persons_to_detect)]
-    Q_old = [[[np.nan]*3]*keypoints_nb for n in range(nb_persons_to_detect)]
-    error = [[] for n in range(nb_persons_to_detect)]
-    nb_cams_excluded = [[] for n in range(nb_persons_to_detect)]
-    id_excluded_cams = [[] for n in range(nb_persons_to_detect)]
-    Q_tot, error_tot, nb_cams_excluded_tot, cam_excluded_count, id_excluded_cams_tot = [], [], [], [], []
-    interp_frames, non_interp_frames, f_range_trimmed = [], [], []
-    trc_paths, c3d_paths = [], []
-    for f in tqdm(range(*f_range)):
-        # print(f'\nFrame {f}:')        
-        # Get x,y,likelihood values from files
-        json_files_names_f = [[j for j in json_files_names[c] if int(re.split(r'(\d+)',j)[-2])==f] for c in range(n_cams)]
-        json_files_names_f = [j for j_list in json_files_names_f for j in (j_list or ['none'])]
-        json_files_f = [os.path.join(pose_dir, json_dirs_names[c], json_files_names_f[c]) for c in range(n_cams)]
-
-        x_files, y_files, likelihood_files = extract_files_frame_f(json_files_f, keypoints_ids, nb_persons_to_detect)
-        # [[[list of coordinates] * n_cams ] * nb_persons_to_detect]
-        # vs. [[list of coordinates] * n_cams ] 
-        
-        # undistort points
-        if undistort_points:
-            for n in range(nb_persons_to_detect):
-                points = [np.array(tuple(zip(x_files[n][i],y_files[n][i]))).reshape(-1, 1, 2).astype('float32') for i in range(n_cams)]
-                undistorted_points = [cv2.undistortPoints(points[i], calib_params['K'][i], calib_params['dist'][i], None, calib_params['optim_K'][i]) for i in range(n_cams)]
-                x_files[n] =  np.array([[u[i][0][0] for i in range(len(u))] for u in undistorted_points])
-                y_files[n] =  np.array([[u[i][0][1] for i in range(len(u))] for u in undistorted_points])
-                # This is good for slight distortion. For fisheye camera, the model does not work anymore. See there for an example https://github.com/lambdaloop/aniposelib/blob/d03b485c4e178d7cff076e9fe1ac36837db49158/aniposelib/cameras.py#L301
-
-        # Replace likelihood by 0 if under likelihood_threshold
-        with np.errstate(invalid='ignore'):
-            for n in range(nb_persons_to_detect):
-                x_files[n][likelihood_files[n] < likelihood_threshold] = np.nan
-                y_files[n][likelihood_files[n] < likelihood_threshold] = np.nan
-                likelihood_files[n][likelihood_files[n] < likelihood_threshold] = np.nan
-        
-        # Q_old = Q except when it has nan, otherwise it takes the Q_old value
-        nan_mask = np.isnan(Q)
-        Q_old = np.where(nan_mask, Q_old, Q)
-        Q = [[] for n in range(nb_persons_to_detect)]
-        error = [[] for n in range(nb_persons_to_detect)]
-        nb_cams_excluded = [[] for n in range(nb_persons_to_detect)]
-        id_excluded_cams = [[] for n in range(nb_persons_to_detect)]
-        
-        for n in range(nb_persons_to_detect):
-            for keypoint_idx in keypoints_idx:
-            # keypoints_nb = 2
-            # for keypoint_idx in range(2):
-            # Triangulate cameras with min reprojection error
-                # print('\n', keypoints_names[keypoint_idx])
-                coords_2D_kpt = np.array( (x_files[n][:, keypoint_idx], y_files[n][:, keypoint_idx], likelihood_files[n][:, keypoint_idx]) )
-                coords_2D_kpt_swapped = np.array(( x_files[n][:, keypoints_idx_swapped[keypoint_idx]], y_files[n][:, keypoints_idx_swapped[keypoint_idx]], likelihood_files[n][:, keypoints_idx_swapped[keypoint_idx]] ))
-
-                Q_kpt, error_kpt, nb_cams_excluded_kpt, id_excluded_cams_kpt = triangulation_from_best_cameras(config_dict, coords_2D_kpt, coords_2D_kpt_swapped, P, calib_params) # P has been modified if undistort_points=True
+    # Chunks of frames: all at once, or frames_per_chunk at a time with results spilled to disk
+    if parallel_workers == 'auto':
+        parallel_workers = os.cpu_count()
+    parallel_workers = 1 if parallel_workers is None else int(parallel_workers)
+    chunk_size = int(frames_per_chunk) if frames_per_chunk and int(frames_per_chunk) < frame_nb else max(frame_nb, 1)
+    chunks_start = range(0, frame_nb, chunk_size)
+    if chunk_size < frame_nb:
+        # interpolated gaps crossing the chunk borders need to be fully visible
+        overlap = min(max(2*int(interp_gap_smaller_than)+1, 10), frame_nb)
+        pose3d_dir = os.path.join(project_dir, 'pose-3d')
+        if not os.path.exists(pose3d_dir): os.mkdir(pose3d_dir)
+        spill_dir = tempfile.TemporaryDirectory(dir=pose3d_dir)
+        new_buffer = lambda name, shape, dtype: np.lib.format.open_memmap(os.path.join(spill_dir.name, f'{name}.npy'), mode='w+', dtype=dtype, shape=shape)
+    else:
+        overlap = frame_nb
+        spill_dir = None
+        new_buffer = lambda name, shape, dtype: np.empty(shape, dtype=dtype)
+    try:
+        Q_buffer = new_buffer('Q', (frame_nb, nb_persons_to_detect, keypoints_nb, 3), np.float32)
+        error_buffer = new_buffer('error', (frame_nb, nb_persons_to_detect, keypoints_nb), np.float32)
+        nb_cams_excluded_buffer = new_buffer('nb_cams_excluded', (frame_nb, nb_persons_to_detect, keypoints_nb), np.min_scalar_type(n_cams))
+        id_excluded_cams_buffer = new_buffer('id_excluded_cams', (frame_nb, nb_persons_to_detect, keypoints_nb, int(np.ceil(n_cams/8))), np.uint8) # bitmask of excluded cameras
+
+        Q = [[[np.nan]*3]*keypoints_nb for n in range(nb_persons_to_detect)]
+        Q_old = [[[np.nan]*3]*keypoints_nb for n in range(nb_persons_to_detect)]
+        warm_start_stats = [0, 0]
+        cams_excluded_prev = None # warm start carried over from one chunk of frames to the next
+        with (ProcessPoolExecutor(max_workers=parallel_workers) if parallel_workers > 1 and frame_nb >= 2 else nullcontext()) as executor:
+            for chunk_start in tqdm(chunks_start, disable=len(chunks_start)==1):
+                chunk_stop = min(chunk_start+chunk_size, frame_nb)
+
+                # 2D coordinates of the selected frames, frame-major
+                coords_all = extract_coords_frames(pose_tensor, f_range[0]+chunk_start, f_range[0]+chunk_stop, keypoints_ids, nb_persons_to_detect, association_table=association_table)
+
+                # Undistort all points at once, one call per camera
+                if undistort_points:
+                    x_undist, y_undist = undistort_points_batch(calib_params, np.moveaxis(coords_all[...,0],1,0), np.moveaxis(coords_all[...,1],1,0))
+                    coords_all[...,0], coords_all[...,1] = np.moveaxis(x_undist,0,1), np.moveaxis(y_undist,0,1)
 
-                Q[n].append(Q_kpt)
-                error[n].append(error_kpt)
-                nb_cams_excluded[n].append(nb_cams_excluded_kpt)
-                id_excluded_cams[n].append(id_excluded_cams_kpt)
-        
-        if multi_person:
-            # reID persons across frames by checking the distance from one frame to another
-            # print('Q before ordering ', np.array(Q)[:,:2])
-            if f !=0:
-                Q = np.array(Q)
-                Q_old, Q, sorted_ids = sort_people_sports2d(Q_old, np.array(Q), max_dist=max_distance_m)
-                
-                error_sorted, nb_cams_excluded_sorted, id_excluded_cams_sorted = [], [], []
-                for n in range(nb_persons_to_detect):
-                    detection_idx = sorted_ids[n]
-                    if detection_idx >= 0:  # Person is detected in current frame
-                        error_sorted.append(error[detection_idx])
-                        nb_cams_excluded_sorted.append(nb_cams_excluded[detection_idx])
-                        id_excluded_cams_sorted.append(id_excluded_cams[detection_idx])
-                    else:  # Person is not detected in current frame
-                        error_sorted.append([np.nan] * keypoints_nb)
-                        nb_cams_excluded_sorted.append([n_cams] * keypoints_nb)
-                        id_excluded_cams_sorted.append([list(range(n_cams))] * keypoints_nb)
-                error, nb_cams_excluded, id_excluded_cams = error_sorted, nb_cams_excluded_sorted, id_excluded_cams_sorted
-        
-        # TODO: if distance > threshold, new person
-        
-        # Add triangulated points, errors and excluded cameras to pandas dataframes
-        Q_tot.append([np.concatenate(Q[n]) for n in range(nb_persons_to_detect)])
-        error_tot.append([error[n] for n in range(nb_persons_to_detect)])
-        nb_cams_excluded_tot.append([nb_cams_excluded[n] for n in range(nb_persons_to_detect)])
-        id_excluded_cams = [[id_excluded_cams[n][k] for k in range(keypoints_nb)] for n in range(nb_persons_to_detect)]
-        id_excluded_cams_tot.append(id_excluded_cams)
+                # Triangulate all frames, in parallel over sub-chunks of frames if requested
+                if executor is None:
+                    Q_frames, error_frames, nb_cams_excluded_frames, id_excluded_cams_frames, warm_start_stats_chunk, cams_excluded_prev = triangulate_frames(config_dict, coords_all, P, calib_params, keypoints_idx_swapped, cams_excluded_prev=cams_excluded_prev, progress_bar=len(chunks_start)==1) # P has been modified if undistort_points=True
+                    warm_start_stats = [s + s_chunk for s, s_chunk in zip(warm_start_stats, warm_start_stats_chunk)]
+                else:
+                    sub_chunk_size = int(np.ceil(len(coords_all) / (4*parallel_workers)))
+                    Q_frames, error_frames, nb_cams_excluded_frames, id_excluded_cams_frames = [], [], [], []
+                    # only the first sub-chunk can start from the cameras excluded on the previous chunk
+                    futures = [executor.submit(triangulate_frames, config_dict, coords_all[c:c+sub_chunk_size], P, calib_params, keypoints_idx_swapped, cams_excluded_prev=cams_excluded_prev if c==0 else None) for c in range(0, len(coords_all), sub_chunk_size)]
+                    for future in tqdm(futures, disable=len(chunks_start)>1):
+                        Q_chunk, error_chunk, nb_cams_excluded_chunk, id_excluded_cams_chunk, warm_start_stats_chunk, cams_excluded_prev = future.result()
+                        warm_start_stats = [s + s_chunk for s, s_chunk in zip(warm_start_stats, warm_start_stats_chunk)]
+                        Q_frames += Q_chunk
+                        error_frames += error_chunk
+                        nb_cams_excluded_frames += nb_cams_excluded_chunk
+                        id_excluded_cams_frames += id_excluded_cams_chunk
+
+                # Stitch frames together, and reID persons across frames
+                for i in range(chunk_start, chunk_stop):
+                    f = f_range[0] + i
+                    # Q_old = Q except when it has nan, otherwise it takes the Q_old value
+                    nan_mask = np.isnan(Q)
+                    Q_old = np.where(nan_mask, Q_old, Q)
+                    Q, error, nb_cams_excluded, id_excluded_cams = Q_frames[i-chunk_start], error_frames[i-chunk_start], nb_cams_excluded_frames[i-chunk_start], id_excluded_cams_frames[i-chunk_start]
             
-    # fill values for if a person that was not initially detected has entered the frame 
-    Q_tot = [list(tpl) for tpl in zip(*it.zip_longest(*Q_tot, fillvalue=[np.nan]*keypoints_nb*3))]
-    error_tot = [list(tpl) for tpl in zip(*it.zip_longest(*error_tot, fillvalue=[np.nan]*keypoints_nb*3))]
-    nb_cams_excluded_tot = [list(tpl) for tpl in zip(*it.zip_longest(*nb_cams_excluded_tot, fillvalue=[np.nan]*keypoints_nb*3))]
-    id_excluded_cams_tot = [list(tpl) for tpl in zip(*it.zip_longest(*id_excluded_cams_tot, fillvalue=[np.nan]*keypoints_nb*3))]
-
-    # dataframes for each person
-    Q_tot = [pd.DataFrame([Q_tot_f[n] for Q_tot_f in Q_tot], index=range(*f_range)) for n in range(nb_persons_to_detect)]
-    error_tot = [pd.DataFrame([error_tot_f[n] for error_tot_f in error_tot], index=range(*f_range)) for n in range(nb_persons_to_detect)]
-    nb_cams_excluded_tot = [pd.DataFrame([nb_cams_excluded_tot_f[n] for nb_cams_excluded_tot_f in nb_cams_excluded_tot], index=range(*f_range)) for n in range(nb_persons_to_detect)]
-    id_excluded_cams_tot = [pd.DataFrame([id_excluded_cams_tot_f[n] for id_excluded_cams_tot_f in id_excluded_cams_tot], index=range(*f_range)) for n in range(nb_persons_to_detect)]
-
-    # Interpolate small missing sections
-    for n in range(nb_persons_to_detect):
-        if interpolation_kind != 'none':
-            try:
-                Q_tot[n] = Q_tot[n].apply(interpolate_zeros_nans, axis=0, args=[interp_gap_smaller_than, interpolation_kind])
-            except:
+                    if multi_person:
+                        # reID persons across frames by checking the distance from one frame to another
+                        # print('Q before ordering ', np.array(Q)[:,:2])
+                        if f !=0:
+                            Q = np.array(Q)
+                            Q_old, Q, sorted_ids = sort_people_sports2d(Q_old, np.array(Q), max_dist=max_distance_m)
+                    
+                            error_sorted, nb_cams_excluded_sorted, id_excluded_cams_sorted = [], [], []
+                            for n in range(nb_persons_to_detect):
+                                detection_idx = sorted_ids[n]
+                                if detection_idx >= 0:  # Person is detected in current frame
+                                    error_sorted.append(error[detection_idx])
+                                    nb_cams_excluded_sorted.append(nb_cams_excluded[detection_idx])
+                                    id_excluded_cams_sorted.append(id_excluded_cams[detection_idx])
+                                else:  # Person is not detected in current frame
+                                    error_sorted.append([np.nan] * keypoints_nb)
+                                    nb_cams_excluded_sorted.append([n_cams] * keypoints_nb)
+                                    id_excluded_cams_sorted.append([list(range(n_cams))] * keypoints_nb)
+                            error, nb_cams_excluded, id_excluded_cams = error_sorted, nb_cams_excluded_sorted, id_excluded_cams_sorted
+            
+                    # TODO: if distance > threshold, new person
+            
+                    # Add triangulated points, errors and excluded cameras to buffers
+                    Q_buffer[i] = np.array(Q, dtype=float)[:nb_persons_to_detect]
+                    error_buffer[i] = np.array(error, dtype=float)[:nb_persons_to_detect]
+                    nb_cams_excluded_buffer[i] = np.array(nb_cams_excluded)[:nb_persons_to_detect]
+                    excluded_cams_f = np.zeros((nb_persons_to_detect, keypoints_nb, n_cams), dtype=bool)
+                    for n in range(nb_persons_to_detect):
+                        for k in range(keypoints_nb):
+                            excluded_cams_f[n, k, np.array(id_excluded_cams[n][k], dtype=int)] = True
+                    id_excluded_cams_buffer[i] = np.packbits(excluded_cams_f, axis=-1)
+                del coords_all, Q_frames, error_frames, nb_cams_excluded_frames, id_excluded_cams_frames
+
+        error_tot, nb_cams_excluded_tot, cam_excluded_count = [], [], []
+        interp_frames, non_interp_frames, f_range_trimmed = [], [], []
+        trc_paths, c3d_paths = [], []
+        for n in range(nb_persons_to_detect):
+            # Determine frames where the person is out of the frame
+            error_mean_frames = np.concatenate([pd.DataFrame(error_buffer[c:c+chunk_size,n].astype(float)).mean(axis=1, skipna = not remove_incomplete_frames).values for c in chunks_start])
+            first_run_start_min, last_run_end_max = indices_of_first_last_non_nan_chunks(pd.Series(error_mean_frames), min_chunk_size=min_chunk_size, chunk_choice_method=sections_to_keep)
+            f_range_trimmed.append([first_run_start_min, last_run_end_max])
+
+            # Skip person if not correctly triangulated
+            if last_run_end_max - first_run_start_min <= min_chunk_size:
+                error_tot.append(pd.Series(dtype=float))
+                nb_cams_excluded_tot.append(pd.Series(dtype=float))
+                cam_excluded_count.append({})
+                interp_frames.append([])
+                non_interp_frames.append([])
+                trc_paths.append ('')
+                logging.info(f'\nPerson {n}: Less than {min_chunk_size} valid frames in a row. Deleting person.')
+                continue
+
+            # Statistics on good frames: errors, excluded cameras, and IDs of excluded cameras
+            trimmed_chunks_start = range(first_run_start_min, last_run_end_max, chunk_size)
+            error_sum, error_count = np.zeros(keypoints_nb), np.zeros(keypoints_nb)
+            nb_cams_excluded_sum, nb_cams_excluded_frames_sum = np.zeros(keypoints_nb), 0
+            cam_exclusion_counts = np.zeros(n_cams, dtype=int)
+            for c in trimmed_chunks_start:
+                c_stop = min(c+chunk_size, last_run_end_max)
+                error_c = np.asarray(error_buffer[c:c_stop,n]).astype(float)
+                error_sum += np.nansum(error_c, axis=0)
+                error_count += np.sum(~np.isnan(error_c), axis=0)
+                nb_cams_excluded_c = np.asarray(nb_cams_excluded_buffer[c:c_stop,n]).astype(int)
+                nb_cams_excluded_sum += nb_cams_excluded_c.sum(axis=0)
+                nb_cams_excluded_frames_sum += nb_cams_excluded_c.mean(axis=1).sum()
+                cam_exclusion_counts += np.unpackbits(id_excluded_cams_buffer[c:c_stop,n], axis=-1, count=n_cams).reshape(-1, n_cams).sum(axis=0, dtype=int)
+            frame_count = last_run_end_max - first_run_start_min
+            with np.errstate(invalid='ignore', divide='ignore'):
+                error_tot.append(pd.Series(list(error_sum/error_count) + [np.nanmean(error_mean_frames[first_run_start_min:last_run_end_max])], index=list(range(keypoints_nb))+['mean']))
+            nb_cams_excluded_tot.append(pd.Series(list(nb_cams_excluded_sum/frame_count) + [nb_cams_excluded_frames_sum/frame_count], index=list(range(keypoints_nb))+['mean']))
+            total_opportunities = frame_count * keypoints_nb
+            cam_excluded_count.append({k: v/total_opportunities for k, v in enumerate(cam_exclusion_counts.tolist())})
+
+            # Interpolate small missing sections, chunk by chunk
+            Q_chunk_first, interp_failed = interpolate_frames_chunk(Q_buffer[:,n], first_run_start_min, min(first_run_start_min+chunk_size, last_run_end_max), f_range[0], overlap, interpolation_kind, interp_gap_smaller_than)
+            if interp_failed:
                 logging.warning(f'Interpolation was not possible for person {n}. This means that not enough points are available, which is often due to a bad calibration.')
 
-        # Determine frames where the person is out of the frame
-        error_tot[n]['mean'] = error_tot[n].mean(axis = 1, skipna = not remove_incomplete_frames)
-        nb_cams_excluded_tot[n]['mean'] = nb_cams_excluded_tot[n].mean(axis=1)
-        first_run_start_min, last_run_end_max = indices_of_first_last_non_nan_chunks(error_tot[n]['mean'], min_chunk_size=min_chunk_size, chunk_choice_method=sections_to_keep)
-        f_range_trimmed.append([first_run_start_min, last_run_end_max])
-
-        # Skip person if not correctly triangulated
-        if last_run_end_max - first_run_start_min <= min_chunk_size:
-            nb_cams_excluded_tot[n] = pd.DataFrame(columns=nb_cams_excluded_tot[n].columns)
-            cam_excluded_count.append({})
-            interp_frames.append([])
-            non_interp_frames.append([])
-            trc_paths.append ('')
-            logging.info(f'\nPerson {n}: Less than {min_chunk_size} valid frames in a row. Deleting person.')
-            continue
+            # First valid value of each keypoint coordinate, to fill the first frames
+            first_values = pd.Series(np.nan, index=Q_chunk_first.columns)
+            if fill_large_gaps_with == 'last_value':
+                first_values = Q_chunk_first.bfill(axis=0).iloc[0]
+                for c in trimmed_chunks_start[1:]:
+                    if not first_values.isna().any():
+                        break
+                    Q_chunk, _ = interpolate_frames_chunk(Q_buffer[:,n], c, min(c+chunk_size, last_run_end_max), f_range[0], overlap, interpolation_kind, interp_gap_smaller_than)
+                    first_values = first_values.fillna(Q_chunk.bfill(axis=0).iloc[0])
+
+            # Trim around good frames, fill non-interpolated values, and stream chunks to the trc file
+            zero_nan_frames_per_kpt = [[] for k in range(keypoints_nb)]
+            def filled_chunks(): # consumed right away by make_trc
+                last_values = first_values
+                for c in trimmed_chunks_start:
+                    if c == first_run_start_min:
+                        Q_chunk = Q_chunk_first
+                    else:
+                        Q_chunk, _ = interpolate_frames_chunk(Q_buffer[:,n], c, min(c+chunk_size, last_run_end_max), f_range[0], overlap, interpolation_kind, interp_gap_smaller_than)
+                    zero_nan_frames = np.where( Q_chunk.iloc[:,::3].T.eq(0) | ~np.isfinite(Q_chunk.iloc[:,::3].T) )
+                    for k in range(keypoints_nb):
+                        z = zero_nan_frames[1][zero_nan_frames[0]==k] + c - first_run_start_min
+                        zero_nan_frames_per_kpt[k].append(z[(first_run_start_min < z) & (last_run_end_max > z)])
+
+                    # Fill non-interpolated values with last valid one
+                    if fill_large_gaps_with == 'last_value':
+                        Q_chunk = pd.concat([last_values.to_frame().T, Q_chunk]).ffill(axis=0).iloc[1:]
+                        last_values = Q_chunk.iloc[-1]
+                        Q_chunk = Q_chunk.replace([np.nan, np.inf], 0)
+                    elif fill_large_gaps_with == 'zeros':
+                        Q_chunk = Q_chunk.replace([np.nan, np.inf], 0)
+                    yield Q_chunk
+
+            # Create TRC file
+            trc_paths.append(make_trc(config_dict, filled_chunks(), keypoints_names, id_person=n, f_range=[f_range[0]+first_run_start_min, f_range[0]+last_run_end_max]))
+            if make_c3d:
+                c3d_paths.append(convert_to_c3d(trc_paths[-1]))
+
+            # Optionally, for each person, for each keypoint, show indices of frames that should be interpolated
+            if show_interp_indices:
+                zero_nan_frames_per_kpt = [np.concatenate(z) for z in zero_nan_frames_per_kpt]
+                gaps = [np.where(np.diff(zero_nan_frames_per_kpt[k]) > 1)[0] + 1 for k in range(keypoints_nb)]
+                sequences = [np.split(zero_nan_frames_per_kpt[k], gaps[k]) for k in range(keypoints_nb)]
+                interp_frames.append([[f'{seq[0]}:{seq[-1]}' for seq in seq_kpt if len(seq)<=interp_gap_smaller_than and len(seq)>0] for seq_kpt in sequences])
+                non_interp_frames.append([[f'{seq[0]}:{seq[-1]}' for seq in seq_kpt if len(seq)>interp_gap_smaller_than] for seq_kpt in sequences])
+            else:
+                interp_frames.append(None)
+                non_interp_frames.append([])
 
-        # Trim around good frames
-        Q_tot[n] = Q_tot[n].iloc[first_run_start_min:last_run_end_max]
-        error_tot[n] = error_tot[n].iloc[first_run_start_min:last_run_end_max]
-        nb_cams_excluded_tot[n] = nb_cams_excluded_tot[n].iloc[first_run_start_min:last_run_end_max]
-        id_excluded_cams_tot[n] = id_excluded_cams_tot[n].iloc[first_run_start_min:last_run_end_max]
-        zero_nan_frames = np.where( Q_tot[n].iloc[:,::3].T.eq(0) | ~np.isfinite(Q_tot[n].iloc[:,::3].T) )
-        zero_nan_frames_per_kpt = [zero_nan_frames[1][np.where(zero_nan_frames[0]==k)[0]] for k in range(keypoints_nb)]
-        zero_nan_frames_per_kpt = [z[(first_run_start_min < z) & (last_run_end_max > z)] for z in zero_nan_frames_per_kpt]
-
-        # Fill non-interpolated values with last valid one
-        if fill_large_gaps_with == 'last_value':
-            Q_tot[n] = Q_tot[n].ffill(axis=0).bfill(axis=0)
-            Q_tot[n].replace([np.nan, np.inf], 0, inplace=True)
-        elif fill_large_gaps_with == 'zeros':
-            Q_tot[n].replace([np.nan, np.inf], 0, inplace=True)
-
-        # Create TRC file
-        trc_paths.append(make_trc(config_dict, Q_tot[n], keypoints_names, id_person=n))
-        if make_c3d:
-            c3d_paths.append(convert_to_c3d(trc_paths[-1]))
-
-        # IDs of excluded cameras
-        frame_count = len(Q_tot[n])
-        cam_exclusion_counts = {cam_id: 0 for cam_id in range(n_cams)} # initialize at zero
-        for excluded_at_frame in id_excluded_cams_tot[n].values:
-            for keypoint_cams in excluded_at_frame:
-                if isinstance(keypoint_cams, (list, np.ndarray)):
-                    for cam_id in keypoint_cams:
-                        if isinstance(cam_id, (int, np.integer)):
-                            cam_exclusion_counts[cam_id] += 1
-        total_opportunities = frame_count * keypoints_nb
-        cam_excluded_count.append({k: v/total_opportunities for k, v in cam_exclusion_counts.items()})
-
-        # Optionally, for each person, for each keypoint, show indices of frames that should be interpolated
-        if show_interp_indices:
-            gaps = [np.where(np.diff(zero_nan_frames_per_kpt[k]) > 1)[0] + 1 for k in range(keypoints_nb)]
-            sequences = [np.split(zero_nan_frames_per_kpt[k], gaps[k]) for k in range(keypoints_nb)]
-            interp_frames.append([[f'{seq[0]}:{seq[-1]}' for seq in seq_kpt if len(seq)<=interp_gap_smaller_than and len(seq)>0] for seq_kpt in sequences])
-            non_interp_frames.append([[f'{seq[0]}:{seq[-1]}' for seq in seq_kpt if len(seq)>interp_gap_smaller_than] for seq_kpt in sequences])
-        else:
-            interp_frames.append(None)
-            non_interp_frames.append([])
+    finally:
+        # release the memory-mapped buffers before removing their files
+        Q_buffer = error_buffer = nb_cams_excluded_buffer = id_excluded_cams_buffer = None
+        if spill_dir is not None:
+            spill_dir.cleanup()
 
     if np.all(np.diff(np.array(f_range_trimmed))==0):
         raise Exception('No persons have been triangulated. Please check your calibration and your synchronization, or the triangulation parameters in Config.toml.')
 
     # Recap message
-    recap_triangulate(config_dict, error_tot, nb_cams_excluded_tot, keypoints_names, cam_excluded_count, interp_frames, non_interp_frames, f_range_trimmed, f_range, trc_paths)
+    recap_triangulate(config_dict, error_tot, nb_cams_excluded_tot, keypoints_names, cam_excluded_count, interp_frames, non_interp_frames, f_range_trimmed, f_range, trc_paths, warm_start_stats)